@@ -1,82 +1,168 @@
 """
 Admin dashboard API endpoint.
 Provides platform-wide statistics for the master dashboard.
-Each query is isolated with rollback on failure to prevent cascade errors.
+Dashboard stats are served from the mv_admin_dashboard materialized view,
+which is refreshed periodically in the background; the fused live query is
+used as a fallback when the view is missing. Queries are isolated with
+rollback on failure to prevent cascade errors.
 """
+import asyncio
+import hmac
+import os
+import time
+from collections import defaultdict
+
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from loguru import logger
 from typing import Optional
 
+from app.cache import admin_stats_cache
+from app.core.db import AsyncSessionLocal
 from app.core.dependencies import get_db, get_current_user
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 ADMIN_ID = "aither"
 ADMIN_PASS = "hub"
+_EXPECTED_ADMIN_KEY = f"{ADMIN_ID}:{ADMIN_PASS}".encode()
+
+
+def _verify_admin_key(x_admin_key: Optional[str]) -> None:
+    """Constant-time check of the X-Admin-Key header."""
+    if not x_admin_key or not hmac.compare_digest(x_admin_key.encode(), _EXPECTED_ADMIN_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin credentials")
+
+
+# How often the materialized view is refreshed (seconds)
+DASHBOARD_REFRESH_INTERVAL = int(os.getenv("ADMIN_DASHBOARD_REFRESH_SECONDS", "300"))
+
+# In-process cache of the dashboard payload: (monotonic timestamp, payload).
+# Sits in front of the Redis cache shared across workers.
+_CACHE_TTL = admin_stats_cache.ADMIN_DASHBOARD_TTL
+_cache: Optional[tuple[float, dict]] = None
+_cache_lock = asyncio.Lock()
+# Background refresh runs well inside the TTL so requests always hit a warm cache
+_CACHE_REFRESH_INTERVAL = max(1, _CACHE_TTL // 2)
+_refresh_lock = asyncio.Lock()
+
+
+# All dashboard scalars in a single round-trip.
+# videos.duration_sec is the per-video MAX(video_phases.time_end) in seconds,
+# maintained by a trigger on video_phases.
+_DASHBOARD_SQL = text("""
+    WITH v AS (
+        SELECT
+            COUNT(*) AS total_videos,
+            COUNT(*) FILTER (WHERE status = 'DONE') AS analyzed_videos,
+            COUNT(*) FILTER (
+                WHERE upload_type = 'screen_recording' OR upload_type IS NULL
+            ) AS screen_recording_count,
+            COUNT(*) FILTER (WHERE upload_type = 'clean_video') AS clean_video_count,
+            MAX(created_at) AS latest_upload,
+            COUNT(DISTINCT user_id) AS total_streamers,
+            COUNT(DISTINCT user_id) FILTER (
+                WHERE created_at >= DATE_TRUNC('month', CURRENT_DATE)
+            ) AS this_month_uploaders
+        FROM videos
+    ),
+    u AS (
+        SELECT
+            COUNT(*) FILTER (WHERE is_active = true) AS active_users,
+            COUNT(*) AS all_users
+        FROM users
+    ),
+    d AS (
+        SELECT COALESCE(SUM(duration_sec), 0) AS total_duration_seconds FROM videos
+    )
+    SELECT * FROM v, u, d
+""")
+
+
+_DASHBOARD_MV_SQL = text("SELECT * FROM mv_admin_dashboard")
+_DASHBOARD_MV_REFRESH_SQL = text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_admin_dashboard")
 
 
-async def _q(db: AsyncSession, sql: str, default=0):
-    """Run a scalar query with rollback on failure to keep the session alive."""
+async def _fetch_row(db: AsyncSession, sql) -> Optional[dict]:
+    """Run a single-row query with rollback on failure to keep the session alive."""
     try:
-        r = await db.execute(text(sql))
-        val = r.scalar()
-        return val if val is not None else default
+        r = await db.execute(sql)
+        row = r.mappings().first()
+        return dict(row) if row else {}
     except Exception as e:
         logger.warning(f"Admin query error: {e}")
         try:
             await db.rollback()
         except Exception:
             pass
-        return default
+        return None
 
 
-async def _get_dashboard_data(db: AsyncSession) -> dict:
-    """Gather all dashboard statistics."""
+async def _fetch_dashboard_row(db: AsyncSession) -> Optional[dict]:
+    """
+    Read the materialized view, falling back to the live fused query.
+    Returns None if both fail, so callers never cache an all-zero payload.
+    """
+    row = await _fetch_row(db, _DASHBOARD_MV_SQL)
+    if row is None:
+        row = await _fetch_row(db, _DASHBOARD_SQL)
+    return row
+
+
+async def refresh_dashboard_view() -> None:
+    """Refresh mv_admin_dashboard without blocking concurrent readers."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(_DASHBOARD_MV_REFRESH_SQL)
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"Admin dashboard refresh failed: {e}")
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+
+
+async def _get_dashboard_data(db: AsyncSession) -> Optional[dict]:
+    """Gather all dashboard statistics (None if the stats could not be read)."""
+    row = await _fetch_dashboard_row(db)
+    if row is None:
+        return None
+    return _build_dashboard_payload(row)
+
+
+def _build_dashboard_payload(row: dict) -> dict:
+    """Shape one dashboard stats row into the API payload."""
+
+    def _v(key, default=0):
+        val = row.get(key)
+        return val if val is not None else default
 
     # ── Data Volume ──
-    total_videos = await _q(db, "SELECT COUNT(*) FROM videos")
-    analyzed_videos = await _q(db, "SELECT COUNT(*) FROM videos WHERE status = 'DONE'")
+    total_videos = _v("total_videos")
+    analyzed_videos = _v("analyzed_videos")
     pending_videos = total_videos - analyzed_videos
-
-    # time_end is double precision (seconds)
-    total_duration_seconds = await _q(db, """
-        SELECT COALESCE(SUM(max_sec), 0) FROM (
-            SELECT video_id, MAX(COALESCE(time_end, 0)) as max_sec
-            FROM video_phases
-            WHERE time_end IS NOT NULL
-            GROUP BY video_id
-        ) sub
-    """)
-    total_duration_seconds = int(total_duration_seconds)
+    total_duration_seconds = int(_v("total_duration_seconds"))
 
     # ── Video Types ──
-    screen_recording_count = await _q(
-        db,
-        "SELECT COUNT(*) FROM videos WHERE upload_type = 'screen_recording' OR upload_type IS NULL",
-    )
-    clean_video_count = await _q(
-        db,
-        "SELECT COUNT(*) FROM videos WHERE upload_type = 'clean_video'",
-    )
+    screen_recording_count = _v("screen_recording_count")
+    clean_video_count = _v("clean_video_count")
     if screen_recording_count == 0 and clean_video_count == 0 and total_videos > 0:
         screen_recording_count = total_videos
 
-    latest_upload_raw = await _q(db, "SELECT MAX(created_at) FROM videos", default=None)
-    latest_upload = str(latest_upload_raw) if latest_upload_raw else None
+    # Native datetimes; ORJSONResponse serializes them as ISO-8601
+    latest_upload = _v("latest_upload", default=None)
 
     # ── User Scale ──
-    total_users = await _q(db, "SELECT COUNT(*) FROM users WHERE is_active = true")
+    total_users = _v("active_users")
     if total_users == 0:
-        total_users = await _q(db, "SELECT COUNT(*) FROM users")
+        total_users = _v("all_users")
 
-    total_streamers = await _q(db, "SELECT COUNT(DISTINCT user_id) FROM videos")
-    this_month_uploaders = await _q(
-        db,
-        "SELECT COUNT(DISTINCT user_id) FROM videos "
-        "WHERE created_at >= DATE_TRUNC('month', CURRENT_DATE)",
-    )
+    total_streamers = _v("total_streamers")
+    this_month_uploaders = _v("this_month_uploaders")
+
+    refreshed_at = _v("refreshed_at", default=None)
 
     # Format duration
     total_hours = total_duration_seconds // 3600
@@ -100,9 +186,103 @@ async def _get_dashboard_data(db: AsyncSession) -> dict:
             "total_streamers": total_streamers,
             "this_month_uploaders": this_month_uploaders,
         },
+        "refreshed_at": refreshed_at,
     }
 
 
+async def _get_dashboard_shared(db: AsyncSession) -> Optional[dict]:
+    """
+    Read the payload from Redis, computing it under a cross-worker lock on miss.
+    None if it had to be computed and the DB read failed (nothing is published).
+    """
+    payload = await admin_stats_cache.get_dashboard()
+    if payload is not None:
+        return payload
+
+    if not await admin_stats_cache.acquire_lock():
+        # Another worker is computing; wait briefly for it to publish
+        for _ in range(10):
+            await asyncio.sleep(0.2)
+            payload = await admin_stats_cache.get_dashboard()
+            if payload is not None:
+                return payload
+        return await _get_dashboard_data(db)
+
+    try:
+        payload = await _get_dashboard_data(db)
+        if payload is not None:
+            await admin_stats_cache.set_dashboard(payload)
+        return payload
+    finally:
+        await admin_stats_cache.release_lock()
+
+
+async def _get_dashboard_cached(db: AsyncSession) -> dict:
+    """
+    Return the cached dashboard payload, recomputing at most once per TTL.
+    Only payloads built from a fetched stats row are cached.
+    """
+    global _cache
+    cached = _cache
+    if cached and time.monotonic() - cached[0] < _CACHE_TTL:
+        return cached[1]
+
+    # Single-flight: concurrent misses in this worker wait for one recomputation
+    async with _cache_lock:
+        cached = _cache
+        if cached and time.monotonic() - cached[0] < _CACHE_TTL:
+            return cached[1]
+        payload = await _get_dashboard_shared(db)
+        if payload is None:
+            # Stats unreadable: answer with the last good payload (even if stale)
+            # or zeros, but cache nothing so the next request retries the DB
+            return cached[1] if cached else _build_dashboard_payload({})
+        _cache = (time.monotonic(), payload)
+        return payload
+
+
+async def invalidate_dashboard_cache() -> None:
+    global _cache
+    _cache = None
+    await admin_stats_cache.invalidate_dashboard()
+
+
+async def _refresh_dashboard_cache() -> None:
+    """Recompute the payload into the in-process and shared caches."""
+    global _cache
+    if _refresh_lock.locked():
+        # A refresh is already in flight
+        return
+    async with _refresh_lock:
+        async with AsyncSessionLocal() as db:
+            payload = await _get_dashboard_data(db)
+        if payload is None:
+            # Keep serving the last good payload until the DB answers again
+            logger.warning("Admin dashboard stats unavailable, keeping cached payload")
+            return
+        _cache = (time.monotonic(), payload)
+        await admin_stats_cache.set_dashboard(payload)
+
+
+async def dashboard_refresher() -> None:
+    """
+    Background loop started from the app lifespan.
+    Refreshes mv_admin_dashboard every DASHBOARD_REFRESH_INTERVAL and keeps
+    the cached payload warm so the dashboard endpoints are a memory read.
+    """
+    last_view_refresh: Optional[float] = None
+    while True:
+        now = time.monotonic()
+        if last_view_refresh is None or now - last_view_refresh >= DASHBOARD_REFRESH_INTERVAL:
+            await refresh_dashboard_view()
+            last_view_refresh = now
+        try:
+            await _refresh_dashboard_cache()
+        except Exception as e:
+            logger.warning(f"Admin dashboard cache refresh failed: {e}")
+        await asyncio.sleep(_CACHE_REFRESH_INTERVAL)
+
+
 @router.get("/dashboard")
 async def get_dashboard_stats(
     current_user: dict = Depends(get_current_user),
@@ -111,7 +291,7 @@ async def get_dashboard_stats(
     """JWT auth, admin role required."""
     if current_user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
-    return await _get_dashboard_data(db)
+    return await _get_dashboard_cached(db)
 
 
 @router.get("/dashboard-public")
@@ -120,10 +300,62 @@ async def get_dashboard_stats_public(
     db: AsyncSession = Depends(get_db),
 ):
     """Simple ID:password auth via header."""
-    expected_key = f"{ADMIN_ID}:{ADMIN_PASS}"
-    if x_admin_key != expected_key:
-        raise HTTPException(status_code=403, detail="Invalid admin credentials")
-    return await _get_dashboard_data(db)
+    _verify_admin_key(x_admin_key)
+    return await _get_dashboard_cached(db)
+
+
+@router.post("/dashboard/invalidate")
+async def invalidate_dashboard(
+    x_admin_key: Optional[str] = Header(None, alias="X-Admin-Key"),
+):
+    """Drop the cached dashboard payload so the next read recomputes it."""
+    _verify_admin_key(x_admin_key)
+    await invalidate_dashboard_cache()
+    return {"status": "ok"}
+
+
+# Schema introspection for debugging; the schema does not change per request
+SCHEMA_DEBUG_TABLES = ("videos", "users", "video_phases")
+_SCHEMA_CACHE_TTL = 300
+_schema_cache: Optional[tuple[float, dict]] = None
+
+_SCHEMA_SQL = text("""
+    SELECT table_name, column_name, data_type
+    FROM information_schema.columns
+    WHERE table_name = ANY(:tables)
+    ORDER BY table_name, ordinal_position
+""").bindparams(bindparam("tables"))
+
+
+@router.get("/debug-schema")
+async def debug_schema(
+    x_admin_key: Optional[str] = Header(None, alias="X-Admin-Key"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Column names/types of the core tables, fetched in one parameterized query."""
+    global _schema_cache
+    _verify_admin_key(x_admin_key)
+
+    cached = _schema_cache
+    if cached and time.monotonic() - cached[0] < _SCHEMA_CACHE_TTL:
+        return cached[1]
+
+    # Stream rows straight into the result instead of materializing a list
+    schema = defaultdict(list)
+    try:
+        result = await db.stream(
+            _SCHEMA_SQL.execution_options(yield_per=500),
+            {"tables": list(SCHEMA_DEBUG_TABLES)},
+        )
+        async for r in result:
+            schema[r.table_name].append({"column": r.column_name, "type": r.data_type})
+    except Exception as e:
+        logger.exception(f"Failed to fetch schema: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch schema: {e}")
+    schema = {t: schema.get(t, []) for t in SCHEMA_DEBUG_TABLES}
+
+    _schema_cache = (time.monotonic(), schema)
+    return schema
 
 
 @router.get("/feedbacks")
@@ -135,9 +367,7 @@ async def get_all_feedbacks(
     Get all phase feedbacks (ratings + comments) across all users and videos.
     Returns a list sorted by most recent first.
     """
-    expected_key = f"{ADMIN_ID}:{ADMIN_PASS}"
-    if x_admin_key != expected_key:
-        raise HTTPException(status_code=403, detail="Invalid admin credentials")
+    _verify_admin_key(x_admin_key)
 
     try:
         sql = text("""
@@ -34,7 +34,7 @@ from app.schema.video_schema import (
 from app.services.video_service import VideoService
 from app.repository.video_repository import VideoRepository
 from app.core.dependencies import get_db, get_current_user
-from app.utils.video_progress import calculate_progress, get_status_message
+from app.utils.video_progress import calculate_progress_fast, get_status_message
 from app.core.container import Container
 from app.models.orm.upload import Upload
 from app.models.orm.video import Video
@@ -70,7 +70,7 @@ async def generate_upload_url(
             video_id=payload.video_id,
             filename=payload.filename,
         )
-        return GenerateUploadURLResponse(**result)
+        return GenerateUploadURLResponse.model_validate(result, from_attributes=True)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to generate upload URL: {exc}")
 
@@ -84,7 +84,7 @@ async def generate_download_url(payload: GenerateDownloadURLRequest):
             filename=payload.filename,
             expires_in_minutes=payload.expires_in_minutes,
         )
-        return GenerateDownloadURLResponse(**result)
+        return GenerateDownloadURLResponse.model_validate(result, from_attributes=True)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to generate download URL: {exc}")
 
@@ -117,7 +117,7 @@ async def upload_complete(
             excel_trend_blob_url=payload.excel_trend_blob_url,
             time_offset_seconds=payload.time_offset_seconds or 0,
         )
-        return UploadCompleteResponse(**result)
+        return UploadCompleteResponse.model_validate(result, from_attributes=True)
     except HTTPException:
         raise
     except Exception as exc:
@@ -152,7 +152,7 @@ async def batch_upload_complete(
                 excel_trend_blob_url=payload.excel_trend_blob_url,
                 time_offset_seconds=v.time_offset_seconds or 0,
             )
-            video_ids.append(result["video_id"])
+            video_ids.append(result.video_id)
 
         return BatchUploadCompleteResponse(
             video_ids=video_ids,
@@ -180,7 +180,7 @@ async def generate_excel_upload_url(
             product_filename=payload.product_filename,
             trend_filename=payload.trend_filename,
         )
-        return GenerateExcelUploadURLResponse(**result)
+        return GenerateExcelUploadURLResponse.model_validate(result, from_attributes=True)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to generate Excel upload URLs: {exc}")
 
@@ -602,7 +602,9 @@ async def stream_video_status(
 
                     # Send update if status changed OR step_progress changed
                     if current_status != last_status or current_step_progress != last_step_progress:
-                        progress = calculate_progress(current_status)
+                        progress = calculate_progress_fast(
+                            getattr(video, 'step_index', None), current_status
+                        )
                         message = get_status_message(current_status)
 
                         payload = {
@@ -0,0 +1,93 @@
+"""
+Redis-backed shared cache for the admin dashboard payload.
+
+Shares the computed dashboard across uvicorn/gunicorn workers so only one
+worker pays the cold miss. When REDIS_URL is unset, the redis package is
+missing, or Redis is unreachable, every helper degrades to a no-op / miss
+so callers fall back to computing the payload directly.
+"""
+import os
+from typing import Optional
+
+import orjson
+from loguru import logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - optional dependency
+    aioredis = None
+
+REDIS_URL = os.getenv("REDIS_URL", "")
+ADMIN_DASHBOARD_TTL = int(os.getenv("ADMIN_DASHBOARD_TTL", "30"))
+
+DASHBOARD_KEY = "aither:admin:dashboard:v1"
+DASHBOARD_LOCK_KEY = f"{DASHBOARD_KEY}:lock"
+DASHBOARD_LOCK_TTL = 10
+
+_client = None
+
+
+def _get_client():
+    """Lazily build the shared Redis client (None when Redis is not configured)."""
+    global _client
+    if _client is None and REDIS_URL and aioredis is not None:
+        _client = aioredis.from_url(REDIS_URL, decode_responses=True)
+    return _client
+
+
+async def get_dashboard() -> Optional[dict]:
+    client = _get_client()
+    if client is None:
+        return None
+    try:
+        raw = await client.get(DASHBOARD_KEY)
+        return orjson.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"Admin stats cache read failed: {e}")
+        return None
+
+
+async def set_dashboard(payload: dict, ttl: int = ADMIN_DASHBOARD_TTL) -> None:
+    client = _get_client()
+    if client is None:
+        return
+    try:
+        await client.set(DASHBOARD_KEY, orjson.dumps(payload), ex=ttl)
+    except Exception as e:
+        logger.warning(f"Admin stats cache write failed: {e}")
+
+
+async def acquire_lock() -> bool:
+    """
+    Take the single-flight lock (SET NX EX).
+    Returns True when the caller should compute the payload; also True when
+    Redis is unavailable so the caller never blocks on a missing cache.
+    """
+    client = _get_client()
+    if client is None:
+        return True
+    try:
+        return bool(await client.set(DASHBOARD_LOCK_KEY, "1", nx=True, ex=DASHBOARD_LOCK_TTL))
+    except Exception as e:
+        logger.warning(f"Admin stats cache lock failed: {e}")
+        return True
+
+
+async def release_lock() -> None:
+    client = _get_client()
+    if client is None:
+        return
+    try:
+        await client.delete(DASHBOARD_LOCK_KEY)
+    except Exception as e:
+        logger.warning(f"Admin stats cache unlock failed: {e}")
+
+
+async def invalidate_dashboard() -> None:
+    client = _get_client()
+    if client is None:
+        return
+    try:
+        await client.delete(DASHBOARD_KEY)
+    except Exception as e:
+        logger.warning(f"Admin stats cache invalidate failed: {e}")
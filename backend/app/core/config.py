@@ -37,8 +37,12 @@ class Configs(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 30  # 60 minutes * 24 hours * 30 days = 30 days
 
-    # CORS
-    BACKEND_CORS_ORIGINS: List[str] = ["*"]
+    # CORS: comma-separated exact origins, e.g. "https://app.example.com,http://localhost:5173"
+    BACKEND_CORS_ORIGINS: List[str] = [
+        o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()
+    ]
+    CORS_ALLOW_METHODS: List[str] = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+    CORS_ALLOW_HEADERS: List[str] = ["Authorization", "Content-Type", "X-Admin-Key"]
 
     # database
     DB: str = os.getenv("DB", "postgresql")
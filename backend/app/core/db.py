@@ -1,6 +1,6 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from app.models.orm.base import Base
+from functools import lru_cache
 import os
 import ssl
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
@@ -10,10 +10,16 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 def prepare_database_url(url: str) -> tuple[str, dict]:
     """
     Prepare database URL for asyncpg compatibility.
+    Plain postgres URLs are forced onto the asyncpg driver.
     asyncpg doesn't support 'sslmode' parameter, need to convert to 'ssl' context.
     """
     if not url:
         return url, {}
+
+    for prefix in ("postgres://", "postgresql://", "postgresql+psycopg2://"):
+        if url.startswith(prefix):
+            url = "postgresql+asyncpg://" + url[len(prefix):]
+            break
     
     # Parse the URL
     parsed = urlparse(url)
@@ -56,20 +62,25 @@ def prepare_database_url(url: str) -> tuple[str, dict]:
     
     return cleaned_url, connect_args
 
-cleaned_url, connect_args = prepare_database_url(DATABASE_URL)
+@lru_cache(maxsize=1)
+def get_engine() -> AsyncEngine:
+    """Create the process-wide async engine once."""
+    cleaned_url, connect_args = prepare_database_url(DATABASE_URL)
+    return create_async_engine(
+        cleaned_url,
+        echo=False,
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        connect_args=connect_args,
+    )
 
-engine = create_async_engine(
-    cleaned_url,
-    echo=False,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    connect_args=connect_args,
-)
 
-AsyncSessionLocal = sessionmaker(
-    bind=engine,
+engine = get_engine()
+
+AsyncSessionLocal = async_sessionmaker(
+    engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
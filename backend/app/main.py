@@ -1,53 +1,74 @@
+import asyncio
 import logging
+import os
+import sys
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from loguru import logger as loguru_logger
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api.v1.endpoints.admin import dashboard_refresher
 from app.api.v1.routes import routers as v1_routers
 from app.core.config import configs
 from app.core.container import Container
-from app.utils.class_object import singleton
 
 logger = logging.getLogger(__name__)
 
-@singleton
-class AppCreator:
-    def __init__(self):
-        # Init FastAPI
-        self.app = FastAPI(
-            title=configs.PROJECT_NAME,
-            version="0.0.1",
-            openapi_url=f"{configs.API_V1_STR}/openapi.json",
-        )
-
-        # Init DI container & DB
-        self.container = Container()
-        self.container.wire(modules=[__name__])
-        self.db = self.container.db()
-        # self.db.create_database()
-
-        # CORS
-        if configs.BACKEND_CORS_ORIGINS:
-            self.app.add_middleware(
-                CORSMiddleware,
-                allow_origins=[str(origin) for origin in configs.BACKEND_CORS_ORIGINS],
-                allow_credentials=True,
-                allow_methods=["*"],
-                allow_headers=["*"],
-            )
-
-        # Health check
-        @self.app.get("/")
-        async def root():
-            return {"status": "service is working"}
-
-        # API v1 routes
-        self.app.include_router(
-            v1_routers,
-            prefix=configs.API_V1_STR,
-        )
-
-
-app_creator = AppCreator()
-app = app_creator.app
-db = app_creator.db
-container = app_creator.container
+# loguru defaults to DEBUG; keep debug logs (e.g. SAS URLs) out of prod output
+loguru_logger.remove()
+loguru_logger.add(sys.stderr, level=os.getenv("LOG_LEVEL", "INFO"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep the admin dashboard view and cached payload fresh in the background
+    refresher = asyncio.create_task(dashboard_refresher())
+    try:
+        yield
+    finally:
+        refresher.cancel()
+        with suppress(asyncio.CancelledError):
+            await refresher
+
+
+# The app is served on uvloop + httptools: uvicorn is started with
+# --loop uvloop --http httptools (Dockerfile), and gunicorn's
+# UvicornWorker picks uvloop automatically when it is installed.
+app = FastAPI(
+    title=configs.PROJECT_NAME,
+    version="0.0.1",
+    openapi_url=f"{configs.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+# DI container & DB
+container = Container()
+container.wire(modules=[__name__])
+db = container.db()
+# db.create_database()
+
+# CORS
+if configs.BACKEND_CORS_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[str(origin) for origin in configs.BACKEND_CORS_ORIGINS],
+        allow_credentials=True,
+        allow_methods=configs.CORS_ALLOW_METHODS,
+        allow_headers=configs.CORS_ALLOW_HEADERS,
+    )
+
+
+# Health check
+@app.get("/")
+async def root():
+    return {"status": "service is working"}
+
+
+# API v1 routes
+app.include_router(
+    v1_routers,
+    prefix=configs.API_V1_STR,
+)
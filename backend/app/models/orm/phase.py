@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, Text, Integer, Float, DateTime
+from sqlalchemy import ForeignKey, Text, Integer, Float, DateTime, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.models.orm.base import Base, UUIDMixin, TimestampMixin
@@ -9,6 +9,19 @@ from app.models.orm.base import Base, UUIDMixin, TimestampMixin
 class Phase(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "phases"
 
+    # phases only exists via create_all (migrations use video_phases), so these
+    # indexes are created with the table
+    __table_args__ = (
+        Index("ix_phases_video_phase", "video_id", "phase_index"),
+        # Active (non soft-deleted) phases per video
+        Index(
+            "ix_phases_active",
+            "video_id",
+            "phase_index",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
+
     video_id: Mapped[str] = mapped_column(
         ForeignKey("videos.id"),
         nullable=False,
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, Integer, Float, DateTime
+from sqlalchemy import ForeignKey, Integer, Float, DateTime, Index, desc, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.models.orm.base import Base, UUIDMixin, TimestampMixin
@@ -9,6 +9,19 @@ from app.models.orm.base import Base, UUIDMixin, TimestampMixin
 class PhaseGroupBestPhase(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "phase_group_best_phases"
 
+    # phase_group_best_phases only exists via create_all (migrations use
+    # group_best_phases, indexed in 20260308_phase_lookup_indexes)
+    __table_args__ = (
+        Index("ix_pgbp_video_phase", "video_id", "phase_index"),
+        # Top-N best phases per group, skipping soft-deleted rows
+        Index(
+            "ix_pgbp_group_score",
+            "phase_group_id",
+            desc("score"),
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
+
     phase_group_id: Mapped[str] = mapped_column(
         ForeignKey("phase_groups.id"),
         nullable=False,
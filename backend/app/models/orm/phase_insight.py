@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, Integer, Text, Boolean, DateTime
+from sqlalchemy import ForeignKey, Integer, Text, Boolean, DateTime, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.models.orm.base import Base, UUIDMixin, TimestampMixin
@@ -9,6 +9,13 @@ from app.models.orm.base import Base, UUIDMixin, TimestampMixin
 class PhaseInsight(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "phase_insights"
 
+    # Same constraint as migration 20260112_create_phase_v1 (it also serves
+    # video_id / (video_id, phase_index) lookups); the migrated table has no
+    # deleted_at, so no soft-delete partial index here
+    __table_args__ = (
+        UniqueConstraint("video_id", "phase_index", name="uq_phase_insights_video_phase"),
+    )
+
     video_id: Mapped[str] = mapped_column(
         ForeignKey("videos.id"),
         nullable=False,
@@ -1,7 +1,8 @@
 # app/models/orm/video.py
-from sqlalchemy import ForeignKey, Text, Integer, String, Float
+from sqlalchemy import Computed, ForeignKey, Text, Integer, SmallInteger, String, Float
 from sqlalchemy.orm import Mapped, mapped_column
 from app.models.orm.base import Base, UUIDMixin, TimestampMixin
+from app.utils.video_progress import STEP_INDEX_SQL
 from typing import Optional
 
 
@@ -15,7 +16,11 @@ class Video(Base, UUIDMixin, TimestampMixin):
     status: Mapped[str]
 
     # Intra-step progress (0-100) for real-time progress display
-    step_progress: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=0, server_default="0")
+    step_progress: Mapped[Optional[int]] = mapped_column(SmallInteger, nullable=True, default=0, server_default="0")
+    # Pipeline position (VideoStep) generated from status; read-only
+    step_index: Mapped[Optional[int]] = mapped_column(
+        SmallInteger, Computed(STEP_INDEX_SQL, persisted=True), nullable=True
+    )
 
     # Upload type: 'screen_recording' (default) or 'clean_video'
     upload_type: Mapped[str] = mapped_column(
@@ -32,3 +37,5 @@ class Video(Base, UUIDMixin, TimestampMixin):
     # Time offset in seconds: where this video starts within the CSV timeline
     # Used when a long stream is split into multiple videos sharing the same CSV
     time_offset_seconds: Mapped[Optional[float]] = mapped_column(Float, nullable=True, default=0)
+    # Denormalized MAX(video_phases.time_end) in seconds, maintained by a DB trigger
+    duration_sec: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
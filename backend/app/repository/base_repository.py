@@ -1,7 +1,9 @@
 from contextlib import AbstractContextManager
-from typing import Callable, Generic, TypeVar
+from typing import Callable, Generic, Sequence, TypeVar
 
+from sqlalchemy import delete, inspect, select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.interfaces import LoaderOption
 
 T = TypeVar('T')
 
@@ -21,31 +23,77 @@ class BaseRepository(Generic[T]):
             session.refresh(obj)
             return obj
 
-    def read_by_id(self, obj_id) -> T | None:
+    def bulk_create(self, objs: list[T]) -> list[T]:
+        """Create many records in a single transaction"""
+        if not objs:
+            return objs
+        with self.session_factory() as session:
+            session.add_all(objs)
+            session.flush()
+            session.commit()
+            return objs
+
+    def read_by_id(self, obj_id, loader_options: Sequence[LoaderOption] = ()) -> T | None:
         """Read a record by ID"""
         with self.session_factory() as session:
-            return session.query(self.model).filter(self.model.id == obj_id).first()
+            stmt = select(self.model).where(self.model.id == obj_id).options(*loader_options)
+            return session.execute(stmt).scalar_one_or_none()
 
-    def read_by_options(self, options) -> dict:
-        """Read records by filter options"""
+    def read_by_options(self, options, loader_options: Sequence[LoaderOption] = ()) -> dict:
+        """
+        Read records by filter options.
+        loader_options (e.g. selectinload(...)) are applied to avoid N+1 loads.
+        """
         with self.session_factory() as session:
-            query = session.query(self.model)
+            stmt = select(self.model).options(*loader_options)
             # This is a placeholder - subclasses should override for specific filtering
-            return {"founds": query.all()}
+            return {"founds": session.execute(stmt).scalars().all()}
 
     def update(self, obj: T) -> T:
-        """Update a record"""
+        """Update a record with a single UPDATE (no SELECT as with merge)"""
+        # Only columns actually set on obj, like merge() would copy
+        # (generated columns are server-maintained and cannot be written)
+        column_keys = {
+            attr.key
+            for attr in inspect(self.model).column_attrs
+            if all(col.computed is None for col in attr.columns)
+        }
+        values = {
+            key: value
+            for key, value in inspect(obj).dict.items()
+            if key in column_keys and key != "id"
+        }
         with self.session_factory() as session:
-            session.merge(obj)
+            session.execute(
+                update(self.model).where(self.model.id == obj.id).values(**values)
+            )
             session.commit()
             return obj
 
     def delete(self, obj_id) -> bool:
-        """Delete a record"""
+        """Delete a record (loaded first, so ORM cascades and mapper events run)"""
         with self.session_factory() as session:
-            obj = session.query(self.model).filter(self.model.id == obj_id).first()
-            if obj:
-                session.delete(obj)
-                session.commit()
-                return True
-            return False
+            obj = session.get(self.model, obj_id)
+            if obj is None:
+                return False
+            session.delete(obj)
+            session.commit()
+            return True
+
+    def bulk_delete(self, obj_ids) -> int:
+        """
+        Delete many records with a single DELETE; returns the number deleted.
+        Bypasses ORM cascades and mapper events, so only use it for models whose
+        dependents are removed by the database (ON DELETE CASCADE) or have none.
+        """
+        obj_ids = list(obj_ids)
+        if not obj_ids:
+            return 0
+        with self.session_factory() as session:
+            result = session.execute(
+                delete(self.model)
+                .where(self.model.id.in_(obj_ids))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            return result.rowcount
@@ -1,10 +1,13 @@
 """Utilities for Azure Blob uploads and SAS generation."""
 
+import asyncio
 import os
 import uuid
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Tuple
 
+from loguru import logger
 from azure.storage.blob import (
     BlobServiceClient,
     BlobSasPermissions,
@@ -16,17 +19,92 @@ ACCOUNT_NAME = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
 CONTAINER_NAME = os.getenv("AZURE_BLOB_CONTAINER", "videos")
 SAS_EXP_MINUTES = int(os.getenv("AZURE_BLOB_SAS_EXP_MINUTES", "1440"))  # default 1 day
 SAS_DOWNLOAD_EXP_MINUTES = int(os.getenv("AZURE_BLOB_SAS_DOWNLOAD_MINUTES", "1440"))  # Default 24 hours
+# Sign SAS with an Azure AD user-delegation key instead of the account key (production only)
+USE_USER_DELEGATION_KEY = os.getenv("AZURE_STORAGE_USE_USER_DELEGATION_KEY", "false").lower() == "true"
 
 
-def _parse_account_key(conn_str: str) -> str:
-    """Extract AccountKey from connection string."""
+def _parse_connection_string(conn_str: str | None) -> dict[str, str]:
+    """Split a connection string into its key=value parts."""
     if not conn_str:
-        raise ValueError("Missing AZURE_STORAGE_CONNECTION_STRING")
-    parts = conn_str.split(";")
-    for p in parts:
-        if p.startswith("AccountKey="):
-            return p.split("=", 1)[1]
-    raise ValueError("AccountKey not found in connection string")
+        return {}
+    return dict(p.split("=", 1) for p in conn_str.split(";") if "=" in p)
+
+
+# Parsed once at import instead of on every SAS request
+_CONN = _parse_connection_string(CONNECTION_STRING)
+_ACCOUNT_KEY = _CONN.get("AccountKey")
+_IS_AZURITE = "devstoreaccount1" in (ACCOUNT_NAME or "").lower()
+
+if _IS_AZURITE:
+    # Azurite: BlobEndpoint from connection string
+    # For local dev: http://localhost:10000/devstoreaccount1
+    # For Docker: http://azurite:10000/devstoreaccount1
+    _BLOB_ENDPOINT = _CONN.get("BlobEndpoint", "http://localhost:10000/devstoreaccount1")
+else:
+    # Production Azure: use HTTPS
+    _BLOB_ENDPOINT = f"https://{ACCOUNT_NAME}.blob.core.windows.net"
+_BLOB_URL_PREFIX = f"{_BLOB_ENDPOINT}/{CONTAINER_NAME}/"
+
+
+def _require_account_key() -> str:
+    if not CONNECTION_STRING:
+        raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING is required to generate SAS")
+    if not _ACCOUNT_KEY:
+        raise ValueError("AccountKey not found in connection string")
+    return _ACCOUNT_KEY
+
+
+@lru_cache(maxsize=1)
+def _service_client() -> BlobServiceClient:
+    """Process-wide BlobServiceClient (AAD credential in user-delegation mode)."""
+    if _use_user_delegation():
+        from azure.identity import DefaultAzureCredential
+        return BlobServiceClient(account_url=_BLOB_ENDPOINT, credential=DefaultAzureCredential())
+    return BlobServiceClient.from_connection_string(CONNECTION_STRING)
+
+
+def _use_user_delegation() -> bool:
+    # Azurite does not support user-delegation keys
+    return USE_USER_DELEGATION_KEY and not _IS_AZURITE
+
+
+# User-delegation key cache: one key signs every SAS until shortly before it expires
+_UDK_VALIDITY = timedelta(hours=1)
+_UDK_REFRESH_SKEW = timedelta(minutes=5)
+_UDK_MAX_VALIDITY = timedelta(days=7)  # Azure limit
+_udk = None
+_udk_expiry: datetime | None = None
+_udk_lock = asyncio.Lock()
+
+
+async def _get_user_delegation_key(valid_until: datetime):
+    """Return a cached user-delegation key covering valid_until, refreshing single-flight."""
+    global _udk, _udk_expiry
+    if _udk is not None and _udk_expiry >= valid_until + _UDK_REFRESH_SKEW:
+        return _udk
+
+    async with _udk_lock:
+        if _udk is not None and _udk_expiry >= valid_until + _UDK_REFRESH_SKEW:
+            return _udk
+        now = datetime.now(timezone.utc)
+        # Cover the longest SAS we hand out so the key can be reused for a while
+        longest_sas = timedelta(minutes=max(SAS_EXP_MINUTES, SAS_DOWNLOAD_EXP_MINUTES))
+        expiry = max(now + longest_sas + _UDK_VALIDITY, valid_until + _UDK_REFRESH_SKEW)
+        expiry = min(expiry, now + _UDK_MAX_VALIDITY)
+        _udk = await asyncio.to_thread(
+            _service_client().get_user_delegation_key,
+            key_start_time=now - timedelta(minutes=1),
+            key_expiry_time=expiry,
+        )
+        _udk_expiry = expiry
+        return _udk
+
+
+async def _signing_kwargs(expiry: datetime) -> dict:
+    """Credential kwargs for generate_blob_sas."""
+    if _use_user_delegation():
+        return {"user_delegation_key": await _get_user_delegation_key(expiry)}
+    return {"account_key": _require_account_key()}
 
 
 def _ensure_container(service_client: BlobServiceClient, container: str) -> None:
@@ -67,42 +145,25 @@ async def generate_upload_sas(email: str, video_id: str | None = None, filename:
     """
     vid = video_id or str(uuid.uuid4())
 
-    if not CONNECTION_STRING:
-        raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING is required to generate SAS")
-
     blob_name = generate_blob_name(email, vid, filename)
-    account_key = _parse_account_key(CONNECTION_STRING)
     expiry = datetime.now(timezone.utc) + timedelta(minutes=SAS_EXP_MINUTES)
+    credential = await _signing_kwargs(expiry)
 
-    # Detect Azurite vs Azure
-    is_azurite = "devstoreaccount1" in ACCOUNT_NAME.lower()
-    
-    # Generate SAS token (works for both Azurite and Azure)
-    sas_token = generate_blob_sas(
+    # Generate SAS token (works for both Azurite and Azure).
+    # HMAC signing is CPU-bound, so run it on the threadpool to keep the loop free.
+    sas_token = await asyncio.to_thread(
+        generate_blob_sas,
         account_name=ACCOUNT_NAME,
         container_name=CONTAINER_NAME,
         blob_name=blob_name,
-        account_key=account_key,
+        **credential,
         permission=BlobSasPermissions(write=True, create=True),
         expiry=expiry,
     )
 
-    if is_azurite:
-        # Azurite: extract BlobEndpoint from connection string
-        # For local dev: http://localhost:10000/devstoreaccount1
-        # For Docker: http://azurite:10000/devstoreaccount1
-        blob_endpoint = "http://localhost:10000/devstoreaccount1"  # Default for local
-        for part in CONNECTION_STRING.split(";"):
-            if part.startswith("BlobEndpoint="):
-                blob_endpoint = part.split("=", 1)[1]
-                break
-        blob_url = f"{blob_endpoint}/{CONTAINER_NAME}/{blob_name}"
-    else:
-        # Production Azure: use HTTPS
-        blob_url = f"https://{ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}/{blob_name}"
-    
+    blob_url = _BLOB_URL_PREFIX + blob_name
     upload_url = f"{blob_url}?{sas_token}"
-    print(f"[storage_service] upload_url: {upload_url}")
+    logger.debug("[storage_service] upload_url={} expires_at={}", upload_url, expiry)
     return vid, upload_url, blob_url, expiry
 
 
@@ -120,39 +181,37 @@ async def generate_download_sas(email: str, video_id: str, filename: str | None
         download_url: full SAS URL for direct download
         expiry: datetime in UTC
     """
-    if not CONNECTION_STRING:
-        raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING is required to generate SAS")
-
     blob_name = generate_blob_name(email, video_id, filename)
-    account_key = _parse_account_key(CONNECTION_STRING)
-    
+
     ttl_minutes = expires_in_minutes if expires_in_minutes is not None else SAS_DOWNLOAD_EXP_MINUTES
     expiry = datetime.now(timezone.utc) + timedelta(minutes=ttl_minutes)
+    credential = await _signing_kwargs(expiry)
 
-    # Detect Azurite vs Azure
-    is_azurite = "devstoreaccount1" in ACCOUNT_NAME.lower()
-    
-    # Generate SAS token with read permission
-    sas_token = generate_blob_sas(
+    # Generate SAS token with read permission (signed off the event loop)
+    sas_token = await asyncio.to_thread(
+        generate_blob_sas,
         account_name=ACCOUNT_NAME,
         container_name=CONTAINER_NAME,
         blob_name=blob_name,
-        account_key=account_key,
+        **credential,
         permission=BlobSasPermissions(read=True),
         expiry=expiry,
     )
 
-    if is_azurite:
-        blob_endpoint = "http://localhost:10000/devstoreaccount1"
-        for part in CONNECTION_STRING.split(";"):
-            if part.startswith("BlobEndpoint="):
-                blob_endpoint = part.split("=", 1)[1]
-                break
-        blob_url = f"{blob_endpoint}/{CONTAINER_NAME}/{blob_name}"
-    else:
-        blob_url = f"https://{ACCOUNT_NAME}.blob.core.windows.net/{CONTAINER_NAME}/{blob_name}"
-    
+    blob_url = _BLOB_URL_PREFIX + blob_name
     download_url = f"{blob_url}?{sas_token}"
-    print(f"[storage_service] download_url: {download_url} (expires in {ttl_minutes} min)")
+    logger.debug("[storage_service] download_url={} expires_in={}min", download_url, ttl_minutes)
     return download_url, expiry
 
+
+
+async def get_blob_size(email: str, video_id: str, filename: str | None = None) -> int | None:
+    """Size in bytes of email/video_id/filename, or None if it cannot be read."""
+    blob_name = generate_blob_name(email, video_id, filename)
+    try:
+        blob_client = _service_client().get_blob_client(CONTAINER_NAME, blob_name)
+        props = await asyncio.to_thread(blob_client.get_blob_properties)
+        return props.size
+    except Exception as exc:
+        logger.debug("[storage_service] get_blob_size failed blob={} err={}", blob_name, exc)
+        return None
@@ -1,21 +1,99 @@
-from app.services.storage_service import generate_upload_sas, generate_download_sas, generate_blob_name
+from app.services.storage_service import generate_upload_sas, generate_download_sas, generate_blob_name, get_blob_size
 from app.repository.video_repository import VideoRepository
 from app.services.queue_service import enqueue_job
 from app.core.container import Container
 from app.models.orm.upload import Upload
 from app.models.orm.user import User
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 import os
 import asyncio
 import uuid as uuid_module
+from typing import NamedTuple
 
 
 _logger = logging.getLogger(__name__)
 
 
+class UploadUrlResult(NamedTuple):
+    video_id: str
+    upload_id: str
+    upload_url: str
+    blob_url: str
+    expires_at: datetime
+
+
+class ExcelUploadUrlsResult(NamedTuple):
+    video_id: str
+    product_upload_url: str
+    product_blob_url: str
+    trend_upload_url: str
+    trend_blob_url: str
+    expires_at: datetime
+
+
+class DownloadUrlResult(NamedTuple):
+    video_id: str
+    download_url: str
+    expires_at: datetime
+
+
+class UploadCompleteResult(NamedTuple):
+    video_id: str
+    status: str
+    message: str
+
+
+# Download SAS URLs keyed on (email, video_id, filename, expires_in_minutes).
+# A cached URL is reused until it is within _SAS_REFRESH_MARGIN of expiry,
+# so repeated playback/polling requests don't re-sign every time.
+_SAS_CACHE_MAXSIZE = 10_000
+_SAS_REFRESH_MARGIN = timedelta(minutes=5)
+_sas_cache: dict[tuple, tuple[str, datetime]] = {}
+
+
+async def _cached_download_sas(
+    email: str,
+    video_id: str,
+    filename: str | None,
+    expires_in_minutes: int | None,
+) -> tuple[str, datetime]:
+    key = (email, video_id, filename, expires_in_minutes)
+    now = datetime.now(timezone.utc)
+    cached = _sas_cache.get(key)
+    if cached and cached[1] - now > _SAS_REFRESH_MARGIN:
+        return cached
+
+    download_url, expiry = await generate_download_sas(
+        email=email,
+        video_id=video_id,
+        filename=filename,
+        expires_in_minutes=expires_in_minutes,
+    )
+
+    if len(_sas_cache) >= _SAS_CACHE_MAXSIZE:
+        # Drop expired entries first, then the oldest insertions
+        for k in [k for k, (_, exp) in _sas_cache.items() if exp - now <= _SAS_REFRESH_MARGIN]:
+            del _sas_cache[k]
+        while len(_sas_cache) >= _SAS_CACHE_MAXSIZE:
+            del _sas_cache[next(iter(_sas_cache))]
+    _sas_cache[key] = (download_url, expiry)
+    return download_url, expiry
+
+
+# Queue priority: lower runs first. Processing cost scales with video length,
+# approximated by blob size, so short videos drain ahead of long ones.
+_PRIORITY_UNKNOWN_SIZE_MB = 1024
+
+
+def _priority_score(size_bytes: int | None) -> int:
+    if size_bytes is None:
+        return _PRIORITY_UNKNOWN_SIZE_MB
+    return size_bytes // (1024 * 1024)
+
+
 class VideoService:
     """Service layer for video operations"""
 
@@ -55,13 +133,7 @@ class VideoService:
         db.add(upload_record)
         await db.commit()
 
-        return {
-            "video_id": vid,
-            "upload_id": upload_id,
-            "upload_url": upload_url,
-            "blob_url": blob_url,
-            "expires_at": expiry,
-        }
+        return UploadUrlResult(vid, upload_id, upload_url, blob_url, expiry)
 
     async def generate_excel_upload_urls(self, email: str, video_id: str, product_filename: str, trend_filename: str):
         """Generate SAS upload URLs for Excel files (product + trend_stats)"""
@@ -80,28 +152,24 @@ class VideoService:
             filename=f"excel/{trend_filename}",
         )
 
-        return {
-            "video_id": video_id,
-            "product_upload_url": product_upload_url,
-            "product_blob_url": product_blob_url,
-            "trend_upload_url": trend_upload_url,
-            "trend_blob_url": trend_blob_url,
-            "expires_at": expiry,
-        }
+        return ExcelUploadUrlsResult(
+            video_id,
+            product_upload_url,
+            product_blob_url,
+            trend_upload_url,
+            trend_blob_url,
+            expiry,
+        )
 
     async def generate_download_url(self, email: str, video_id: str, filename: str | None = None, expires_in_minutes: int | None = None):
-        """Generate SAS download URL for video file"""
-        download_url, expiry = await generate_download_sas(
+        """Generate SAS download URL for video file (cached until shortly before expiry)"""
+        download_url, expiry = await _cached_download_sas(
             email=email,
             video_id=video_id,
             filename=filename,
             expires_in_minutes=expires_in_minutes,
         )
-        return {
-            "video_id": video_id,
-            "download_url": download_url,
-            "expires_at": expiry,
-        }
+        return DownloadUrlResult(video_id, download_url, expiry)
 
     async def handle_upload(self, db, blob_url):
         """Handle video upload completion"""
@@ -119,29 +187,36 @@ class VideoService:
         excel_product_blob_url: str | None = None,
         excel_trend_blob_url: str | None = None,
         time_offset_seconds: float = 0,
-    ) -> dict:
+    ) -> UploadCompleteResult:
         """Handle video upload completion - save to database and remove upload session"""
         if not self.video_repository:
             raise RuntimeError("VideoRepository not initialized")
         
-        # 1) Persist video record (status=uploaded)
-        video = await self.video_repository.create_video(
-            user_id=user_id,
-            video_id=video_id,
-            original_filename=original_filename,
-            status="uploaded",
-            upload_type=upload_type,
-            excel_product_blob_url=excel_product_blob_url,
-            excel_trend_blob_url=excel_trend_blob_url,
-            time_offset_seconds=time_offset_seconds,
-        )
+        # The id is known up front, so the DB insert and the SAS/size lookups
+        # are independent and can overlap.
+        vid = str(uuid_module.UUID(video_id))
 
-        # 2) Generate download SAS URL so worker can fetch the video
-        download_url, _ = await generate_download_sas(
-            email=email,
-            video_id=str(video.id),
-            filename=original_filename,
-            expires_in_minutes=1440,  # 24h for processing
+        # 1) Persist video record (status=uploaded)
+        # 2) Generate download SAS URL so worker can fetch the video,
+        #    and read the blob size for queue priority
+        video, (download_url, _), size_bytes = await asyncio.gather(
+            self.video_repository.create_video(
+                user_id=user_id,
+                video_id=video_id,
+                original_filename=original_filename,
+                status="uploaded",
+                upload_type=upload_type,
+                excel_product_blob_url=excel_product_blob_url,
+                excel_trend_blob_url=excel_trend_blob_url,
+                time_offset_seconds=time_offset_seconds,
+            ),
+            generate_download_sas(
+                email=email,
+                video_id=vid,
+                filename=original_filename,
+                expires_in_minutes=1440,  # 24h for processing
+            ),
+            get_blob_size(email, vid, original_filename),
         )
 
         # 3) Build queue payload
@@ -152,6 +227,7 @@ class VideoService:
             "user_id": user_id,
             "upload_type": upload_type,
             "time_offset_seconds": time_offset_seconds,
+            "priority": _priority_score(size_bytes),
         }
 
         # For clean_video uploads, generate download URLs for Excel files
@@ -216,8 +292,8 @@ class VideoService:
             except Exception:
                 pass
 
-        return {
-            "video_id": str(video.id),
-            "status": video.status,
-            "message": "Video upload completed; queued for analysis",
-        }
+        return UploadCompleteResult(
+            str(video.id),
+            video.status,
+            "Video upload completed; queued for analysis",
+        )
@@ -1,10 +0,0 @@
-def singleton(cls):
-    """Decorator to create singleton pattern"""
-    instances = {}
-
-    def get_instance(*args, **kwargs):
-        if cls not in instances:
-            instances[cls] = cls(*args, **kwargs)
-        return instances[cls]
-
-    return get_instance
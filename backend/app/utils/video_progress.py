@@ -1,6 +1,103 @@
 """
 Video processing progress calculation utilities.
 """
+from enum import IntEnum
+
+# Built once at import; the SSE progress endpoint looks these up every tick.
+# Calibrated from observed processing timeline so progress reflects elapsed time better.
+_PROGRESS: dict[str, int] = {
+    "NEW": 0,
+    "uploaded": 0,
+    "STEP_COMPRESS_1080P": 1,
+    "STEP_0_EXTRACT_FRAMES": 2,
+    "STEP_1_DETECT_PHASES": 4,
+    "STEP_2_EXTRACT_METRICS": 10,
+    "STEP_3_TRANSCRIBE_AUDIO": 80,
+    "STEP_4_IMAGE_CAPTION": 87,
+    "STEP_5_BUILD_PHASE_UNITS": 89,
+    "STEP_6_BUILD_PHASE_DESCRIPTION": 91,
+    "STEP_7_GROUPING": 93,
+    "STEP_8_UPDATE_BEST_PHASE": 94,
+    "STEP_9_BUILD_VIDEO_STRUCTURE_FEATURES": 95,
+    "STEP_10_ASSIGN_VIDEO_STRUCTURE_GROUP": 96,
+    "STEP_11_UPDATE_VIDEO_STRUCTURE_GROUP_STATS": 97,
+    "STEP_12_UPDATE_VIDEO_STRUCTURE_BEST": 98,
+    "STEP_12_5_PRODUCT_DETECTION": 98,
+    "STEP_13_BUILD_REPORTS": 99,
+    "STEP_14_FINALIZE": 99,
+    "STEP_14_SPLIT_VIDEO": 99,
+    "DONE": 100,
+    "ERROR": -1,
+}
+
+_MESSAGES: dict[str, str] = {
+    "NEW": "アップロード待ち",
+    "uploaded": "アップロード完了",
+    "STEP_COMPRESS_1080P": "動画を1080pに圧縮中...",
+    "STEP_0_EXTRACT_FRAMES": "フレーム抽出中...",
+    "STEP_1_DETECT_PHASES": "フェーズ検出中...",
+    "STEP_2_EXTRACT_METRICS": "メトリクス抽出中...",
+    "STEP_3_TRANSCRIBE_AUDIO": "音声書き起こし中...",
+    "STEP_4_IMAGE_CAPTION": "画像キャプション生成中...",
+    "STEP_5_BUILD_PHASE_UNITS": "フェーズユニット構築中...",
+    "STEP_6_BUILD_PHASE_DESCRIPTION": "フェーズ説明生成中...",
+    "STEP_7_GROUPING": "グルーピング中...",
+    "STEP_8_UPDATE_BEST_PHASE": "ベストフェーズ更新中...",
+    "STEP_9_BUILD_VIDEO_STRUCTURE_FEATURES": "ビデオ構造特徴構築中...",
+    "STEP_10_ASSIGN_VIDEO_STRUCTURE_GROUP": "ビデオ構造グループ割り当て中...",
+    "STEP_11_UPDATE_VIDEO_STRUCTURE_GROUP_STATS": "ビデオ構造グループ統計更新中...",
+    "STEP_12_UPDATE_VIDEO_STRUCTURE_BEST": "ビデオ構造ベスト更新中...",
+    "STEP_12_5_PRODUCT_DETECTION": "商品検出中...",
+    "STEP_13_BUILD_REPORTS": "レポート生成中...",
+    "STEP_14_FINALIZE": "最終処理中...",
+    "STEP_14_SPLIT_VIDEO": "ビデオ分割中...",
+    "DONE": "解析完了",
+    "ERROR": "エラーが発生しました",
+}
+
+
+
+class VideoStep(IntEnum):
+    """
+    Pipeline position of each status, in processing order.
+    Persisted as videos.step_index (a column generated from status), so the
+    values are part of the schema: append new steps, never renumber.
+    """
+    NEW = 0
+    STEP_COMPRESS_1080P = 1
+    STEP_0_EXTRACT_FRAMES = 2
+    STEP_1_DETECT_PHASES = 3
+    STEP_2_EXTRACT_METRICS = 4
+    STEP_3_TRANSCRIBE_AUDIO = 5
+    STEP_4_IMAGE_CAPTION = 6
+    STEP_5_BUILD_PHASE_UNITS = 7
+    STEP_6_BUILD_PHASE_DESCRIPTION = 8
+    STEP_7_GROUPING = 9
+    STEP_8_UPDATE_BEST_PHASE = 10
+    STEP_9_BUILD_VIDEO_STRUCTURE_FEATURES = 11
+    STEP_10_ASSIGN_VIDEO_STRUCTURE_GROUP = 12
+    STEP_11_UPDATE_VIDEO_STRUCTURE_GROUP_STATS = 13
+    STEP_12_UPDATE_VIDEO_STRUCTURE_BEST = 14
+    STEP_12_5_PRODUCT_DETECTION = 15
+    STEP_13_BUILD_REPORTS = 16
+    STEP_14_FINALIZE = 17
+    STEP_14_SPLIT_VIDEO = 18
+    DONE = 19
+    ERROR = 20
+
+
+_STEP_BY_STATUS: dict[str, VideoStep] = {step.name: step for step in VideoStep}
+_STEP_BY_STATUS["uploaded"] = VideoStep.NEW
+
+# SQL expression behind the generated videos.step_index column
+STEP_INDEX_SQL = (
+    "CASE status "
+    + " ".join(f"WHEN '{status}' THEN {int(step)}" for status, step in _STEP_BY_STATUS.items())
+    + " END"
+)
+
+# Indexed by step_index: progress without any string hashing
+_PROGRESS_BY_STEP: tuple[int, ...] = tuple(_PROGRESS[step.name] for step in VideoStep)
 
 
 def calculate_progress(status: str) -> int:
@@ -23,31 +120,26 @@ def calculate_progress(status: str) -> int:
         >>> calculate_progress('ERROR')
         -1
     """
-    # Calibrated from observed processing timeline so progress reflects elapsed time better.
-    status_map = {
-        "NEW": 0,
-        "uploaded": 0,
-        "STEP_COMPRESS_1080P": 1,
-        "STEP_0_EXTRACT_FRAMES": 2,
-        "STEP_1_DETECT_PHASES": 4,
-        "STEP_2_EXTRACT_METRICS": 10,
-        "STEP_3_TRANSCRIBE_AUDIO": 80,
-        "STEP_4_IMAGE_CAPTION": 87,
-        "STEP_5_BUILD_PHASE_UNITS": 89,
-        "STEP_6_BUILD_PHASE_DESCRIPTION": 91,
-        "STEP_7_GROUPING": 93,
-        "STEP_8_UPDATE_BEST_PHASE": 94,
-        "STEP_9_BUILD_VIDEO_STRUCTURE_FEATURES": 95,
-        "STEP_10_ASSIGN_VIDEO_STRUCTURE_GROUP": 96,
-        "STEP_11_UPDATE_VIDEO_STRUCTURE_GROUP_STATS": 97,
-        "STEP_12_UPDATE_VIDEO_STRUCTURE_BEST": 98,
-        "STEP_13_BUILD_REPORTS": 99,
-        "STEP_14_FINALIZE": 99,
-        "STEP_14_SPLIT_VIDEO": 99,
-        "DONE": 100,
-        "ERROR": -1,
-    }
-    return status_map.get(status, 0)
+    return _PROGRESS.get(status, 0)
+
+
+def calculate_progress_fast(step_index: int | None, status: str) -> int:
+    """
+    Progress from the stored step_index; falls back to calculate_progress
+    when step_index is NULL, i.e. the status is not in the generated column's
+    CASE (a status string it does not know).
+
+    Examples:
+        >>> calculate_progress_fast(VideoStep.STEP_5_BUILD_PHASE_UNITS, 'STEP_5_BUILD_PHASE_UNITS')
+        89
+        >>> calculate_progress_fast(None, 'DONE')
+        100
+        >>> all(calculate_progress_fast(_STEP_BY_STATUS[s], s) == calculate_progress(s) for s in _PROGRESS)
+        True
+    """
+    if step_index is None:
+        return calculate_progress(status)
+    return _PROGRESS_BY_STEP[step_index]
 
 
 def get_status_message(status: str) -> str:
@@ -66,27 +158,4 @@ def get_status_message(status: str) -> str:
         >>> get_status_message('DONE')
         '解析完了'
     """
-    messages = {
-        "NEW": "アップロード待ち",
-        "uploaded": "アップロード完了",
-        "STEP_COMPRESS_1080P": "動画を1080pに圧縮中...",
-        "STEP_0_EXTRACT_FRAMES": "フレーム抽出中...",
-        "STEP_1_DETECT_PHASES": "フェーズ検出中...",
-        "STEP_2_EXTRACT_METRICS": "メトリクス抽出中...",
-        "STEP_3_TRANSCRIBE_AUDIO": "音声書き起こし中...",
-        "STEP_4_IMAGE_CAPTION": "画像キャプション生成中...",
-        "STEP_5_BUILD_PHASE_UNITS": "フェーズユニット構築中...",
-        "STEP_6_BUILD_PHASE_DESCRIPTION": "フェーズ説明生成中...",
-        "STEP_7_GROUPING": "グルーピング中...",
-        "STEP_8_UPDATE_BEST_PHASE": "ベストフェーズ更新中...",
-        "STEP_9_BUILD_VIDEO_STRUCTURE_FEATURES": "ビデオ構造特徴構築中...",
-        "STEP_10_ASSIGN_VIDEO_STRUCTURE_GROUP": "ビデオ構造グループ割り当て中...",
-        "STEP_11_UPDATE_VIDEO_STRUCTURE_GROUP_STATS": "ビデオ構造グループ統計更新中...",
-        "STEP_12_UPDATE_VIDEO_STRUCTURE_BEST": "ビデオ構造ベスト更新中...",
-        "STEP_13_BUILD_REPORTS": "レポート生成中...",
-        "STEP_14_FINALIZE": "最終処理中...",
-        "STEP_14_SPLIT_VIDEO": "ビデオ分割中...",
-        "DONE": "解析完了",
-        "ERROR": "エラーが発生しました",
-    }
-    return messages.get(status, "処理中...")
+    return _MESSAGES.get(status, "処理中...")
@@ -0,0 +1,67 @@
+"""create mv_admin_dashboard materialized view for admin stats
+
+Revision ID: 20260301_mv_admin_dashboard
+Revises: 20260221_product_exposures
+Create Date: 2026-03-01 10:00:00.000000
+"""
+from alembic import op
+
+revision = "20260301_mv_admin_dashboard"
+down_revision = "20260221_product_exposures"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # =========================================================
+    # mv_admin_dashboard
+    # Single-row snapshot of the platform-wide admin stats.
+    # Refreshed periodically by the API process
+    # (REFRESH MATERIALIZED VIEW CONCURRENTLY) so the dashboard
+    # never aggregates over video_phases on the request path.
+    # =========================================================
+    op.execute("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_admin_dashboard AS
+        WITH v AS (
+            SELECT
+                COUNT(*) AS total_videos,
+                COUNT(*) FILTER (WHERE status = 'DONE') AS analyzed_videos,
+                COUNT(*) FILTER (
+                    WHERE upload_type = 'screen_recording' OR upload_type IS NULL
+                ) AS screen_recording_count,
+                COUNT(*) FILTER (WHERE upload_type = 'clean_video') AS clean_video_count,
+                MAX(created_at) AS latest_upload,
+                COUNT(DISTINCT user_id) AS total_streamers,
+                COUNT(DISTINCT user_id) FILTER (
+                    WHERE created_at >= DATE_TRUNC('month', CURRENT_DATE)
+                ) AS this_month_uploaders
+            FROM videos
+        ),
+        u AS (
+            SELECT
+                COUNT(*) FILTER (WHERE is_active = true) AS active_users,
+                COUNT(*) AS all_users
+            FROM users
+        ),
+        d AS (
+            SELECT COALESCE(SUM(max_sec), 0) AS total_duration_seconds FROM (
+                SELECT MAX(COALESCE(time_end, 0)) AS max_sec
+                FROM video_phases
+                WHERE time_end IS NOT NULL
+                GROUP BY video_id
+            ) sub
+        )
+        SELECT 1 AS id, v.*, u.*, d.*, now() AS refreshed_at
+        FROM v, u, d
+    """)
+
+    # A unique index is required for REFRESH ... CONCURRENTLY
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_mv_admin_dashboard_id "
+        "ON mv_admin_dashboard (id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_mv_admin_dashboard_id")
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS mv_admin_dashboard")
@@ -0,0 +1,110 @@
+"""add denormalized duration_sec to videos, maintained by a video_phases trigger
+
+Revision ID: 20260302_duration_sec
+Revises: 20260301_mv_admin_dashboard
+Create Date: 2026-03-02 10:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260302_duration_sec"
+down_revision = "20260301_mv_admin_dashboard"
+branch_labels = None
+depends_on = None
+
+
+MV_SQL_TEMPLATE = """
+    CREATE MATERIALIZED VIEW mv_admin_dashboard AS
+    WITH v AS (
+        SELECT
+            COUNT(*) AS total_videos,
+            COUNT(*) FILTER (WHERE status = 'DONE') AS analyzed_videos,
+            COUNT(*) FILTER (
+                WHERE upload_type = 'screen_recording' OR upload_type IS NULL
+            ) AS screen_recording_count,
+            COUNT(*) FILTER (WHERE upload_type = 'clean_video') AS clean_video_count,
+            MAX(created_at) AS latest_upload,
+            COUNT(DISTINCT user_id) AS total_streamers,
+            COUNT(DISTINCT user_id) FILTER (
+                WHERE created_at >= DATE_TRUNC('month', CURRENT_DATE)
+            ) AS this_month_uploaders
+        FROM videos
+    ),
+    u AS (
+        SELECT
+            COUNT(*) FILTER (WHERE is_active = true) AS active_users,
+            COUNT(*) AS all_users
+        FROM users
+    ),
+    d AS ({duration_sql})
+    SELECT 1 AS id, v.*, u.*, d.*, now() AS refreshed_at
+    FROM v, u, d
+"""
+
+DURATION_FROM_VIDEOS = (
+    "SELECT COALESCE(SUM(duration_sec), 0) AS total_duration_seconds FROM videos"
+)
+DURATION_FROM_PHASES = """
+        SELECT COALESCE(SUM(max_sec), 0) AS total_duration_seconds FROM (
+            SELECT MAX(COALESCE(time_end, 0)) AS max_sec
+            FROM video_phases
+            WHERE time_end IS NOT NULL
+            GROUP BY video_id
+        ) sub
+"""
+
+
+def _recreate_mv(duration_sql: str):
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS mv_admin_dashboard")
+    op.execute(MV_SQL_TEMPLATE.format(duration_sql=duration_sql))
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_mv_admin_dashboard_id "
+        "ON mv_admin_dashboard (id)"
+    )
+
+
+def upgrade():
+    # duration_sec: MAX(video_phases.time_end) per video (seconds)
+    # Kept up to date by trg_video_phases_duration so the admin dashboard
+    # can SUM over videos instead of grouping all video_phases rows.
+    op.add_column("videos", sa.Column("duration_sec", sa.Float(), nullable=True))
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION update_video_duration_sec() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.time_end IS NOT NULL THEN
+                UPDATE videos
+                SET duration_sec = GREATEST(COALESCE(duration_sec, 0), NEW.time_end)
+                WHERE id = NEW.video_id::uuid;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_video_phases_duration
+        AFTER INSERT OR UPDATE OF time_end ON video_phases
+        FOR EACH ROW EXECUTE FUNCTION update_video_duration_sec()
+    """)
+
+    # Backfill existing videos once
+    op.execute("""
+        UPDATE videos v
+        SET duration_sec = sub.max_sec
+        FROM (
+            SELECT video_id::uuid AS video_id, MAX(time_end) AS max_sec
+            FROM video_phases
+            WHERE time_end IS NOT NULL
+            GROUP BY video_id
+        ) sub
+        WHERE v.id = sub.video_id
+    """)
+
+    _recreate_mv(DURATION_FROM_VIDEOS)
+
+
+def downgrade():
+    _recreate_mv(DURATION_FROM_PHASES)
+    op.execute("DROP TRIGGER IF EXISTS trg_video_phases_duration ON video_phases")
+    op.execute("DROP FUNCTION IF EXISTS update_video_duration_sec()")
+    op.drop_column("videos", "duration_sec")
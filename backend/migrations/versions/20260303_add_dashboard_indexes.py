@@ -0,0 +1,35 @@
+"""add partial / covering indexes for admin dashboard predicates
+
+Revision ID: 20260303_dashboard_indexes
+Revises: 20260302_duration_sec
+Create Date: 2026-03-03 10:00:00.000000
+"""
+from alembic import op
+
+revision = "20260303_dashboard_indexes"
+down_revision = "20260302_duration_sec"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("idx_videos_status_done", "ON videos (id) WHERE status = 'DONE'"),
+    ("idx_videos_upload_type", "ON videos (upload_type)"),
+    ("idx_videos_created_at", "ON videos (created_at)"),
+    ("idx_users_active", "ON users (id) WHERE is_active"),
+    # Also serves MAX(time_end) per video
+    ("idx_video_phases_video_time", "ON video_phases (video_id, time_end DESC)"),
+]
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,36 @@
+"""add partial index for pending/processing video_clips and BRIN on created_at
+
+Revision ID: 20260304_video_clips_pending
+Revises: 20260303_dashboard_indexes
+Create Date: 2026-03-04 10:00:00.000000
+"""
+from alembic import op
+
+revision = "20260304_video_clips_pending"
+down_revision = "20260303_dashboard_indexes"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # Clip polling only looks at in-flight rows; completed history stays out
+    (
+        "ix_video_clips_pending",
+        "ON video_clips (video_id, phase_index) WHERE status IN ('pending', 'processing')",
+    ),
+    # Time-range cleanup over an append-mostly table
+    ("ix_video_clips_created_at_brin", "ON video_clips USING brin (created_at)"),
+]
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,44 @@
+"""store video_phases.audio_features as JSONB with a partial GIN index
+
+Revision ID: 20260305_audio_features_jsonb
+Revises: 20260304_video_clips_pending
+Create Date: 2026-03-05 10:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "20260305_audio_features_jsonb"
+down_revision = "20260304_video_clips_pending"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column(
+        "video_phases",
+        "audio_features",
+        type_=postgresql.JSONB(astext_type=sa.Text()),
+        existing_type=sa.Text(),
+        existing_nullable=True,
+        postgresql_using="NULLIF(audio_features, '')::jsonb",
+    )
+    op.create_index(
+        "ix_phases_audio_features",
+        "video_phases",
+        ["audio_features"],
+        postgresql_using="gin",
+        postgresql_where=sa.text("audio_features IS NOT NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_phases_audio_features", table_name="video_phases")
+    op.alter_column(
+        "video_phases",
+        "audio_features",
+        type_=sa.Text(),
+        existing_type=postgresql.JSONB(astext_type=sa.Text()),
+        existing_nullable=True,
+        postgresql_using="audio_features::text",
+    )
@@ -0,0 +1,61 @@
+"""narrow cta_score / step_progress to SMALLINT and bound cta_score
+
+Revision ID: 20260306_smallint_scores
+Revises: 20260305_audio_features_jsonb
+Create Date: 2026-03-06 10:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20260306_smallint_scores"
+down_revision = "20260305_audio_features_jsonb"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # cta_score is 1-5, step_progress is 0-100: 2 bytes is plenty
+    op.alter_column(
+        "video_phases",
+        "cta_score",
+        type_=sa.SmallInteger(),
+        existing_type=sa.Integer(),
+        existing_nullable=True,
+    )
+    op.alter_column(
+        "videos",
+        "step_progress",
+        type_=sa.SmallInteger(),
+        existing_type=sa.Integer(),
+        existing_nullable=True,
+        existing_server_default="0",
+    )
+    # NOT VALID: checks new writes only, so adding it needs no table scan
+    op.execute(
+        "ALTER TABLE video_phases ADD CONSTRAINT ck_video_phases_cta_score "
+        "CHECK (cta_score BETWEEN 1 AND 5) NOT VALID"
+    )
+    # Commit first, so the ACCESS EXCLUSIVE lock taken by the type changes is
+    # released; VALIDATE then scans under SHARE UPDATE EXCLUSIVE, which lets
+    # reads and writes continue
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE video_phases VALIDATE CONSTRAINT ck_video_phases_cta_score")
+
+
+def downgrade():
+    op.drop_constraint("ck_video_phases_cta_score", "video_phases", type_="check")
+    op.alter_column(
+        "videos",
+        "step_progress",
+        type_=sa.Integer(),
+        existing_type=sa.SmallInteger(),
+        existing_nullable=True,
+        existing_server_default="0",
+    )
+    op.alter_column(
+        "video_phases",
+        "cta_score",
+        type_=sa.Integer(),
+        existing_type=sa.SmallInteger(),
+        existing_nullable=True,
+    )
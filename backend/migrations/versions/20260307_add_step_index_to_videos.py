@@ -0,0 +1,55 @@
+"""add generated step_index column to videos
+
+Revision ID: 20260307_step_index
+Revises: 20260306_smallint_scores
+Create Date: 2026-03-07 10:00:00.000000
+"""
+from alembic import op
+
+revision = "20260307_step_index"
+down_revision = "20260306_smallint_scores"
+branch_labels = None
+depends_on = None
+
+
+# Must match app.utils.video_progress.VideoStep (append only, never renumber)
+STEP_INDEX = [
+    ("NEW", 0),
+    ("uploaded", 0),
+    ("STEP_COMPRESS_1080P", 1),
+    ("STEP_0_EXTRACT_FRAMES", 2),
+    ("STEP_1_DETECT_PHASES", 3),
+    ("STEP_2_EXTRACT_METRICS", 4),
+    ("STEP_3_TRANSCRIBE_AUDIO", 5),
+    ("STEP_4_IMAGE_CAPTION", 6),
+    ("STEP_5_BUILD_PHASE_UNITS", 7),
+    ("STEP_6_BUILD_PHASE_DESCRIPTION", 8),
+    ("STEP_7_GROUPING", 9),
+    ("STEP_8_UPDATE_BEST_PHASE", 10),
+    ("STEP_9_BUILD_VIDEO_STRUCTURE_FEATURES", 11),
+    ("STEP_10_ASSIGN_VIDEO_STRUCTURE_GROUP", 12),
+    ("STEP_11_UPDATE_VIDEO_STRUCTURE_GROUP_STATS", 13),
+    ("STEP_12_UPDATE_VIDEO_STRUCTURE_BEST", 14),
+    ("STEP_12_5_PRODUCT_DETECTION", 15),
+    ("STEP_13_BUILD_REPORTS", 16),
+    ("STEP_14_FINALIZE", 17),
+    ("STEP_14_SPLIT_VIDEO", 18),
+    ("DONE", 19),
+    ("ERROR", 20),
+]
+
+
+def upgrade():
+    # Generated from status, so every status writer (worker or API) keeps it
+    # in sync without code changes; unknown statuses yield NULL.
+    case_sql = "CASE status " + " ".join(
+        f"WHEN '{status}' THEN {idx}" for status, idx in STEP_INDEX
+    ) + " END"
+    op.execute(
+        f"ALTER TABLE videos ADD COLUMN step_index SMALLINT "
+        f"GENERATED ALWAYS AS ({case_sql}) STORED"
+    )
+
+
+def downgrade():
+    op.drop_column("videos", "step_index")
@@ -0,0 +1,34 @@
+"""add (video_id, phase_index) index on group_best_phases
+
+Revision ID: 20260308_phase_lookup_indexes
+Revises: 20260307_step_index
+Create Date: 2026-03-08 10:00:00.000000
+"""
+from alembic import op
+
+revision = "20260308_phase_lookup_indexes"
+down_revision = "20260307_step_index"
+branch_labels = None
+depends_on = None
+
+
+# video_phases and phase_insights already have unique (video_id, phase_index)
+# constraints; group_best_phases is only unique on group_id, so per-video
+# lookups and the per-video delete scan the table. None of these tables has
+# deleted_at, so no soft-delete partial indexes.
+INDEXES = [
+    ("ix_group_best_phases_video_phase", "ON group_best_phases (video_id, phase_index)"),
+]
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,18 @@
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+# One connection pool per process, shared by every ai/* module, so TLS
+# handshakes and sockets are not multiplied per module.
+_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+client = OpenAI(http_client=httpx.Client(http2=True, limits=_LIMITS))
+
+
+def make_async_client() -> AsyncOpenAI:
+    """
+    Async client for one event loop. httpx.AsyncClient pools are bound to
+    the loop that first uses them and the worker runs a new loop per job
+    (asyncio.run), so callers create one per top-level call and close it
+    (`async with make_async_client() as aclient:`).
+    """
+    return AsyncOpenAI(http_client=httpx.AsyncClient(http2=True, limits=_LIMITS))
@@ -1,50 +1,66 @@
-from openai import OpenAI
-from ai.prompts import PHASE_LABEL_PROMPT, INSIGHT_PROMPT
-
-client = OpenAI()
+import asyncio
+import heapq
 
+from ai._client import make_async_client
+from ai.prompts import PHASE_LABEL_PROMPT, INSIGHT_PROMPT
 
-def analyze_phases(phase_units):
-    """
-    5A – Phase behavior labeling (no insight)
-    """
-    results = []
+# Max phase-label requests in flight (bounded by the OpenAI rate limit)
+PHASE_LABEL_CONCURRENCY = 8
 
-    for p in phase_units:
-        prompt = PHASE_LABEL_PROMPT + f"""
+# Cap on phases sent to the insight model; prompt cost/latency grows linearly
+INSIGHT_MAX_PHASES = 50
 
-    Visual:
-    {p['visual_context']}
 
-    Speech:
-    {p['speech_text']}
-    """
+async def _label_one(p, sem, client):
+    # The static prompt goes in `instructions`, byte-identical across calls,
+    # so the server-side prompt cache can reuse it; only `input` varies.
+    async with sem:
+        resp = await client.responses.create(
+            model="gpt-4o-mini",
+            instructions=PHASE_LABEL_PROMPT,
+            input=f"Visual:\n{p['visual_context']}\n\nSpeech:\n{p['speech_text']}",
+        )
 
-    resp = client.responses.create(
-        model="gpt-4o-mini",
-        input=prompt
-    )
-
-    results.append({
+    return {
         **p,
         "behavior_label": resp.output_text.strip()
-    })
+    }
 
-    return results
 
+async def analyze_phases(phase_units):
+    """
+    5A – Phase behavior labeling (no insight)
+    Phases are labeled concurrently; results keep the input order.
+    """
+    sem = asyncio.Semaphore(PHASE_LABEL_CONCURRENCY)
+    async with make_async_client() as client:
+        return await asyncio.gather(*(_label_one(p, sem, client) for p in phase_units))
 
-def analyze_livestream(labeled_phases):
+
+async def analyze_livestream(labeled_phases):
     """
     5B – Cross-phase insight reasoning
+    Only the INSIGHT_MAX_PHASES most relevant phases (by cta_score) are sent,
+    kept in their original order.
     """
-    prompt = INSIGHT_PROMPT + "\n\n" + "\n".join(
+    if len(labeled_phases) > INSIGHT_MAX_PHASES:
+        top_idx = heapq.nlargest(
+            INSIGHT_MAX_PHASES,
+            range(len(labeled_phases)),
+            key=lambda i: labeled_phases[i].get("cta_score") or 0,
+        )
+        labeled_phases = [labeled_phases[i] for i in sorted(top_idx)]
+
+    body = "\n".join(
         f"- {p['behavior_label']}: {p['speech_text'][:100]}"
         for p in labeled_phases
     )
 
-    resp = client.responses.create(
-        model="gpt-4o",
-        input=prompt
-    )
+    async with make_async_client() as client:
+        resp = await client.responses.create(
+            model="gpt-4o",
+            instructions=INSIGHT_PROMPT,
+            input=body,
+        )
 
     return resp.output_text
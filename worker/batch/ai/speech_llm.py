@@ -1,15 +1,73 @@
-from openai import OpenAI
+import hashlib
+import os
+import subprocess
+import tempfile
 
-client = OpenAI()
+from openai.types.audio import TranscriptionVerbose
+
+from ai._client import client
+
+FFMPEG_BIN = os.getenv("FFMPEG_PATH", "ffmpeg")
+# Transcriptions keyed by SHA-256 of the uploaded Opus bytes; under the system
+# temp dir (like DETECTION_CACHE_DIR) so it is not tied to the cwd
+TRANSCRIPTION_CACHE_DIR = os.getenv(
+    "TRANSCRIPTION_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "transcription_cache"),
+)
+
+
+def _to_opus(audio_path: str, out_path: str):
+    """
+    Speech-only re-encode: mono, 16 kHz, Opus 24 kbps in an Ogg container
+    (far fewer bytes to upload; the API accepts .ogg but not .opus)
+    """
+    subprocess.run(
+        [
+            FFMPEG_BIN, "-y", "-loglevel", "error",
+            "-i", audio_path,
+            "-vn", "-ac", "1", "-ar", "16000",
+            "-c:a", "libopus", "-b:a", "24k",
+            "-f", "ogg",
+            out_path,
+        ],
+        check=True,
+    )
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
 
 def transcribe_audio(audio_path: str):
     """
     Audio -> text with timestamp (GPT-4o)
+    The audio is re-encoded to Opus (speech.ogg) before upload; re-runs on the same audio
+    are served from TRANSCRIPTION_CACHE_DIR.
     """
-    with open(audio_path, "rb") as f:
-        return client.audio.transcriptions.create(
-            file=f,
-            model="gpt-4o-transcribe",
-            response_format="verbose_json"
-        )
+    with tempfile.TemporaryDirectory() as tmp:
+        # The endpoint picks the format from the extension: Ogg/Opus must be .ogg
+        opus_path = os.path.join(tmp, "speech.ogg")
+        _to_opus(audio_path, opus_path)
+
+        cache_path = os.path.join(TRANSCRIPTION_CACHE_DIR, f"{_sha256(opus_path)}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return TranscriptionVerbose.model_validate_json(f.read())
+
+        with open(opus_path, "rb") as f:
+            result = client.audio.transcriptions.create(
+                file=f,
+                model="gpt-4o-transcribe",
+                response_format="verbose_json"
+            )
+
+    os.makedirs(TRANSCRIPTION_CACHE_DIR, exist_ok=True)
+    tmp_cache = f"{cache_path}.tmp"
+    with open(tmp_cache, "w", encoding="utf-8") as f:
+        f.write(result.model_dump_json())
+    os.replace(tmp_cache, cache_path)
+    return result
@@ -1,28 +1,81 @@
-from openai import OpenAI
+import asyncio
 import base64
 import cv2
 
-client = OpenAI()
+from ai._client import client, make_async_client
+
+JPEG_QUALITY = 75
+
+# Max caption requests in flight for caption_keyframes
+KEYFRAME_CAPTION_CONCURRENCY = 8
+
+CAPTION_PROMPT = "Describe what is happening in this livestream frame."
+
+# libjpeg-turbo (SIMD) encoder when available; falls back to cv2.imencode
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _tj = TurboJPEG()
+except Exception:  # ImportError, or the native library is missing
+    _tj = None
+
+
+def encode_jpeg(frame) -> bytes:
+    """BGR frame -> JPEG bytes at JPEG_QUALITY."""
+    if _tj is not None:
+        return _tj.encode(frame, quality=JPEG_QUALITY, pixel_format=TJPF_BGR)
+    _, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    return buf.tobytes()
+
+
+def _frame_to_data_url(frame) -> str:
+    img_b64 = base64.b64encode(encode_jpeg(frame)).decode("ascii")
+    return f"data:image/jpeg;base64,{img_b64}"
+
+
+def _caption_input(data_url: str) -> list:
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "input_text", "text": CAPTION_PROMPT},
+                {"type": "input_image", "image_url": data_url}
+            ]
+        }
+    ]
 
 
 def caption_keyframe(frame):
     """
     Key frame -> visual description
     """
-    _, buf = cv2.imencode(".jpg", frame)
-    img_b64 = base64.b64encode(buf).decode()
-
     resp = client.responses.create(
         model="gpt-4o-mini",
-        input=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "input_text", "text": "Describe what is happening in this livestream frame."},
-                    {"type": "input_image", "image_base64": img_b64}
-                ]
-            }
-        ]
+        input=_caption_input(_frame_to_data_url(frame))
     )
 
     return resp.output_text
+
+
+async def caption_keyframe_async(frame, sem: asyncio.Semaphore, aclient):
+    """
+    Key frame -> visual description, without blocking the event loop.
+    JPEG encode + base64 run in a worker thread (libjpeg-turbo and cv2 release
+    the GIL), so they overlap with in-flight GPT calls.
+    """
+    data_url = await asyncio.to_thread(_frame_to_data_url, frame)
+    async with sem:
+        resp = await aclient.responses.create(
+            model="gpt-4o-mini",
+            input=_caption_input(data_url)
+        )
+
+    return resp.output_text
+
+
+async def caption_keyframes(frames):
+    """
+    Caption many key frames concurrently; results keep the input order.
+    """
+    sem = asyncio.Semaphore(KEYFRAME_CAPTION_CONCURRENCY)
+    async with make_async_client() as aclient:
+        return await asyncio.gather(*(caption_keyframe_async(f, sem, aclient) for f in frames))
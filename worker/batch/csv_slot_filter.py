@@ -6,7 +6,12 @@ CSV Slot Filter – CSVデータから注目タイムスロットを検出し、
 重点解析することで、GPT Vision API呼び出しを大幅に削減する。
 """
 import logging
+import re
+from bisect import bisect_right
 from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
 
 logger = logging.getLogger("process_video")
 
@@ -154,6 +159,17 @@ KPI_ALIASES = {
 }
 
 
+# 小文字化済みの候補キー（インポート時に一度だけ計算、順序は優先度）
+KPI_ALIASES_LOWER: dict[str, tuple[str, ...]] = {
+    kpi: tuple(dict.fromkeys(a.lower() for a in aliases))
+    for kpi, aliases in KPI_ALIASES.items()
+}
+# 集合演算（C実装）で一致判定するための frozenset 版
+KPI_ALIASES_LC: dict[str, frozenset[str]] = {
+    kpi: frozenset(aliases) for kpi, aliases in KPI_ALIASES_LOWER.items()
+}
+
+
 def get_kpi_aliases(kpi_name: str) -> list[str]:
     """KPI名から多言語候補キーリストを取得する。"""
     return KPI_ALIASES.get(kpi_name, [kpi_name])
@@ -169,14 +185,16 @@ RULES = [
     {
         "name": "high_gmv",
         "description": "GMVが高い（売上発生）",
-        "keys": KPI_ALIASES["gmv"],
+        "kpi": "gmv",
+        "keys": KPI_ALIASES_LC["gmv"],
         "condition": "gt_zero",
         "weight": 3,
     },
     {
         "name": "high_orders",
         "description": "成約件数が多い",
-        "keys": KPI_ALIASES["order_count"],
+        "kpi": "order_count",
+        "keys": KPI_ALIASES_LC["order_count"],
         "condition": "gt_zero",
         "weight": 3,
     },
@@ -184,14 +202,16 @@ RULES = [
     {
         "name": "high_conversion",
         "description": "クリック成交転化率が高い",
-        "keys": KPI_ALIASES["ctor"],
+        "kpi": "ctor",
+        "keys": KPI_ALIASES_LC["ctor"],
         "condition": "above_mean",
         "weight": 2,
     },
     {
         "name": "high_gmv_per_view",
         "description": "千次観看成交金額が高い",
-        "keys": KPI_ALIASES["gpm"],
+        "kpi": "gpm",
+        "keys": KPI_ALIASES_LC["gpm"],
         "condition": "above_mean",
         "weight": 2,
     },
@@ -199,55 +219,116 @@ RULES = [
     {
         "name": "high_viewers",
         "description": "観看人数が多い",
-        "keys": KPI_ALIASES["viewer_count"],
+        "kpi": "viewer_count",
+        "keys": KPI_ALIASES_LC["viewer_count"],
         "condition": "above_mean",
         "weight": 1,
     },
     {
         "name": "high_comments",
         "description": "コメント率が高い",
-        "keys": KPI_ALIASES["comment_rate"],
+        "kpi": "comment_rate",
+        "keys": KPI_ALIASES_LC["comment_rate"],
         "condition": "above_mean",
         "weight": 1,
     },
     {
         "name": "high_click_rate",
         "description": "直播点击率が高い",
-        "keys": KPI_ALIASES["live_ctr"],
+        "kpi": "live_ctr",
+        "keys": KPI_ALIASES_LC["live_ctr"],
         "condition": "above_mean",
         "weight": 1,
     },
     {
         "name": "new_followers",
         "description": "新規フォロワー獲得",
-        "keys": KPI_ALIASES["new_followers"],
+        "kpi": "new_followers",
+        "keys": KPI_ALIASES_LC["new_followers"],
         "condition": "gt_zero",
         "weight": 2,
     },
 ]
 
+# ルール i の判定結果を bit i で表す（RULES は 8 件以下なので 1 バイトに収まる）
+_RULE_NAMES = tuple(r["name"] for r in RULES)
+
+
+def _rule_names(rule_mask: int) -> list[str]:
+    """rule_mask ビット集合 → ルール名リスト（RULES 順）"""
+    return [name for i, name in enumerate(_RULE_NAMES) if rule_mask >> i & 1]
+
+
 
 # ======================================================
 # HELPER FUNCTIONS
 # ======================================================
 
+def _build_lower_index(entry: dict) -> dict[str, str]:
+    """エントリのキーの 小文字→元キー マップを作る（ファイル毎に一度だけ）"""
+    return {k.lower(): k for k in entry.keys()}
+
+
+def _find_key_in_index(
+    lower_index: dict[str, str],
+    aliases_lc: frozenset[str],
+    priority: tuple[str, ...] = (),
+) -> str | None:
+    """
+    小文字化済み候補キー集合と lower_index の積集合で元のキーを返す。
+    複数一致した場合は priority（候補リストの順序）で先勝ち。
+    """
+    hit = lower_index.keys() & aliases_lc
+    if not hit:
+        return None
+    if len(hit) == 1:
+        return lower_index[next(iter(hit))]
+    for ck in priority:
+        if ck in hit:
+            return lower_index[ck]
+    return lower_index[min(hit)]
+
+
+@lru_cache(maxsize=256)
+def _find_key_cached(header: tuple[str, ...], candidate_keys: tuple[str, ...]) -> str | None:
+    ordered = tuple(dict.fromkeys(ck.lower() for ck in candidate_keys))
+    lower_index = {k.lower(): k for k in header}
+    return _find_key_in_index(lower_index, frozenset(ordered), ordered)
+
+
 def _find_key(entry: dict, candidate_keys: list[str]) -> str | None:
-    """エントリから候補キーにマッチするキーを探す（大文字小文字無視）"""
-    entry_keys_lower = {k.lower(): k for k in entry.keys()}
-    for ck in candidate_keys:
-        if ck.lower() in entry_keys_lower:
-            return entry_keys_lower[ck.lower()]
-    return None
+    """
+    エントリから候補キーにマッチするキーを探す（大文字小文字無視）。
+    同じヘッダー×候補リストの組み合わせは一度だけ解決してキャッシュする。
+    """
+    return _find_key_cached(tuple(entry), tuple(candidate_keys))
+
+
+_NUM_RE = re.compile(r"^[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?$")
 
 
 def _safe_float(val) -> float | None:
-    """安全にfloatに変換"""
+    """安全にfloatに変換（非数値セルは例外を発生させずに None）"""
     if val is None:
         return None
-    try:
+    t = type(val)
+    if t is float:
+        return val
+    if t is int:
         return float(val)
-    except (ValueError, TypeError):
-        return None
+    if t is str:
+        s = val.strip()
+        if not s:
+            return None
+    elif isinstance(val, (int, float)):  # bool / numpy scalars
+        return float(val)
+    else:
+        s = str(val).strip()
+    s = s.replace(",", "")
+    return float(s) if _NUM_RE.match(s) else None
+
+
+_TIME_RE = re.compile(r"^(\d+):(\d+)(?::(\d+))?$")
 
 
 def _parse_time_to_seconds(val) -> float | None:
@@ -262,45 +343,55 @@ def _parse_time_to_seconds(val) -> float | None:
     if hasattr(val, 'hour') and hasattr(val, 'minute'):
         return val.hour * 3600 + val.minute * 60 + getattr(val, 'second', 0)
 
-    val_str = str(val).strip()
-
-    # 直接数値の場合
-    try:
-        return float(val_str)
-    except (ValueError, TypeError):
-        pass
-
-    # HH:MM:SS or HH:MM or MM:SS
-    parts = val_str.split(":")
-    try:
-        if len(parts) == 2:
-            h, m = int(parts[0]), int(parts[1])
-            # HH:MM形式（時間が24未満ならHH:MM）
-            if h < 24:
-                return h * 3600 + m * 60
-            else:
-                return h * 60 + m
-        elif len(parts) == 3:
-            return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-    except (ValueError, TypeError):
-        pass
-
-    return None
+    # 直接数値の場合（文字列化せずに返す。bool は従来通り非対応）
+    if isinstance(val, (int, float)) and not isinstance(val, bool):
+        return float(val)
 
+    val_str = str(val).strip()
 
-def _detect_time_key(entries: list[dict]) -> str | None:
-    """トレンドデータから時刻カラムを自動検出（多言語対応）"""
+    # HH:MM:SS or HH:MM or MM:SS（通常はここで決まり、例外は発生しない）
+    m = _TIME_RE.match(val_str)
+    if m is None:
+        # 数値文字列の場合
+        try:
+            return float(val_str)
+        except ValueError:
+            return None
+    h, mi, sec = m.groups()
+    if sec is not None:
+        return int(h) * 3600 + int(mi) * 60 + int(sec)
+    h, mi = int(h), int(mi)
+    # HH:MM形式（時間が24未満ならHH:MM）
+    if h < 24:
+        return h * 3600 + mi * 60
+    return h * 60 + mi
+
+
+# 時刻カラム名の部分一致キーワード（小文字化済みの列名に対して一回で検索）
+_TIME_KEY_RE = re.compile("时间|時間|time|시간|waktu|เวลา")
+
+
+def _detect_time_key(
+    entries: list[dict],
+    lower_index: dict[str, str] | None = None,
+) -> str | None:
+    """
+    トレンドデータから時刻カラムを自動検出（多言語対応）。
+    呼び出し側で _build_lower_index(entries[0]) 済みなら lower_index に渡す。
+    """
     if not entries:
         return None
-    sample = entries[0]
+    if lower_index is None:
+        lower_index = _build_lower_index(entries[0])
     # KPI_ALIASES["time"]を先にチェック
-    found = _find_key(sample, KPI_ALIASES["time"])
+    found = _find_key_in_index(
+        lower_index, KPI_ALIASES_LC["time"], KPI_ALIASES_LOWER["time"]
+    )
     if found:
         return found
     # フォールバック: 部分一致
-    for k in sample.keys():
-        kl = k.lower()
-        if any(w in kl for w in ["时间", "時間", "time", "timestamp", "시간", "waktu", "เวลา"]):
+    for kl, k in lower_index.items():
+        if _TIME_KEY_RE.search(kl):
             return k
     return None
 
@@ -315,66 +406,71 @@ def compute_slot_scores(trends: list[dict]) -> list[dict]:
     ルールに基づいて各指標を評価し、重み付きスコアを算出。
 
     Returns:
-        list of {time_key, time_sec, score, matched_rules, raw_entry}
+        list of {time_key, time_sec, score, rule_mask, entry_index}
+        ※ rule_mask は成立したルールのビット集合（名前は _rule_names() で展開）
+        ※ entry_index は trends 内の位置（元の dict は保持しない）
     """
     if not trends:
         return []
 
-    time_key = _detect_time_key(trends)
+    lower_index = _build_lower_index(trends[0])
+    time_key = _detect_time_key(trends, lower_index)
     if not time_key:
         logger.warning("[CSV_FILTER] No time column found in trend data")
         return []
 
-    # 全エントリの数値を事前計算（平均算出用）
-    all_values = {}
-    for rule in RULES:
-        matched_key = _find_key(trends[0], rule["keys"])
-        if matched_key:
-            vals = [_safe_float(t.get(matched_key)) for t in trends]
-            vals = [v for v in vals if v is not None]
-            if vals:
-                all_values[rule["name"]] = {
-                    "key": matched_key,
-                    "mean": sum(vals) / len(vals),
-                    "values": vals,
-                }
+    # 各指標を列ごとに一度だけ数値化し、ルール判定をベクトル演算で行う
+    bits, weights, masks = [], [], []  # active rules, in RULES order
+    for rule_idx, rule in enumerate(RULES):
+        matched_key = _find_key_in_index(
+            lower_index, rule["keys"], KPI_ALIASES_LOWER[rule["kpi"]]
+        )
+        if not matched_key:
+            continue
+        col = np.array(
+            [_safe_float(t.get(matched_key)) for t in trends], dtype=np.float64
+        )  # None -> nan
+        valid = ~np.isnan(col)
+        if not valid.any():
+            continue
+
+        # NaN comparisons are False, so missing cells never trigger
+        if rule["condition"] == "gt_zero":
+            mask = col > 0
+        elif rule["condition"] == "above_mean":
+            # Left-to-right sum (not np.nanmean's pairwise sum) keeps the
+            # threshold bit-identical to the original per-row implementation
+            vals = col[valid].tolist()
+            mask = col > sum(vals) / len(vals)
+        else:
+            continue
+        bits.append(1 << rule_idx)
+        weights.append(rule["weight"])
+        masks.append(mask)
+
+    if not masks:
+        # どのルールにも有効な数値がない → 全スロット score=0 になるだけなので打ち切る
+        logger.warning("[CSV_FILTER] No usable KPI values for any rule")
+        return []
+
+    mask_matrix = np.vstack(masks)  # (rules, rows)
+    scores = (np.array(weights, dtype=np.int32) @ mask_matrix).tolist()
+    rule_masks = (np.array(bits, dtype=np.int32) @ mask_matrix).tolist()
 
     # 各スロットにスコアを付与
     scored_slots = []
-    for entry in trends:
+    for i, entry in enumerate(trends):
         time_val = entry.get(time_key)
         time_sec = _parse_time_to_seconds(time_val)
         if time_sec is None:
             continue
 
-        score = 0
-        matched_rules = []
-
-        for rule in RULES:
-            rule_info = all_values.get(rule["name"])
-            if not rule_info:
-                continue
-
-            val = _safe_float(entry.get(rule_info["key"]))
-            if val is None:
-                continue
-
-            triggered = False
-            if rule["condition"] == "gt_zero":
-                triggered = val > 0
-            elif rule["condition"] == "above_mean":
-                triggered = val > rule_info["mean"]
-
-            if triggered:
-                score += rule["weight"]
-                matched_rules.append(rule["name"])
-
         scored_slots.append({
             "time_key": str(time_val),
             "time_sec": time_sec,
-            "score": score,
-            "matched_rules": matched_rules,
-            "raw_entry": entry,
+            "score": scores[i],
+            "rule_mask": rule_masks[i],
+            "entry_index": i,
         })
 
     return scored_slots
@@ -417,21 +513,20 @@ def get_important_time_ranges(
             scored[0]["time_key"], video_start_time_sec,
         )
 
-    # 注目スロットをフィルタ
-    important = [s for s in scored if s["score"] >= min_score]
-
-    if not important:
-        logger.info("[CSV_FILTER] No important slots found (all scores < %d)", min_score)
-        return []
-
-    logger.info(
-        "[CSV_FILTER] Found %d important slots out of %d total",
-        len(important), len(scored),
-    )
-
-    # 各スロットの前後マージンを含む範囲を計算
+    # 注目スロットの範囲構築とスキップ数の集計を一回の走査で行う
+    debug = logger.isEnabledFor(logging.DEBUG)
     ranges = []
-    for slot in important:
+    skipped = 0
+    for slot in scored:
+        if slot["score"] < min_score:
+            skipped += 1
+            if debug:
+                logger.debug(
+                    "[CSV_FILTER] SKIP slot %s (score=%d < %d)",
+                    slot["time_key"], slot["score"], min_score,
+                )
+            continue
+
         # CSVの時刻を動画内の秒数に変換
         slot_video_sec = slot["time_sec"] - video_start_time_sec
 
@@ -444,73 +539,126 @@ def get_important_time_ranges(
             "start_frame": int(range_start),  # fps=1
             "end_frame": int(range_end),       # fps=1
             "score": slot["score"],
-            "reasons": slot["matched_rules"],
+            "rule_mask": slot["rule_mask"],
             "slot_time": slot["time_key"],
         })
 
+    if not ranges:
+        logger.info("[CSV_FILTER] No important slots found (all scores < %d)", min_score)
+        return []
+
+    logger.info(
+        "[CSV_FILTER] Found %d important slots out of %d total",
+        len(ranges), len(scored),
+    )
+
     # 重複範囲をマージ
     merged = _merge_overlapping_ranges(ranges)
-
     for r in merged:
-        logger.info(
-            "[CSV_FILTER] Range: %d-%d sec (frame %d-%d), score=%d, reasons=%s",
-            r["start_sec"], r["end_sec"],
-            r["start_frame"], r["end_frame"],
-            r["score"], r["reasons"],
-        )
+        r["reasons"] = _rule_names(r["rule_mask"])
 
-    skipped_slots = [s for s in scored if s["score"] < min_score]
-    for s in skipped_slots:
+    if logger.isEnabledFor(logging.INFO):
         logger.info(
-            "[CSV_FILTER] SKIP slot %s (score=%d < %d)",
-            s["time_key"], s["score"], min_score,
+            "[CSV_FILTER] %d ranges:\n%s",
+            len(merged),
+            "\n".join(
+                "  %d-%d sec (frame %d-%d), score=%d, reasons=%s" % (
+                    r["start_sec"], r["end_sec"],
+                    r["start_frame"], r["end_frame"],
+                    r["score"], r["reasons"],
+                )
+                for r in merged
+            ),
         )
 
+    logger.info("[CSV_FILTER] Skipped %d slots (score<%d)", skipped, min_score)
+
     return merged
 
 
 def _merge_overlapping_ranges(ranges: list[dict]) -> list[dict]:
-    """重複する範囲をマージ"""
+    """
+    重複する範囲をマージ（start_sec順の一回スイープ）。
+    成立ルールは rule_mask のビット OR で合算する。
+    """
     if not ranges:
         return []
 
-    # start_secでソート
-    sorted_ranges = sorted(ranges, key=lambda r: r["start_sec"])
-    merged = [sorted_ranges[0].copy()]
-
-    for r in sorted_ranges[1:]:
-        last = merged[-1]
-        if r["start_sec"] <= last["end_sec"]:
+    merged = []
+    cur = None
+    for r in sorted(ranges, key=lambda r: r["start_sec"]):
+        if cur is not None and r["start_sec"] <= cur["end_sec"]:
             # 重複 → マージ
-            last["end_sec"] = max(last["end_sec"], r["end_sec"])
-            last["end_frame"] = max(last["end_frame"], r["end_frame"])
-            last["score"] = max(last["score"], r["score"])
-            last["reasons"] = list(set(last["reasons"] + r["reasons"]))
+            cur["end_sec"] = max(cur["end_sec"], r["end_sec"])
+            cur["end_frame"] = max(cur["end_frame"], r["end_frame"])
+            cur["score"] = max(cur["score"], r["score"])
+            cur["rule_mask"] |= r["rule_mask"]
         else:
-            merged.append(r.copy())
+            if cur is not None:
+                merged.append(cur)
+            cur = r.copy()
 
+    merged.append(cur)
     return merged
 
 
+def _build_range_index(important_ranges: list[dict]) -> tuple[list[int], list[int]]:
+    """
+    start_frame 昇順の開始位置リストと、その順での end_frame の累積最大値を返す。
+    重なり判定を O(log R) にするための索引（範囲ごとに一度だけ構築）。
+    """
+    ordered = sorted(important_ranges, key=lambda r: r["start_frame"])
+    starts = [r["start_frame"] for r in ordered]
+    ends_prefix_max = []
+    running = float("-inf")
+    for r in ordered:
+        running = max(running, r["end_frame"])
+        ends_prefix_max.append(running)
+    return starts, ends_prefix_max
+
+
+def _overlaps_any(
+    range_index: tuple[list[int], list[int]],
+    phase_start_frame: int,
+    phase_end_frame: int,
+) -> bool:
+    """start_frame <= phase_end の範囲のうち、end_frame >= phase_start のものがあるか"""
+    starts, ends_prefix_max = range_index
+    idx = bisect_right(starts, phase_end_frame)
+    return idx > 0 and ends_prefix_max[idx - 1] >= phase_start_frame
+
+
+def _overlap_mask(
+    phase_starts: np.ndarray,
+    phase_ends: np.ndarray,
+    range_index: tuple[list[int], list[int]],
+) -> np.ndarray:
+    """_overlaps_any を全フェーズ一括で評価（searchsorted によるベクトル化）"""
+    starts, ends_prefix_max = range_index
+    idx = np.searchsorted(np.asarray(starts, dtype=np.float64), phase_ends, side="right")
+    # idx == 0（どの範囲も phase_end より後に始まる）は先頭に番兵 -inf を置いて False にする
+    prefix = np.concatenate(([-np.inf], np.asarray(ends_prefix_max, dtype=np.float64)))
+    return prefix[idx] >= phase_starts
+
+
 def is_phase_in_important_range(
     phase_start_frame: int,
     phase_end_frame: int,
     important_ranges: list[dict],
+    range_index: tuple[list[int], list[int]] | None = None,
 ) -> bool:
     """
     フェーズが注目範囲内にあるかチェック。
     フェーズの一部でも注目範囲と重なっていればTrue。
+    複数フェーズを判定する場合は _build_range_index() の結果を range_index に渡す。
     """
     if not important_ranges:
         # 注目範囲が未設定の場合は全フェーズを解析
         return True
 
-    for r in important_ranges:
-        # 範囲が重なるかチェック
-        if phase_start_frame <= r["end_frame"] and phase_end_frame >= r["start_frame"]:
-            return True
-
-    return False
+    if range_index is None:
+        range_index = _build_range_index(important_ranges)
+    return _overlaps_any(range_index, phase_start_frame, phase_end_frame)
 
 
 def filter_phases_by_importance(
@@ -533,14 +681,10 @@ def filter_phases_by_importance(
         # 注目範囲が未設定 → 全フェーズを解析
         return [True] * (len(keyframes) + 1)
 
-    extended = [0] + keyframes + [total_frames - 1]
-    results = []
-
-    for i in range(len(extended) - 1):
-        start = extended[i]
-        end = extended[i + 1]
-        is_important = is_phase_in_important_range(start, end, important_ranges)
-        results.append(is_important)
+    extended = np.asarray([0] + keyframes + [total_frames - 1], dtype=np.float64)
+    results = _overlap_mask(
+        extended[:-1], extended[1:], _build_range_index(important_ranges)
+    ).tolist()
 
     important_count = sum(results)
     total_count = len(results)
@@ -3,12 +3,15 @@ Database operations for batch worker.
 Provides synchronous wrappers around async SQLAlchemy operations.
 """
 import asyncio, uuid
+import concurrent.futures
+import threading
 import os, json
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import JSONB
 
 
 
@@ -21,10 +24,19 @@ if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set in environment")
 
 # Create async engine
+# Batch runs are short-lived, so no pre-ping (an extra SELECT 1 per checkout);
+# asyncpg keeps prepared statements per connection so the fixed INSERT/UPDATE
+# texts below are parsed/planned once per connection, not once per call.
 engine = create_async_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=False,
     echo=False,
+    connect_args={
+        "statement_cache_size": 1024,
+        "prepared_statement_cache_size": 1024,
+    },
 )
 
 AsyncSessionLocal = sessionmaker(
@@ -33,19 +45,35 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
-# Global event loop for reuse (avoids asyncpg pool conflicts)
+# Global event loop for reuse (avoids asyncpg pool conflicts).
+# It runs forever in a daemon thread; sync callers submit coroutines to it
+# instead of re-entering it with run_until_complete on every call.
 _loop = None
+_loop_lock = threading.Lock()
 
 
 def get_event_loop():
-    """Get or create a persistent event loop for DB operations."""
+    """Get or start the persistent event loop (running in its own thread) for DB operations."""
     global _loop
-    if _loop is None or _loop.is_closed():
-        _loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(_loop)
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="db-loop", daemon=True
+            ).start()
     return _loop
 
 
+def submit(coro) -> concurrent.futures.Future:
+    """Schedule `coro` on the DB loop and return a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_sync(coro):
+    """Run `coro` on the DB loop and block until its result (or exception)."""
+    return submit(coro).result()
+
+
 @asynccontextmanager
 async def get_session():
     """Async context manager for database sessions."""
@@ -60,9 +88,12 @@ async def get_session():
             await session.close()
 
 
+_PING_SQL = text("SELECT 1")
+
+
 async def init_db():
     async with get_session() as session:
-        await session.execute(text("SELECT 1"))
+        await session.execute(_PING_SQL)
     print("[DB] Database connection initialized successfully")
 
 
@@ -74,14 +105,27 @@ async def close_db():
 
 def init_db_sync():
     """Synchronous wrapper for database initialization."""
-    loop = get_event_loop()
-    loop.run_until_complete(init_db())
+    run_sync(init_db())
 
 
 def close_db_sync():
     """Synchronous wrapper for database cleanup."""
-    loop = get_event_loop()
-    loop.run_until_complete(close_db())
+    run_sync(close_db())
+
+
+_INSERT_PHASE_SQL = text(
+    """
+    INSERT INTO phases (
+        video_id, phase_group_id, phase_index, phase_description,
+        time_start, time_end, view_start, view_end,
+        like_start, like_end, delta_view, delta_like
+    ) VALUES (
+        :video_id, :phase_group_id, :phase_index, :phase_description,
+        :time_start, :time_end, :view_start, :view_end,
+        :like_start, :like_end, :delta_view, :delta_like
+    ) RETURNING id
+    """
+)
 
 
 async def insert_phase(
@@ -99,22 +143,8 @@ async def insert_phase(
     phase_group_id: int | None = None,
 ):
     """Insert a phase row and return the generated UUID as string."""
-    sql = text(
-        """
-        INSERT INTO phases (
-            video_id, phase_group_id, phase_index, phase_description,
-            time_start, time_end, view_start, view_end,
-            like_start, like_end, delta_view, delta_like
-        ) VALUES (
-            :video_id, :phase_group_id, :phase_index, :phase_description,
-            :time_start, :time_end, :view_start, :view_end,
-            :like_start, :like_end, :delta_view, :delta_like
-        ) RETURNING id
-        """
-    )
-
     async with AsyncSessionLocal() as session:
-        result = await session.execute(sql, {
+        result = await session.execute(_INSERT_PHASE_SQL, {
             "video_id": video_id,
             "phase_group_id": phase_group_id,
             "phase_index": phase_index,
@@ -140,8 +170,86 @@ async def insert_phase(
 
 def insert_phase_sync(*args, **kwargs):
     """Synchronous wrapper for `insert_phase` that returns the new id as string."""
-    loop = get_event_loop()
-    return loop.run_until_complete(insert_phase(*args, **kwargs))
+    return run_sync(insert_phase(*args, **kwargs))
+
+
+def insert_phase_future(*args, **kwargs) -> concurrent.futures.Future:
+    """Like `insert_phase_sync` but non-blocking; `.result()` gives the new id."""
+    return submit(insert_phase(*args, **kwargs))
+
+
+async def insert_phases_bulk(rows: list[dict]) -> dict[int, str]:
+    """
+    Insert many phase rows in one statement / one transaction.
+
+    rows = [
+      {
+        "video_id": str,
+        "phase_index": int,
+        "phase_group_id": int | None,
+        "phase_description": str | None,
+        "time_start": float | None,
+        "time_end": float | None,
+        "view_start": int | None,
+        "view_end": int | None,
+        "like_start": int | None,
+        "like_end": int | None,
+        "delta_view": int | None,
+        "delta_like": int | None,
+      }
+    ]
+
+    Returns {phase_index: generated id as string}. RETURNING rows come back in
+    no guaranteed order, so ids are keyed by phase_index instead of position;
+    phase_index must therefore be unique within `rows`.
+    """
+
+    if not rows:
+        return {}
+    if len({r["phase_index"] for r in rows}) != len(rows):
+        raise ValueError("insert_phases_bulk: duplicate phase_index in rows")
+
+    sql = text("""
+        INSERT INTO phases (
+            video_id, phase_group_id, phase_index, phase_description,
+            time_start, time_end, view_start, view_end,
+            like_start, like_end, delta_view, delta_like
+        )
+        SELECT
+            x.video_id, x.phase_group_id, x.phase_index, x.phase_description,
+            x.time_start, x.time_end, x.view_start, x.view_end,
+            x.like_start, x.like_end, x.delta_view, x.delta_like
+        FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS x(
+            video_id uuid,
+            phase_group_id int,
+            phase_index int,
+            phase_description text,
+            time_start float8,
+            time_end float8,
+            view_start int,
+            view_end int,
+            like_start int,
+            like_end int,
+            delta_view int,
+            delta_like int
+        )
+        RETURNING id, phase_index
+    """)
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(sql, {"rows": json.dumps(rows)})
+        ids = {r[1]: str(r[0]) for r in result.fetchall()}
+        await session.commit()
+
+    if len(ids) != len(rows):
+        raise RuntimeError("Failed to insert phases")
+
+    return ids
+
+
+def insert_phases_bulk_sync(rows: list[dict]) -> dict[int, str]:
+    """Synchronous wrapper for `insert_phases_bulk`."""
+    return run_sync(insert_phases_bulk(rows))
 
 
 # ---------- Helper ----------
@@ -154,8 +262,7 @@ async def get_user_id_of_video(video_id: str) -> int | None:
 
 
 def get_user_id_of_video_sync(video_id: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(get_user_id_of_video(video_id))
+    return run_sync(get_user_id_of_video(video_id))
 
 
 # ---------- STEP 5: insert video_phases ----------
@@ -218,8 +325,7 @@ async def insert_video_phase(
 
 
 def insert_video_phase_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(insert_video_phase(*args, **kwargs))
+    return run_sync(insert_video_phase(*args, **kwargs))
 
 
 # ---------- STEP 6: update phase_description ----------
@@ -247,8 +353,7 @@ async def update_video_phase_description(
 
 
 def update_video_phase_description_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(update_video_phase_description(*args, **kwargs))
+    return run_sync(update_video_phase_description(*args, **kwargs))
 
 
 # ---------- STEP 7: upsert phase_groups + update video_phases ----------
@@ -289,8 +394,7 @@ async def get_all_phase_groups(user_id: int):
 
 
 def get_all_phase_groups_sync(user_id: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(get_all_phase_groups(user_id))
+    return run_sync(get_all_phase_groups(user_id))
 
 
 
@@ -337,8 +441,7 @@ async def update_phase_group_for_video_phase(video_id: str, phase_index: int, gr
 
 
 def update_phase_group_for_video_phase_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(update_phase_group_for_video_phase(*args, **kwargs))
+    return run_sync(update_phase_group_for_video_phase(*args, **kwargs))
 
 
 async def create_phase_group(
@@ -374,8 +477,7 @@ async def create_phase_group(
 
 
 def create_phase_group_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(create_phase_group(*args, **kwargs))
+    return run_sync(create_phase_group(*args, **kwargs))
 
 
 async def update_phase_group(group_id: int, centroid: list[float], size: int):
@@ -396,8 +498,7 @@ async def update_phase_group(group_id: int, centroid: list[float], size: int):
 
 
 def update_phase_group_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(update_phase_group(*args, **kwargs))
+    return run_sync(update_phase_group(*args, **kwargs))
 
 # ---------- STEP 8: upsert group_best_phases ----------
 # ---------- STEP 8 BULK OPS ----------
@@ -465,8 +566,7 @@ async def bulk_upsert_group_best_phases(
 
 
 def bulk_upsert_group_best_phases_sync(user_id, rows):
-    loop = get_event_loop()
-    return loop.run_until_complete(bulk_upsert_group_best_phases(user_id, rows))
+    return run_sync(bulk_upsert_group_best_phases(user_id, rows))
 
 
 async def bulk_refresh_phase_insights(
@@ -527,8 +627,7 @@ async def bulk_refresh_phase_insights(
 
 
 def bulk_refresh_phase_insights_sync(user_id, rows):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         bulk_refresh_phase_insights(user_id, rows)
     )
 
@@ -659,8 +758,7 @@ async def upsert_phase_insight(
 
 
 def upsert_phase_insight_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(upsert_phase_insight(*args, **kwargs))
+    return run_sync(upsert_phase_insight(*args, **kwargs))
 
 
 # =========================
@@ -695,8 +793,7 @@ async def insert_video_insight(
 
 
 def insert_video_insight_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(insert_video_insight(*args, **kwargs))
+    return run_sync(insert_video_insight(*args, **kwargs))
 
 
 
@@ -719,8 +816,7 @@ async def update_video_status(video_id: str, status: str):
 
 
 def update_video_status_sync(video_id: str, status: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(update_video_status(video_id, status))
+    return run_sync(update_video_status(video_id, status))
 
 
 async def update_video_step_progress(video_id: str, step_progress: int):
@@ -739,8 +835,7 @@ async def update_video_step_progress(video_id: str, step_progress: int):
 
 
 def update_video_step_progress_sync(video_id: str, step_progress: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(update_video_step_progress(video_id, step_progress))
+    return run_sync(update_video_step_progress(video_id, step_progress))
 
 
 async def get_video_status(video_id: str):
@@ -751,8 +846,7 @@ async def get_video_status(video_id: str):
     return row[0] if row else None
 
 def get_video_status_sync(video_id: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(get_video_status(video_id))
+    return run_sync(get_video_status(video_id))
 
 
 # ---------- Load phase_units for resume ----------
@@ -829,8 +923,7 @@ async def load_video_phases(
 
 
 def load_video_phases_sync(video_id: str, user_id: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         load_video_phases(video_id, user_id)
     )
 
@@ -922,8 +1015,7 @@ async def upsert_video_structure_features(
 
 
 def upsert_video_structure_features_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(upsert_video_structure_features(*args, **kwargs))
+    return run_sync(upsert_video_structure_features(*args, **kwargs))
 
 
 # =========================
@@ -965,8 +1057,7 @@ async def get_video_structure_features(
 
 
 def get_video_structure_features_sync(video_id: str, user_id: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         get_video_structure_features(video_id, user_id)
     )
 
@@ -987,8 +1078,7 @@ async def get_all_video_structure_groups(user_id: int):
 
 
 def get_all_video_structure_groups_sync(user_id: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(get_all_video_structure_groups(user_id))
+    return run_sync(get_all_video_structure_groups(user_id))
 
 
 # ---------- create video_structure_group ----------
@@ -1046,8 +1136,7 @@ async def create_video_structure_group(
     return row[0]
 
 def create_video_structure_group_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(create_video_structure_group(*args, **kwargs))
+    return run_sync(create_video_structure_group(*args, **kwargs))
 
 
 
@@ -1097,8 +1186,7 @@ async def update_video_structure_group(
 
 
 def update_video_structure_group_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(update_video_structure_group(*args, **kwargs))
+    return run_sync(update_video_structure_group(*args, **kwargs))
 
 
 # ---------- upsert video_structure_group_members ----------
@@ -1157,8 +1245,7 @@ async def upsert_video_structure_group_member(
 
 
 def upsert_video_structure_group_member_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(upsert_video_structure_group_member(*args, **kwargs))
+    return run_sync(upsert_video_structure_group_member(*args, **kwargs))
 
 
 # =========================
@@ -1188,8 +1275,7 @@ async def get_video_structure_group_members_by_group(
 
 
 def get_video_structure_group_members_by_group_sync(group_id: str, user_id: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         get_video_structure_group_members_by_group(group_id, user_id)
     )
 
@@ -1219,8 +1305,7 @@ async def get_video_structure_group_id_of_video(
 
 
 def get_video_structure_group_id_of_video_sync(video_id: str, user_id: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         get_video_structure_group_id_of_video(video_id, user_id)
     )
 
@@ -1251,8 +1336,7 @@ async def get_video_phase_points(video_id: str):
 
 
 def get_video_phase_points_sync(video_id: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(get_video_phase_points(video_id))
+    return run_sync(get_video_phase_points(video_id))
 
 
 # ---------- get best video of structure group ----------
@@ -1285,8 +1369,7 @@ async def get_video_structure_group_best_video(
 
 
 def get_video_structure_group_best_video_sync(group_id: str, user_id: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         get_video_structure_group_best_video(group_id, user_id)
     )
 
@@ -1353,8 +1436,7 @@ async def upsert_video_structure_group_best_video(
 
 
 def upsert_video_structure_group_best_video_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         upsert_video_structure_group_best_video(*args, **kwargs)
     )
 
@@ -1390,8 +1472,7 @@ async def mark_video_insights_need_refresh_by_structure_group(
 
 
 def mark_video_insights_need_refresh_by_structure_group_sync(*args, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         mark_video_insights_need_refresh_by_structure_group(*args, **kwargs)
     )
 
@@ -1412,8 +1493,7 @@ async def clear_video_insight_need_refresh(video_id: str):
 
 
 def clear_video_insight_need_refresh_sync(video_id: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(clear_video_insight_need_refresh(video_id))
+    return run_sync(clear_video_insight_need_refresh(video_id))
 
 # ---------- get video_structure_group stats ----------
 
@@ -1448,8 +1528,7 @@ async def get_video_structure_group_stats(
 
 
 def get_video_structure_group_stats_sync(group_id: str, user_id: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         get_video_structure_group_stats(group_id, user_id)
     )
 
@@ -1472,8 +1551,7 @@ async def get_video_split_status(video_id: str):
 
 
 def get_video_split_status_sync(video_id: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(get_video_split_status(video_id))
+    return run_sync(get_video_split_status(video_id))
 
 
 async def update_video_split_status(video_id: str, split_status: str):
@@ -1492,8 +1570,7 @@ async def update_video_split_status(video_id: str, split_status: str):
 
 
 def update_video_split_status_sync(video_id: str, split_status: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         update_video_split_status(video_id, split_status)
     )
 
@@ -1522,8 +1599,7 @@ async def get_video_excel_urls(video_id: str):
 
 
 def get_video_excel_urls_sync(video_id: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(get_video_excel_urls(video_id))
+    return run_sync(get_video_excel_urls(video_id))
 
 
 # =========================
@@ -1548,8 +1624,7 @@ async def update_video_phase_cta_score(video_id: str, phase_index: int, cta_scor
 
 
 def update_video_phase_cta_score_sync(video_id: str, phase_index: int, cta_score: int):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         update_video_phase_cta_score(video_id, phase_index, cta_score)
     )
 
@@ -1558,11 +1633,11 @@ def update_video_phase_cta_score_sync(video_id: str, phase_index: int, cta_score
 # Audio Features (PHASE)
 # =========================
 
-async def update_video_phase_audio_features(video_id: str, phase_index: int, audio_features_json: str):
+async def update_video_phase_audio_features(video_id: str, phase_index: int, audio_features: dict):
     """
-    Store audio paralinguistic features as JSON text.
-    audio_features_json should be a JSON string like:
-    '{"energy_mean": 0.01, "pitch_mean": 210.5, ...}'
+    Store audio paralinguistic features in the JSONB column.
+    audio_features is a dict like:
+    {"energy_mean": 0.01, "pitch_mean": 210.5, ...}
     """
     sql = text("""
         UPDATE video_phases
@@ -1570,20 +1645,19 @@ async def update_video_phase_audio_features(video_id: str, phase_index: int, aud
             updated_at = now()
         WHERE video_id = :video_id
           AND phase_index = :phase_index
-    """)
+    """).bindparams(bindparam("audio_features", type_=JSONB))
     async with AsyncSessionLocal() as session:
         await session.execute(sql, {
             "video_id": video_id,
             "phase_index": phase_index,
-            "audio_features": audio_features_json,
+            "audio_features": audio_features,
         })
         await session.commit()
 
 
-def update_video_phase_audio_features_sync(video_id: str, phase_index: int, audio_features_json: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(
-        update_video_phase_audio_features(video_id, phase_index, audio_features_json)
+def update_video_phase_audio_features_sync(video_id: str, phase_index: int, audio_features: dict):
+    return run_sync(
+        update_video_phase_audio_features(video_id, phase_index, audio_features)
     )
 
 
@@ -1629,8 +1703,7 @@ async def update_video_phase_csv_metrics(
 
 
 def update_video_phase_csv_metrics_sync(video_id: str, phase_index: int, **kwargs):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         update_video_phase_csv_metrics(video_id, phase_index, **kwargs)
     )
 
@@ -1673,8 +1746,7 @@ async def ensure_product_exposures_table():
 
 
 def ensure_product_exposures_table_sync():
-    loop = get_event_loop()
-    return loop.run_until_complete(ensure_product_exposures_table())
+    return run_sync(ensure_product_exposures_table())
 
 
 async def bulk_insert_product_exposures(
@@ -1722,8 +1794,7 @@ async def bulk_insert_product_exposures(
 
 
 def bulk_insert_product_exposures_sync(video_id, user_id, exposures):
-    loop = get_event_loop()
-    return loop.run_until_complete(
+    return run_sync(
         bulk_insert_product_exposures(video_id, user_id, exposures)
     )
 
@@ -1745,5 +1816,4 @@ async def get_product_exposures(video_id: str):
 
 
 def get_product_exposures_sync(video_id: str):
-    loop = get_event_loop()
-    return loop.run_until_complete(get_product_exposures(video_id))
+    return run_sync(get_product_exposures(video_id))
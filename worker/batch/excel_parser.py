@@ -3,11 +3,26 @@ Excel parser for clean video uploads.
 Parses product.xlsx and trend_stats.xlsx files
 and returns structured data for report generation.
 """
+import io
 import os
+import re
 import logging
-import requests
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, time, timedelta
+from operator import itemgetter
+from typing import BinaryIO, NamedTuple
+
+import numpy as np
+from http_session import session as http_session
 from urllib.parse import urlparse
 
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
 logger = logging.getLogger("process_video")
 
 AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING", "")
@@ -79,21 +94,26 @@ def _ensure_sas_token(blob_url: str) -> str:
         return blob_url
 
 
+def _stream_blob(blob_url: str, out: BinaryIO):
+    """GET the blob (with auto SAS token) and write the body into `out`."""
+    # Ensure URL has SAS token for authentication
+    url = _ensure_sas_token(blob_url)
+
+    with http_session.get(url, stream=True, timeout=60) as r:
+        r.raise_for_status()
+        for chunk in r.iter_content(chunk_size=1024 * 1024):
+            if chunk:
+                out.write(chunk)
+
+
 def download_excel(blob_url: str, dest_path: str) -> bool:
     """Download an Excel file from Azure Blob URL (with auto SAS token)."""
     if not blob_url:
         return False
     try:
-        # Ensure URL has SAS token for authentication
-        url = _ensure_sas_token(blob_url)
-
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        with requests.get(url, stream=True, timeout=60) as r:
-            r.raise_for_status()
-            with open(dest_path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+        with open(dest_path, "wb") as f:
+            _stream_blob(blob_url, f)
         logger.info(f"[EXCEL] Downloaded: {dest_path}")
         return True
     except Exception as e:
@@ -101,60 +121,316 @@ def download_excel(blob_url: str, dest_path: str) -> bool:
         return False
 
 
-def parse_product_excel(file_path: str) -> list[dict]:
-    """
-    Parse product.xlsx.
-    Expected columns (flexible matching):
-    - 商品名 / product_name / name
-    - 価格 / price
-    - カテゴリ / category
-    - その他の列も取り込む
-    Returns list of product dicts.
-    """
+def _fetch_xlsx(blob_url: str) -> io.BytesIO | None:
+    """Download an Excel file into memory; None on failure."""
+    if not blob_url:
+        return None
     try:
-        import openpyxl
-    except ImportError:
-        logger.warning("[EXCEL] openpyxl not installed, cannot parse Excel")
+        buf = io.BytesIO()
+        _stream_blob(blob_url, buf)
+        buf.seek(0)
+        logger.info(f"[EXCEL] Downloaded {buf.getbuffer().nbytes} bytes into memory")
+        return buf
+    except Exception as e:
+        logger.warning(f"[EXCEL] Download failed: {e}")
+        return None
+
+
+# ---------- XLSX streaming reader (stdlib only) ----------
+
+_XLSX_EPOCH_1900 = datetime(1899, 12, 30)
+_XLSX_EPOCH_1904 = datetime(1904, 1, 1)
+# Built-in numFmtId values that are dates/times (ECMA-376 18.8.30)
+_XLSX_BUILTIN_DATE_FMTS = {14, 15, 16, 17, 18, 19, 20, 21, 22, 45, 46, 47}
+_XLSX_TIMEDELTA_FMTS = {46}
+# Quoted literals and [...] sections other than elapsed-time [h]/[m]/[s]
+_XLSX_FMT_STRIP_RE = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+_XLSX_DATE_TOKEN_RE = re.compile(r"(?<![_\\])[dmhysDMHYS]")
+_XLSX_TIMEDELTA_RE = re.compile(r"\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?")
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def _xlsx_text(elem) -> str:
+    """<si>/<is> text: plain <t> or rich-text runs <r><t>; phonetic <rPh> is skipped."""
+    parts = []
+    for child in elem:
+        name = _local(child.tag)
+        if name == "t":
+            parts.append(child.text or "")
+        elif name == "r":
+            for t in child:
+                if _local(t.tag) == "t":
+                    parts.append(t.text or "")
+    return "".join(parts)
+
+
+def _xlsx_first_sheet(zf: zipfile.ZipFile) -> tuple[str, bool]:
+    """Return (zip path of the first worksheet, uses the 1904 date system)."""
+    wb = ET.fromstring(zf.read("xl/workbook.xml"))
+    date1904 = False
+    rel_id = None
+    for elem in wb.iter():
+        name = _local(elem.tag)
+        if name == "workbookPr":
+            date1904 = elem.get("date1904") in ("1", "true")
+        elif name == "sheet" and rel_id is None:
+            rel_id = next((v for k, v in elem.attrib.items() if _local(k) == "id"), None)
+
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels:
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target", "")
+            path = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+            return path, date1904
+    return "xl/worksheets/sheet1.xml", date1904
+
+
+def _xlsx_shared_strings(zf: zipfile.ZipFile) -> list[str]:
+    try:
+        f = zf.open("xl/sharedStrings.xml")
+    except KeyError:
         return []
+    strings = []
+    with f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if _local(elem.tag) == "si":
+                strings.append(_xlsx_text(elem))
+                elem.clear()
+    return strings
+
 
-    if not os.path.exists(file_path):
+def _xlsx_date_styles(zf: zipfile.ZipFile) -> list[str | None]:
+    """Per cellXfs index: "date", "timedelta" or None (plain number)."""
+    try:
+        styles = ET.fromstring(zf.read("xl/styles.xml"))
+    except KeyError:
         return []
 
+    custom = {}
+    kinds = []
+    for elem in styles.iter():
+        name = _local(elem.tag)
+        if name == "numFmt":
+            custom[int(elem.get("numFmtId", -1))] = elem.get("formatCode", "")
+        elif name == "cellXfs":
+            for xf in elem:
+                fmt_id = int(xf.get("numFmtId", 0))
+                kind = None
+                if fmt_id in custom:
+                    code = custom[fmt_id].split(";")[0]
+                    if _XLSX_TIMEDELTA_RE.search(code):
+                        kind = "timedelta"
+                    elif _XLSX_DATE_TOKEN_RE.search(_XLSX_FMT_STRIP_RE.sub("", code)):
+                        kind = "date"
+                elif fmt_id in _XLSX_TIMEDELTA_FMTS:
+                    kind = "timedelta"
+                elif fmt_id in _XLSX_BUILTIN_DATE_FMTS:
+                    kind = "date"
+                kinds.append(kind)
+    return kinds
+
+
+def _xlsx_serial_to_datetime(value: float, date1904: bool, kind: str):
+    """Excel serial number -> time / datetime / timedelta (openpyxl semantics)."""
+    if kind == "timedelta":
+        return timedelta(days=value)
+    day, fraction = divmod(value, 1)
+    diff = timedelta(milliseconds=round(fraction * 86400 * 1000))
+    if 0 <= value < 1 and diff.days == 0:
+        return (datetime.min + diff).time()
+    if date1904:
+        return _XLSX_EPOCH_1904 + timedelta(days=day) + diff
+    if 0 < value < 60:
+        day += 1  # Excel's fictitious 1900-02-29
+    return _XLSX_EPOCH_1900 + timedelta(days=day) + diff
+
+
+def _xlsx_col_index(ref: str) -> int:
+    """Column letters of a cell ref -> 0-based index ("AB12" -> 27)."""
+    idx = 0
+    for ch in ref:
+        if "A" <= ch <= "Z":
+            idx = idx * 26 + (ord(ch) - 64)
+        else:
+            break
+    return idx - 1
+
+
+def _stream_xlsx_rows(file_path: str | BinaryIO):
+    """
+    Yield the first worksheet's rows as tuples straight from the XLSX zip,
+    decoding one <row> at a time (memory is O(row width), no cell objects).
+    Empty cells are None; numbers are int/float; date-formatted cells are
+    datetime/time, as openpyxl would return them.
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        sheet_path, date1904 = _xlsx_first_sheet(zf)
+        shared = _xlsx_shared_strings(zf)
+        date_styles = _xlsx_date_styles(zf)
+
+        width = 0
+        with zf.open(sheet_path) as f:
+            for _, elem in ET.iterparse(f, events=("end",)):
+                name = _local(elem.tag)
+                if name == "dimension":
+                    # "A1:F200" -> pad every row to 6 columns
+                    width = _xlsx_col_index(elem.get("ref", "A1").split(":")[-1]) + 1
+                    continue
+                if name != "row":
+                    continue
+
+                values = {}
+                next_col = 0
+                for c in elem:
+                    if _local(c.tag) != "c":
+                        continue
+                    ref = c.get("r")
+                    col = _xlsx_col_index(ref) if ref else next_col
+                    next_col = col + 1
+
+                    t = c.get("t", "n")
+                    v = None
+                    for child in c:
+                        child_name = _local(child.tag)
+                        if child_name == "v":
+                            v = child.text
+                        elif child_name == "is":
+                            v = _xlsx_text(child)
+
+                    if v is None:
+                        continue
+                    if t == "s":
+                        v = shared[int(v)]
+                    elif t == "b":
+                        v = v == "1"
+                    elif t == "d":
+                        v = datetime.fromisoformat(v)
+                    elif t not in ("str", "inlineStr", "e"):
+                        v = float(v) if any(ch in v for ch in ".eE") else int(v)
+                        s_idx = int(c.get("s", 0))
+                        kind = date_styles[s_idx] if s_idx < len(date_styles) else None
+                        if kind:
+                            v = _xlsx_serial_to_datetime(v, date1904, kind)
+                    values[col] = v
+
+                elem.clear()
+                n = max(width, max(values) + 1 if values else 0)
+                yield tuple(values.get(i) for i in range(n))
+
+
+# Whole floats up to this magnitude are exact ints (larger ones stay float, as in openpyxl)
+_EXACT_INT_LIMIT = 2 ** 53
+
+
+def _xlsx_has_error_cells(file_path: str | BinaryIO) -> bool:
+    """True if the first worksheet has error cells (#N/A, #DIV/0!, ...).
+    Scans the decompressed XML for t="e" without parsing it."""
+    with zipfile.ZipFile(file_path) as zf:
+        sheet_path, _ = _xlsx_first_sheet(zf)
+        with zf.open(sheet_path) as f:
+            tail = b""
+            for block in iter(lambda: f.read(1 << 20), b""):
+                chunk = tail + block
+                if b't="e"' in chunk or b"t='e'" in chunk:
+                    return True
+                tail = chunk[-4:]
+    return False
+
+
+def _calamine_value(v):
+    """python-calamine cell -> the value openpyxl / _stream_xlsx_rows return."""
+    t = type(v)
+    if t is float:
+        return int(v) if v.is_integer() and abs(v) <= _EXACT_INT_LIMIT else v
+    if t is str:
+        return None if v == "" else v
+    if t is date:
+        # date-formatted cells (and datetimes at midnight) come back as date
+        return datetime.combine(v, time())
+    return v
+
+
+def _iter_xlsx_rows(file_path: str | BinaryIO):
+    """
+    Yield the first sheet's rows as tuples, one at a time.
+    `file_path` is a path or a seekable binary file (e.g. an in-memory download).
+    Uses python-calamine (Rust reader) when installed, else _stream_xlsx_rows;
+    both return the same values as openpyxl (empty cells None, whole-number
+    floats int, dates datetime). calamine reports error cells as empty, so a
+    sheet containing any is read with _stream_xlsx_rows to keep "#N/A" etc.
+    """
+    if CalamineWorkbook is None:
+        yield from _stream_xlsx_rows(file_path)
+        return
+
+    has_errors = _xlsx_has_error_cells(file_path)
+    if not isinstance(file_path, str):
+        file_path.seek(0)
+    if has_errors:
+        yield from _stream_xlsx_rows(file_path)
+        return
+
+    if isinstance(file_path, str):
+        wb = CalamineWorkbook.from_path(file_path)
+    else:
+        wb = CalamineWorkbook.from_filelike(file_path)
     try:
-        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-        ws = wb.active
-        if ws is None:
-            return []
+        for row in wb.get_sheet_by_index(0).iter_rows():
+            yield tuple(map(_calamine_value, row))
+    finally:
+        wb.close()
 
-        rows = list(ws.iter_rows(values_only=True))
-        if len(rows) < 2:
+
+def _parse_xlsx(file_path: str | BinaryIO, label: str) -> list[dict]:
+    """First row = headers; every non-empty row after it becomes a dict."""
+    if isinstance(file_path, str):
+        if not os.path.exists(file_path):
             return []
+        source = file_path
+    else:
+        file_path.seek(0)
+        source = "memory"
 
-        # First row = headers
-        headers = [str(h).strip() if h else f"col_{i}" for i, h in enumerate(rows[0])]
+    try:
+        rows = _iter_xlsx_rows(file_path)
+        header = next(rows, None)
+        if header is None:
+            return []
 
-        products = []
-        for row in rows[1:]:
-            if all(v is None for v in row):
-                continue
-            product = {}
-            for i, val in enumerate(row):
-                if i < len(headers):
-                    product[headers[i]] = val
-            products.append(product)
+        headers = [str(h).strip() if h else f"col_{i}" for i, h in enumerate(header)]
+        records = [
+            dict(zip(headers, row))
+            for row in rows
+            if not all(v is None for v in row)
+        ]
 
-        wb.close()
-        logger.info(f"[EXCEL] Parsed {len(products)} products from {file_path}")
-        return products
+        logger.info(f"[EXCEL] Parsed {len(records)} {label} rows from {source}")
+        return records
 
     except Exception as e:
-        logger.warning(f"[EXCEL] Failed to parse product Excel: {e}")
+        logger.warning(f"[EXCEL] Failed to parse {label} Excel: {e}")
         return []
 
 
-def parse_trend_excel(file_path: str) -> list[dict]:
+def parse_product_excel(file_path: str | BinaryIO) -> list[dict]:
     """
-    Parse trend_stats.xlsx.
+    Parse product.xlsx (path or in-memory file).
+    Expected columns (flexible matching):
+    - 商品名 / product_name / name
+    - 価格 / price
+    - カテゴリ / category
+    - その他の列も取り込む
+    Returns list of product dicts.
+    """
+    return _parse_xlsx(file_path, "product")
+
+
+def parse_trend_excel(file_path: str | BinaryIO) -> list[dict]:
+    """
+    Parse trend_stats.xlsx (path or in-memory file).
     Expected columns (flexible matching):
     - 時間 / time / timestamp
     - 売上 / sales / revenue
@@ -163,87 +439,137 @@ def parse_trend_excel(file_path: str) -> list[dict]:
     - その他の列も取り込む
     Returns list of trend data dicts.
     """
-    try:
-        import openpyxl
-    except ImportError:
-        logger.warning("[EXCEL] openpyxl not installed, cannot parse Excel")
-        return []
+    return _parse_xlsx(file_path, "trend")
 
-    if not os.path.exists(file_path):
-        return []
 
-    try:
-        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-        ws = wb.active
-        if ws is None:
-            return []
+class LazyExcelData:
+    """
+    Downloaded Excel files (local paths or in-memory buffers) for a video,
+    parsed on first access.
+    Reads like the old result dict ("products", "trends", "has_product_data",
+    "has_trend_data" via [] / .get), so a section nobody reads is never parsed.
+    """
 
-        rows = list(ws.iter_rows(values_only=True))
-        if len(rows) < 2:
-            return []
+    # section -> parser
+    _SECTIONS = {
+        "products": parse_product_excel,
+        "trends": parse_trend_excel,
+    }
 
-        headers = [str(h).strip() if h else f"col_{i}" for i, h in enumerate(rows[0])]
+    def __init__(self, sources: dict):
+        # {"products": path / BytesIO / None, "trends": path / BytesIO / None}
+        self._sources = sources
+        self._cache = {}
 
-        trend_data = []
-        for row in rows[1:]:
-            if all(v is None for v in row):
-                continue
-            entry = {}
-            for i, val in enumerate(row):
-                if i < len(headers):
-                    entry[headers[i]] = val
-            trend_data.append(entry)
+    def _section(self, key: str) -> list[dict]:
+        if key not in self._cache:
+            src = self._sources.get(key)
+            self._cache[key] = self._SECTIONS[key](src) if src is not None else []
+        return self._cache[key]
 
-        wb.close()
-        logger.info(f"[EXCEL] Parsed {len(trend_data)} trend entries from {file_path}")
-        return trend_data
+    @property
+    def products(self) -> list[dict]:
+        return self._section("products")
 
-    except Exception as e:
-        logger.warning(f"[EXCEL] Failed to parse trend Excel: {e}")
-        return []
+    @property
+    def trends(self) -> list[dict]:
+        return self._section("trends")
+
+    @property
+    def has_product_data(self) -> bool:
+        # No file → False without parsing; otherwise "parsed non-empty" as before
+        return self._sources.get("products") is not None and len(self.products) > 0
 
+    @property
+    def has_trend_data(self) -> bool:
+        return self._sources.get("trends") is not None and len(self.trends) > 0
 
-def load_excel_data(video_id: str, excel_urls: dict, work_dir: str = "excel_data") -> dict:
+    def __getitem__(self, key):
+        if key in self._SECTIONS or key in ("has_product_data", "has_trend_data"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def load_excel_data(
+    video_id: str,
+    excel_urls: dict,
+    work_dir: str = "excel_data",
+    keep_files: bool = False,
+) -> LazyExcelData:
     """
-    Download and parse both Excel files for a video.
-    Returns dict with 'products' and 'trends' keys.
+    Download both Excel files for a video.
+    Returns a LazyExcelData; each workbook is parsed when its section is
+    first read. The files are held in memory unless keep_files is set, in
+    which case they are written under work_dir/video_id as before.
     """
     excel_dir = os.path.join(work_dir, video_id)
-    os.makedirs(excel_dir, exist_ok=True)
-
-    result = {
-        "products": [],
-        "trends": [],
-        "has_product_data": False,
-        "has_trend_data": False,
-    }
-
-    # Download and parse product data
-    product_url = excel_urls.get("excel_product_blob_url")
-    if product_url:
-        product_path = os.path.join(excel_dir, "product.xlsx")
-        if download_excel(product_url, product_path):
-            result["products"] = parse_product_excel(product_path)
-            result["has_product_data"] = len(result["products"]) > 0
-
-    # Download and parse trend data
-    trend_url = excel_urls.get("excel_trend_blob_url")
-    if trend_url:
-        trend_path = os.path.join(excel_dir, "trend_stats.xlsx")
-        if download_excel(trend_url, trend_path):
-            result["trends"] = parse_trend_excel(trend_path)
-            result["has_trend_data"] = len(result["trends"]) > 0
+    if keep_files:
+        os.makedirs(excel_dir, exist_ok=True)
+
+    def fetch(url, name):
+        if not keep_files:
+            return _fetch_xlsx(url)
+        path = os.path.join(excel_dir, name)
+        return path if download_excel(url, path) else None
+
+    sources = {"products": None, "trends": None}
+
+    # (section, url, local file name)
+    targets = [
+        ("products", excel_urls.get("excel_product_blob_url"), "product.xlsx"),
+        ("trends", excel_urls.get("excel_trend_blob_url"), "trend_stats.xlsx"),
+    ]
+    targets = [t for t in targets if t[1]]
+
+    # Both downloads are independent network I/O → run them concurrently
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        futures = {ex.submit(fetch, url, name): key for key, url, name in targets}
+        for fut in as_completed(futures):
+            sources[futures[fut]] = fut.result()
 
     logger.info(
-        f"[EXCEL] Loaded data for {video_id}: "
-        f"{len(result['products'])} products, "
-        f"{len(result['trends'])} trend entries"
+        f"[EXCEL] Downloaded for {video_id}: "
+        f"product={'yes' if sources['products'] is not None else 'no'}, "
+        f"trend={'yes' if sources['trends'] is not None else 'no'}"
     )
 
-    return result
+    return LazyExcelData(sources)
 
 
-def format_excel_data_for_prompt(excel_data: dict) -> str:
+def _format_rows(rows: list[dict], limit: int) -> list[str]:
+    """
+    "  {i}. key: value / key: value" lines for the first `limit` rows.
+    Parsed rows share the header keys in one order (short rows only drop
+    trailing keys), so the values are fetched with one itemgetter.
+    """
+    rows = rows[:limit]
+    if not rows:
+        return []
+
+    keys = tuple(rows[0])
+    get = itemgetter(*keys) if keys else None
+    single = len(keys) == 1
+
+    lines = []
+    for i, row in enumerate(rows, 1):
+        items = row.items()
+        if get is not None and len(row) == len(keys):
+            try:
+                vals = get(row)
+                items = zip(keys, (vals,) if single else vals)
+            except KeyError:
+                pass
+        lines.append(f"  {i}. " + " / ".join(f"{k}: {v}" for k, v in items if v is not None))
+    return lines
+
+
+def format_excel_data_for_prompt(excel_data: "LazyExcelData | dict") -> str:
     """
     Format Excel data into a text summary for GPT prompts.
     """
@@ -251,32 +577,54 @@ def format_excel_data_for_prompt(excel_data: dict) -> str:
 
     if excel_data.get("has_product_data"):
         parts.append("【商品データ】")
-        for i, p in enumerate(excel_data["products"][:20], 1):  # Max 20 products
-            items = [f"{k}: {v}" for k, v in p.items() if v is not None]
-            parts.append(f"  {i}. " + " / ".join(items))
+        parts.extend(_format_rows(excel_data["products"], 20))  # Max 20 products
 
     if excel_data.get("has_trend_data"):
         parts.append("\n【売上トレンドデータ】")
-        for i, t in enumerate(excel_data["trends"][:50], 1):  # Max 50 entries
-            items = [f"{k}: {v}" for k, v in t.items() if v is not None]
-            parts.append(f"  {i}. " + " / ".join(items))
+        parts.extend(_format_rows(excel_data["trends"], 50))  # Max 50 entries
 
     return "\n".join(parts) if parts else ""
 
 
-def match_sales_to_phase(trends: list[dict], start_sec: float, end_sec: float) -> dict:
-    """
-    Match trend/sales data to a specific phase time range.
-    Returns aggregated sales metrics for the phase.
+class _TrendIndex(NamedTuple):
+    """trends pre-parsed once into per-row arrays (see _index_trends)."""
+    times: np.ndarray          # float64 seconds, nan = unparsable
+    sales: np.ndarray          # float64, sum over sales columns
+    orders: np.ndarray         # int64, sum over order columns
+    products: list[tuple[str, ...]]
 
-    Tries to match using time-based columns.
-    """
-    import re
-    from datetime import datetime, timedelta
 
-    if not trends:
-        return {"sales": None, "orders": None, "products_sold": []}
+# (trends list, row count, index) of the last call; holding the list keeps its
+# id from being reused, and the row count catches appends between calls.
+_trend_index_cache: tuple[list, int, _TrendIndex] | None = None
+
+
+# [HH:]MM:SS, or a plain number of seconds
+_TIME_RE = re.compile(
+    r"^\s*(?:(\d+):)?(\d+):(\d+)\s*$"
+    r"|^\s*([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)\s*$"
+)
+
+
+def _entry_time(entry: dict, time_keys: list[str]) -> float:
+    """Seconds from the first time column that parses (plain number, MM:SS or HH:MM:SS); nan if none."""
+    for tk in time_keys:
+        val = entry.get(tk)
+        if val is None:
+            continue
+        if isinstance(val, (int, float)):
+            return float(val)
+        m = _TIME_RE.match(str(val))
+        if m is None:
+            continue
+        if m.group(4) is not None:
+            return float(m.group(4))
+        return int(m.group(1) or 0) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+    return np.nan
+
 
+def _index_trends(trends: list[dict]) -> _TrendIndex:
+    """Detect the time/sales/order/product columns and parse every row once."""
     # Detect time column
     time_keys = []
     sales_keys = []
@@ -319,60 +667,79 @@ def match_sales_to_phase(trends: list[dict], start_sec: float, end_sec: float) -
             if any(w in kl for w in ["商品", "product", "item", "名前", "name", "产品", "상품"]):
                 product_keys.append(k)
 
-    phase_sales = 0
-    phase_orders = 0
-    products_sold = []
-
-    for t in trends:
-        # Try to extract time in seconds from the entry
-        entry_time = None
-        for tk in time_keys:
-            val = t.get(tk)
-            if val is None:
-                continue
+    n = len(trends)
+    times = np.full(n, np.nan)
+    sales = np.zeros(n)
+    orders = np.zeros(n, dtype=np.int64)
+    products = []
+
+    for i, t in enumerate(trends):
+        times[i] = _entry_time(t, time_keys)
+
+        row_sales = 0
+        for sk in sales_keys:
             try:
-                # Try direct seconds
-                entry_time = float(val)
-                break
+                row_sales += float(t.get(sk, 0) or 0)
             except (ValueError, TypeError):
                 pass
+        sales[i] = row_sales
+
+        row_orders = 0
+        for ok in order_keys:
             try:
-                # Try MM:SS or HH:MM:SS format
-                val_str = str(val)
-                parts = val_str.split(":")
-                if len(parts) == 2:
-                    entry_time = int(parts[0]) * 60 + int(parts[1])
-                    break
-                elif len(parts) == 3:
-                    entry_time = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                    break
-            except (ValueError, TypeError):
+                row_orders += int(t.get(ok, 0) or 0)
+            except (ValueError, TypeError, OverflowError):
                 pass
+        orders[i] = row_orders
 
-        if entry_time is None:
-            continue
+        names = []
+        for pk in product_keys:
+            pname = t.get(pk)
+            if pname and str(pname).strip():
+                names.append(str(pname).strip())
+        products.append(tuple(names))
+
+    return _TrendIndex(times, sales, orders, products)
+
+
+def _get_trend_index(trends: list[dict]) -> _TrendIndex:
+    """_index_trends memoized on the trends list object (phases share one list)."""
+    global _trend_index_cache
+    cached = _trend_index_cache
+    if cached is not None and cached[0] is trends and cached[1] == len(trends):
+        return cached[2]
+    index = _index_trends(trends)
+    _trend_index_cache = (trends, len(trends), index)
+    return index
+
+
+def match_sales_to_phase(trends: list[dict], start_sec: float, end_sec: float) -> dict:
+    """
+    Match trend/sales data to a specific phase time range.
+    Returns aggregated sales metrics for the phase.
+
+    Tries to match using time-based columns. The trends are parsed once
+    (per list) and each phase is a vectorized mask over the parsed rows.
+    """
+    if not trends:
+        return {"sales": None, "orders": None, "products_sold": []}
+
+    idx = _get_trend_index(trends)
 
-        # Check if this entry falls within the phase
-        if start_sec <= entry_time <= end_sec:
-            for sk in sales_keys:
-                try:
-                    phase_sales += float(t.get(sk, 0) or 0)
-                except (ValueError, TypeError):
-                    pass
-            for ok in order_keys:
-                try:
-                    phase_orders += int(t.get(ok, 0) or 0)
-                except (ValueError, TypeError):
-                    pass
-            for pk in product_keys:
-                pname = t.get(pk)
-                if pname and str(pname).strip():
-                    products_sold.append(str(pname).strip())
+    # Unparsable rows are nan and drop out via isfinite
+    mask = np.isfinite(idx.times) & (idx.times >= start_sec) & (idx.times <= end_sec)
+    # Left-to-right sum (not numpy's pairwise sum) keeps the total
+    # bit-identical to the original per-row accumulation
+    phase_sales = sum(idx.sales[mask].tolist())
+    phase_orders = int(idx.orders[mask].sum())
+    products_sold = set()
+    for i in np.flatnonzero(mask):
+        products_sold.update(idx.products[i])
 
     return {
         "sales": phase_sales if phase_sales > 0 else None,
         "orders": phase_orders if phase_orders > 0 else None,
-        "products_sold": list(set(products_sold)),
+        "products_sold": sorted(products_sold),
     }
 
 
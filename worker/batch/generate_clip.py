@@ -56,7 +56,7 @@ logger = logging.getLogger("generate_clip")
 BATCH_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BATCH_DIR)
 
-from db_ops import init_db_sync, close_db_sync, get_event_loop, get_session
+from db_ops import init_db_sync, close_db_sync, run_sync, get_session
 from split_video import upload_to_blob, parse_blob_url
 from sqlalchemy import text
 
@@ -157,8 +157,6 @@ SUBTITLE_STYLES = [
 
 def update_clip_status(clip_id: str, status: str, clip_url: str = None, error_message: str = None):
     """Update clip status in database."""
-    loop = get_event_loop()
-
     async def _update():
         async with get_session() as session:
             if clip_url:
@@ -183,7 +181,7 @@ def update_clip_status(clip_id: str, status: str, clip_url: str = None, error_me
                 """)
                 await session.execute(sql, {"status": status, "clip_id": clip_id})
 
-    loop.run_until_complete(_update())
+    run_sync(_update())
 
 
 # =========================
@@ -564,8 +562,6 @@ def get_phase_context(video_id: str, phase_index: int) -> str:
     """
     Fetch phase description and insight from DB to provide context for subtitle refinement.
     """
-    loop = get_event_loop()
-
     async def _fetch():
         async with get_session() as session:
             sql = text("""
@@ -588,7 +584,7 @@ def get_phase_context(video_id: str, phase_index: int) -> str:
             return ""
 
     try:
-        return loop.run_until_complete(_fetch())
+        return run_sync(_fetch())
     except Exception as e:
         logger.warning(f"Failed to fetch phase context: {e}")
         return ""
@@ -1359,7 +1355,7 @@ def generate_clip(clip_id: str, video_id: str, blob_url: str, time_start: float,
 # CLI entry point
 # =========================
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Generate TikTok-style clip")
     parser.add_argument("--clip-id", required=True, help="Clip record UUID")
     parser.add_argument("--video-id", required=True, help="Source video UUID")
@@ -1369,7 +1365,7 @@ def main():
     parser.add_argument("--phase-index", type=int, default=-1, help="Phase index for context-aware subtitles")
     parser.add_argument("--speed-factor", type=float, default=1.0, help="Playback speed (1.0=normal, 1.2=20%% faster)")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     generate_clip(
         clip_id=args.clip_id,
@@ -1,13 +1,25 @@
 # grouping_pipeline.py
 import os
-import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
 import numpy as np
+import orjson
 from db_ops import get_all_phase_groups_sync
 from db_ops import create_phase_group_sync, update_phase_group_sync
 
-from openai import AzureOpenAI
+from openai import AzureOpenAI, RateLimitError
 from decouple import config
 
+# LLVM-compiled assign kernel when numba is installed; numpy loop otherwise
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 
 # ======================================================
@@ -24,6 +36,10 @@ AZURE_OPENAI_API_VERSION = env("GPT5_API_VERSION")
 
 EMBED_MODEL = "text-embedding-3-large"
 
+# Texts per embeddings request / requests in flight
+EMBED_BATCH_SIZE = 16
+EMBED_CONCURRENCY = 4
+
 # GROUP_ROOT = "group"
 # GROUP_FILE = "groups.json"
 
@@ -33,8 +49,20 @@ def get_group_root(art_root: str, video_id: str):
 def get_group_file(art_root: str, video_id: str):
     return os.path.join(get_group_root(art_root, video_id), "groups.json")
 
+# Centroid sidecar (float16 matrix) next to groups.json
+GROUP_NPY = "centroids.npy"
+
+def get_group_npy_file(art_root: str, video_id: str):
+    return os.path.join(get_group_root(art_root, video_id), GROUP_NPY)
+
 COSINE_THRESHOLD = 0.88
 
+# Join the first group (largest first) at or above COSINE_THRESHOLD instead
+# of the best-scoring one; off keeps best-match semantics
+GREEDY_ASSIGN = config("GREEDY_ASSIGN", default=False, cast=bool)
+# Centroid rows scored per GEMV in the greedy scan
+GREEDY_BLOCK = 256
+
 AZURE_OPENAI_ENDPOINT_EMBED=env("AZURE_OPENAI_ENDPOINT_EMBED")
 AZURE_OPENAI_API_VERSION_EMBED=env("AZURE_OPENAI_API_VERSION_EMBED")
 
@@ -51,7 +79,8 @@ embed_client = AzureOpenAI(
 # ======================================================
 
 def l2_normalize(v):
-    v = np.array(v, dtype=np.float32)
+    # no copy when v is already a float32 ndarray
+    v = np.asarray(v, dtype=np.float32)
     norm = np.linalg.norm(v)
     if norm == 0:
         return v
@@ -62,6 +91,89 @@ def cosine(a, b):
     return float(np.dot(a, b))
 
 
+# ======================================================
+# GROUP STORE
+# ======================================================
+
+# Rows added per growth step, so appends do not reallocate every time
+GROUP_STORE_CHUNK = 256
+
+
+@dataclass
+class GroupStore:
+    """
+    Global groups in column layout: row i of ids / sizes / centroids is one
+    group, and centroids is a single contiguous (capacity, D) float32 matrix.
+    Only the first n_used rows are valid.
+    """
+    ids: np.ndarray
+    sizes: np.ndarray
+    centroids: np.ndarray
+    n_used: int = 0
+
+    @classmethod
+    def from_rows(cls, rows) -> "GroupStore":
+        """rows = [{"group_id", "centroid", "size"}, ...] (DB rows / groups.json)"""
+        rows = list(rows)
+        if not rows:
+            return cls(
+                ids=np.empty(0, dtype=np.int64),
+                sizes=np.empty(0, dtype=np.int64),
+                centroids=np.empty((0, 0), dtype=np.float32),
+            )
+        return cls(
+            ids=np.array([r["group_id"] for r in rows], dtype=np.int64),
+            sizes=np.array([r["size"] for r in rows], dtype=np.int64),
+            centroids=np.array([r["centroid"] for r in rows], dtype=np.float32),
+            n_used=len(rows),
+        )
+
+    def __len__(self):
+        return self.n_used
+
+    @property
+    def active_centroids(self) -> np.ndarray:
+        return self.centroids[:self.n_used]
+
+    def append(self, group_id: int, centroid: np.ndarray, size: int = 1):
+        if self.n_used == len(self.ids):
+            dim = self.centroids.shape[1] if self.n_used else len(centroid)
+            capacity = self.n_used + GROUP_STORE_CHUNK
+            ids = np.empty(capacity, dtype=np.int64)
+            sizes = np.empty(capacity, dtype=np.int64)
+            centroids = np.empty((capacity, dim), dtype=np.float32)
+            if self.n_used:
+                ids[:self.n_used] = self.ids[:self.n_used]
+                sizes[:self.n_used] = self.sizes[:self.n_used]
+                centroids[:self.n_used] = self.active_centroids
+            self.ids, self.sizes, self.centroids = ids, sizes, centroids
+
+        i = self.n_used
+        self.ids[i] = group_id
+        self.sizes[i] = size
+        self.centroids[i] = centroid
+        self.n_used += 1
+
+    def copy(self) -> "GroupStore":
+        return GroupStore(
+            ids=self.ids.copy(),
+            sizes=self.sizes.copy(),
+            centroids=self.centroids.copy(),
+            n_used=self.n_used,
+        )
+
+    def as_dict_list(self) -> list[dict]:
+        """Legacy [{"group_id", "centroid", "size"}] view for existing callers."""
+        return [
+            {
+                "group_id": int(self.ids[i]),
+                "centroid": self.centroids[i],
+                "size": int(self.sizes[i]),
+            }
+            for i in range(self.n_used)
+        ]
+
+
 # ======================================================
 # STEP 7.1 – EMBEDDING
 # ======================================================
@@ -72,72 +184,133 @@ def embed_phase_descriptions(phase_units):
     Logic giữ nguyên demo_extract_frames.py
     """
     texts = [p["phase_description"] for p in phase_units]
+    chunks = [
+        texts[i:i + EMBED_BATCH_SIZE]
+        for i in range(0, len(texts), EMBED_BATCH_SIZE)
+    ]
 
-    resp = embed_client.embeddings.create(
-        model=EMBED_MODEL,
-        input=texts
-    )
+    # Sub-batches run concurrently; map() keeps them in input order
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as ex:
+        results = list(ex.map(_embed_batch, chunks))
+
+    data = [e for batch in results for e in batch]
+    if not data:
+        return phase_units
 
-    for p, e in zip(phase_units, resp.data):
-        p["embedding"] = l2_normalize(e.embedding).tolist()
+    # L2-normalize the whole batch at once (zero vectors are left as-is)
+    V = np.asarray([e.embedding for e in data], dtype=np.float32)
+    norms = np.linalg.norm(V, axis=1, keepdims=True)
+    V /= np.where(norms == 0, 1, norms)
+
+    # float32 row views only; no per-phase list of Python floats
+    for p, row in zip(phase_units, V):
+        p["_embedding_np"] = row
 
     return phase_units
 
 
+def _embed_batch(texts, max_retry: int = 5):
+    """One embeddings request, retried with exponential backoff + jitter on 429."""
+    for attempt in range(max_retry):
+        try:
+            return embed_client.embeddings.create(
+                model=EMBED_MODEL,
+                input=texts
+            ).data
+        except RateLimitError:
+            if attempt == max_retry - 1:
+                raise
+            time.sleep((2 ** attempt) + random.uniform(0, 0.5))
+
+
 # ======================================================
 # STEP 7.2 – LOAD GLOBAL GROUPS
 # ======================================================
-def load_global_groups_from_db(user_id: int):
-    rows = get_all_phase_groups_sync(user_id)
-
-    groups = []
-    for r in rows:
-        groups.append({
-            "group_id": r["group_id"],
-            "centroid": np.array(r["centroid"], dtype=np.float32),
-            "size": r["size"],
-        })
-    return groups
+def load_global_groups_from_db(user_id: int) -> GroupStore:
+    return GroupStore.from_rows(get_all_phase_groups_sync(user_id))
+
+
+# groups.json path -> (file mtimes, GroupStore as it is on disk)
+_GROUPS_CACHE: dict[str, tuple[tuple, GroupStore]] = {}
+_GROUPS_CACHE_LOCK = threading.Lock()
+
+
+def _group_files_mtime(path: str, npy_path: str) -> tuple:
+    return tuple(
+        os.stat(p).st_mtime_ns if os.path.exists(p) else None
+        for p in (path, npy_path)
+    )
+
+
+def _read_global_groups(path: str, npy_path: str) -> GroupStore:
+    with open(path, "rb") as f:
+        raw = orjson.loads(f.read())
+
+    # Legacy groups.json carries the centroids inline
+    if not os.path.exists(npy_path):
+        return GroupStore.from_rows(raw)
+
+    centroids = np.load(npy_path).astype(np.float32)
+    return GroupStore(
+        ids=np.array([g["group_id"] for g in raw], dtype=np.int64),
+        sizes=np.array([g["size"] for g in raw], dtype=np.int64),
+        centroids=centroids,
+        n_used=len(raw),
+    )
 
 
-def load_global_groups(art_root: str, video_id: str):
+def load_global_groups(art_root: str, video_id: str) -> GroupStore:
+    """
+    Load the file-based groups. Re-reads from disk only when groups.json or
+    centroids.npy changed since the last load/save; callers get a copy.
+    """
     root = get_group_root(art_root, video_id)
     path = get_group_file(art_root, video_id)
+    npy_path = get_group_npy_file(art_root, video_id)
 
     os.makedirs(root, exist_ok=True)
 
     if not os.path.exists(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        raw = json.load(f)
-
-    groups = []
-    for g in raw:
-        groups.append({
-            "group_id": g["group_id"],
-            "centroid": np.array(g["centroid"], dtype=np.float32),
-            "size": g["size"]
-        })
+        return GroupStore.from_rows([])
 
-    return groups
+    with _GROUPS_CACHE_LOCK:
+        mtime = _group_files_mtime(path, npy_path)
+        cached = _GROUPS_CACHE.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, _read_global_groups(path, npy_path))
+            _GROUPS_CACHE[path] = cached
+        return cached[1].copy()
 
 
-def save_global_groups(groups, art_root: str, video_id: str):
+def save_global_groups(store: GroupStore, art_root: str, video_id: str):
+    """groups.json keeps ids/sizes; centroids go to a float16 .npy sidecar."""
     root = get_group_root(art_root, video_id)
     path = get_group_file(art_root, video_id)
+    npy_path = get_group_npy_file(art_root, video_id)
 
     os.makedirs(root, exist_ok=True)
 
     data = []
-    for g in groups:
+    for i in range(store.n_used):
         data.append({
-            "group_id": g["group_id"],
-            "centroid": g["centroid"].tolist(),
-            "size": g["size"]
+            "group_id": int(store.ids[i]),
+            "size": int(store.sizes[i])
         })
 
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    centroids16 = store.active_centroids.astype(np.float16)
+    with _GROUPS_CACHE_LOCK:
+        np.save(npy_path, centroids16)
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data))
+
+        # Cache what a re-load would read back (float16-rounded centroids)
+        on_disk = GroupStore(
+            ids=store.ids[:store.n_used].copy(),
+            sizes=store.sizes[:store.n_used].copy(),
+            centroids=centroids16.astype(np.float32),
+            n_used=store.n_used,
+        )
+        _GROUPS_CACHE[path] = (_group_files_mtime(path, npy_path), on_disk)
 
 
 # ======================================================
@@ -180,32 +353,177 @@ def save_global_groups(groups, art_root: str, video_id: str):
 
 #     return phase_units, groups
 
+def _assign_and_update(P, C, sizes, n_used, threshold, greedy):
+    """
+    Sequential assign over the phase matrix P (N, D) against the first n_used
+    rows of C (capacity, D): best cosine (greedy: first row at or above
+    threshold, largest groups first), then either the incremental centroid
+    update + renormalize, or a new row in C's slack (capacity doubles when
+    full). Returns (assign, C, sizes, n_used); assign[i] is phase i's row.
+    """
+    n, dim = P.shape
+    assign = np.empty(n, dtype=np.int64)
+
+    for i in range(n):
+        best = -1
+        best_score = -1.0
+        if greedy:
+            order = np.argsort(-sizes[:n_used], kind="mergesort")
+        else:
+            order = np.arange(n_used)
+        for jj in range(n_used):
+            j = order[jj]
+            s = 0.0
+            for k in range(dim):
+                s += C[j, k] * P[i, k]
+            if s > best_score:
+                best = j
+                best_score = s
+            if greedy and s >= threshold:
+                break
+
+        if best >= 0 and best_score >= threshold:
+            m = sizes[best]
+            nrm = 0.0
+            for k in range(dim):
+                c = (C[best, k] * m + P[i, k]) / (m + 1)
+                C[best, k] = c
+                nrm += c * c
+            if nrm > 0.0:
+                nrm = np.sqrt(nrm)
+                for k in range(dim):
+                    C[best, k] = C[best, k] / nrm
+            sizes[best] = m + 1
+            assign[i] = best
+        else:
+            if n_used == C.shape[0]:
+                capacity = max(2 * C.shape[0], 16)
+                grown_c = np.empty((capacity, dim), dtype=C.dtype)
+                grown_s = np.empty(capacity, dtype=sizes.dtype)
+                grown_c[:n_used] = C[:n_used]
+                grown_s[:n_used] = sizes[:n_used]
+                C = grown_c
+                sizes = grown_s
+            C[n_used] = P[i]
+            sizes[n_used] = 1
+            assign[i] = n_used
+            n_used += 1
+
+    return assign, C, sizes, n_used
+
+
+# No fastmath: it may reassociate the cosine sums and centroid updates, so
+# assignments near COSINE_THRESHOLD could change with the compiled code; without
+# it the kernel gives the same bits compiled or interpreted
+_assign_kernel = (
+    njit(cache=True)(_assign_and_update) if njit is not None else None
+)
+
+
+def _phase_vector(p):
+    # "embedding" lists are still accepted from older callers
+    v = p.get("_embedding_np")
+    if v is None:
+        v = np.array(p["embedding"], dtype=np.float32)
+    return v
+
+
+def _first_above_threshold(store, v):
+    """
+    Greedy scan: rows by descending size (stable), GREEDY_BLOCK at a time;
+    (row, score) of the first at or above COSINE_THRESHOLD, else (None, -1.0).
+    """
+    order = np.argsort(-store.sizes[:store.n_used], kind="stable")
+    for start in range(0, len(order), GREEDY_BLOCK):
+        rows = order[start:start + GREEDY_BLOCK]
+        scores = store.centroids[rows] @ v
+        hits = np.flatnonzero(scores >= COSINE_THRESHOLD)
+        if len(hits):
+            return int(rows[hits[0]]), float(scores[hits[0]])
+    return None, -1.0
+
+
+def _assign_with_kernel(phase_units, store, user_id: int):
+    """
+    One compiled call assigns every phase; the groups it opened are then
+    created in the DB in creation order, with the creating phase's vector.
+    """
+    P = np.ascontiguousarray(np.stack([_phase_vector(p) for p in phase_units]), dtype=np.float32)
+    dim = P.shape[1]
+    n0 = store.n_used
+
+    C = store.centroids
+    if not n0 and C.shape[1] != dim:
+        C = np.empty((0, dim), dtype=np.float32)
+    C = np.ascontiguousarray(C, dtype=np.float32)
+    sizes = np.ascontiguousarray(store.sizes, dtype=np.int64)
+
+    assign, C, sizes, n_used = _assign_kernel(P, C, sizes, n0, COSINE_THRESHOLD, GREEDY_ASSIGN)
+
+    ids = np.empty(len(sizes), dtype=np.int64)
+    ids[:n0] = store.ids[:n0]
+    next_row = n0
+    for i, row in enumerate(assign.tolist()):
+        if row == next_row:
+            ids[row] = create_phase_group_sync(
+                user_id=user_id,
+                centroid=P[i].tolist(),
+                size=1,
+            )
+            next_row += 1
+        phase_units[i]["group_id"] = int(ids[row])
+
+    return phase_units, GroupStore(ids=ids, sizes=sizes, centroids=C, n_used=n_used)
+
+
 def assign_phases_to_groups(phase_units, groups, user_id: int):
     """
     Incremental cosine-based grouping.
+    `groups` is a GroupStore (a legacy list of group dicts is converted), and
+    the updated GroupStore is returned. With numba the whole loop runs in
+    the compiled _assign_and_update kernel; otherwise each phase is scored
+    against every centroid with a single BLAS matrix-vector product. Either
+    way phases are assigned one by one, so a phase can join a group created
+    or moved by an earlier phase. With GREEDY_ASSIGN the scan stops at the
+    first group (largest first) that clears COSINE_THRESHOLD.
     """
+    store = groups if isinstance(groups, GroupStore) else GroupStore.from_rows(groups)
+
+    if _assign_kernel is not None and phase_units:
+        return _assign_with_kernel(phase_units, store, user_id)
+
     # compute next group id safely (avoid collision with DB ids)
     # next_group_id = max([g["group_id"] for g in groups], default=0) + 1
 
     for p in phase_units:
-        v = np.array(p["embedding"], dtype=np.float32)
+        v = _phase_vector(p)
 
-        best_group = None
+        best_idx = None
         best_score = -1.0
 
-        for g in groups:
-            score = cosine(v, g["centroid"])
-            if score > best_score:
-                best_score = score
-                best_group = g
+        if store.n_used and GREEDY_ASSIGN:
+            best_idx, best_score = _first_above_threshold(store, v)
+        elif store.n_used:
+            scores = store.active_centroids @ v
+            j = int(scores.argmax())
+            # first group with the highest score, as the per-group loop did
+            if scores[j] > best_score:
+                best_idx = j
+                best_score = float(scores[j])
 
         # JOIN EXISTING GROUP
-        if best_group and best_score >= COSINE_THRESHOLD:
-            n = best_group["size"]
-            new_centroid = (best_group["centroid"] * n + v) / (n + 1)
-            best_group["centroid"] = l2_normalize(new_centroid)
-            best_group["size"] += 1
-            p["group_id"] = best_group["group_id"]
+        if best_idx is not None and best_score >= COSINE_THRESHOLD:
+            # In place on the store's row: no temporaries per join
+            c = store.centroids[best_idx]
+            n = int(store.sizes[best_idx])
+            np.multiply(c, n, out=c)
+            np.add(c, v, out=c)
+            np.divide(c, n + 1, out=c)
+            nrm = float(np.linalg.norm(c))
+            if nrm:
+                c /= nrm
+            store.sizes[best_idx] = n + 1
+            p["group_id"] = int(store.ids[best_idx])
 
         # CREATE NEW GROUP
         else:
@@ -219,11 +537,7 @@ def assign_phases_to_groups(phase_units, groups, user_id: int):
 
             # next_group_id += 1
 
-            groups.append({
-                "group_id": new_id,
-                "centroid": v,
-                "size": 1
-            })
+            store.append(new_id, v, 1)
             p["group_id"] = new_id
 
-    return phase_units, groups
+    return phase_units, store
@@ -0,0 +1,19 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One keep-alive pool per process for blob downloads (excel_parser,
+# process_video), so consecutive requests reuse the TCP/TLS connection.
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+    ),
+)
+
+session = requests.Session()
+session.mount("https://", _ADAPTER)
+session.mount("http://", _ADAPTER)
@@ -8,7 +8,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from ultralytics import YOLO
 import subprocess
-import requests
+from http_session import session as http_session
 
 from vision_pipeline import caption_keyframes
 from db_ops import init_db_sync, close_db_sync
@@ -226,10 +226,10 @@ def _download_blob(blob_url: str, dest_path: str):
         logger.info(f"Exception: {repr(e)}")
 
     # ---- fallback ----
-    logger.info("Fallback to requests.get")
+    logger.info("Fallback to HTTP GET (pooled session)")
 
     try:
-        with requests.get(blob_url, stream=True, timeout=60) as r:
+        with http_session.get(blob_url, stream=True, timeout=60) as r:
             r.raise_for_status()
 
             total = int(r.headers.get("content-length", 0))
@@ -357,12 +357,12 @@ def fire_compress_async(video_path, blob_url, video_id):
 # MAIN
 # =========================
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Process a livestream video")
     parser.add_argument("--video-id", dest="video_id", type=str, required=True)
     parser.add_argument("--video-path", dest="video_path", type=str)
     parser.add_argument("--blob-url", dest="blob_url", type=str)
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     logger.info("[DB] Initializing database connection...")
     init_db_sync()
@@ -390,12 +390,8 @@ def main():
                 logger.info("[EXCEL] Clean video detected, loading Excel data...")
                 time_offset_seconds = excel_urls.get("time_offset_seconds", 0)
                 logger.info("[EXCEL] Time offset for this video: %.1f seconds", time_offset_seconds)
+                # Parsed lazily: each workbook is read when its section is first used
                 excel_data = load_excel_data(video_id, excel_urls)
-                logger.info(
-                    "[EXCEL] Loaded: %d products, %d trend entries",
-                    len(excel_data.get("products", [])),
-                    len(excel_data.get("trends", [])),
-                )
             else:
                 logger.info("[EXCEL] Screen recording mode, no Excel data")
         except Exception as e:
@@ -723,12 +719,27 @@ def main():
                 gmv_key, order_key, viewer_key, like_key, comment_key, share_key, follower_key, click_key, conv_key, gpm_key)
 
             # CSVエントリを時刻順にソート
+            # 指標セルはここで一度だけ数値化する（フェーズごとに再パースしない）
+            metric_keys = {
+                "gmv": gmv_key, "order": order_key, "viewer": viewer_key,
+                "like": like_key, "comment": comment_key, "share": share_key,
+                "follower": follower_key, "click": click_key, "conv": conv_key,
+                "gpm": gpm_key,
+            }
+            metric_keys = {name: key for name, key in metric_keys.items() if key}
             timed_entries = []
             if time_key:
                 for entry in trends:
                     t_sec = _parse_time_to_seconds(entry.get(time_key))
                     if t_sec is not None:
-                        timed_entries.append({"time_sec": t_sec, "entry": entry})
+                        timed_entries.append({
+                            "time_sec": t_sec,
+                            "entry": entry,
+                            "num": {
+                                name: _safe_float(entry.get(key)) or 0
+                                for name, key in metric_keys.items()
+                            },
+                        })
                 timed_entries.sort(key=lambda x: x["time_sec"])
 
             # video_start_sec: CSVの最初のタイムスタンプ
@@ -772,23 +783,19 @@ def main():
 
                 for te in timed_entries:
                     t = te["time_sec"]
-                    e = te["entry"]
+                    n = te["num"]
                     if t >= phase_abs_start and t <= phase_abs_end:
                         match_count += 1
-                        if gmv_key: phase_gmv += _safe_float(e.get(gmv_key)) or 0
-                        if order_key: phase_orders += int(_safe_float(e.get(order_key)) or 0)
-                        if viewer_key: phase_viewers = max(phase_viewers, int(_safe_float(e.get(viewer_key)) or 0))
-                        if like_key: phase_likes = max(phase_likes, int(_safe_float(e.get(like_key)) or 0))
-                        if comment_key: phase_comments += int(_safe_float(e.get(comment_key)) or 0)
-                        if share_key: phase_shares += int(_safe_float(e.get(share_key)) or 0)
-                        if follower_key: phase_followers += int(_safe_float(e.get(follower_key)) or 0)
-                        if click_key: phase_clicks += int(_safe_float(e.get(click_key)) or 0)
-                        if conv_key:
-                            cv = _safe_float(e.get(conv_key)) or 0
-                            phase_conv = max(phase_conv, cv)
-                        if gpm_key:
-                            gv = _safe_float(e.get(gpm_key)) or 0
-                            phase_gpm = max(phase_gpm, gv)
+                        if gmv_key: phase_gmv += n["gmv"]
+                        if order_key: phase_orders += int(n["order"])
+                        if viewer_key: phase_viewers = max(phase_viewers, int(n["viewer"]))
+                        if like_key: phase_likes = max(phase_likes, int(n["like"]))
+                        if comment_key: phase_comments += int(n["comment"])
+                        if share_key: phase_shares += int(n["share"])
+                        if follower_key: phase_followers += int(n["follower"])
+                        if click_key: phase_clicks += int(n["click"])
+                        if conv_key: phase_conv = max(phase_conv, n["conv"])
+                        if gpm_key: phase_gpm = max(phase_gpm, n["gpm"])
                         phase_score = max(phase_score, score_map.get(t, 0))
 
                 # sales_dataから商品名を取得
@@ -881,7 +888,6 @@ def main():
                 )
 
                 # Persist audio features to DB
-                import json as _json
                 af_count = 0
                 for p in phase_units:
                     af = p.get("audio_features")
@@ -890,7 +896,7 @@ def main():
                             update_video_phase_audio_features_sync(
                                 video_id=video_id,
                                 phase_index=p["phase_index"],
-                                audio_features_json=_json.dumps(af),
+                                audio_features=af,
                             )
                             af_count += 1
                         except Exception as e:
@@ -913,7 +919,7 @@ def main():
             groups = load_global_groups_from_db(user_id)
             phase_units, groups = assign_phases_to_groups(phase_units, groups, user_id)
 
-            for g in groups:
+            for g in groups.as_dict_list():
                 update_phase_group_sync(
                     group_id=g["group_id"],
                     centroid=g["centroid"].tolist(),
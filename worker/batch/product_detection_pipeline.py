@@ -36,16 +36,46 @@ import os
 import re
 import json
 import time
-import random
 import base64
+import io
+import mmap
 import asyncio
 import logging
-from collections import Counter
-from functools import partial
-from openai import AzureOpenAI, RateLimitError, APIError, APITimeoutError
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from hashlib import blake2b
+import httpx
+import numpy as np
+import orjson
+from PIL import Image
+from openai import AzureOpenAI, AsyncAzureOpenAI, RateLimitError, APIError, APITimeoutError
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 from dotenv import load_dotenv
 from decouple import config
 
+# 全キーワードを1回の走査で照合する Aho-Corasick（未導入なら部分文字列照合）
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 長い検出列のセグメント化用 JIT（未導入なら numpy 版を使う）
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 load_dotenv()
 logger = logging.getLogger("product_detection")
 
@@ -60,22 +90,218 @@ AZURE_OPENAI_ENDPOINT = env("AZURE_OPENAI_ENDPOINT")
 GPT5_API_VERSION = env("GPT5_API_VERSION")
 GPT5_MODEL = env("GPT5_MODEL")
 
-client = AzureOpenAI(
-    api_key=OPENAI_API_KEY,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_version=GPT5_API_VERSION,
-)
+# 画像分析の同時接続プール（MAX_CONCURRENCY を上げてもここが詰まらない大きさ）
+# HTTP/2 で多重化し、接続は run の間ずっと使い回す
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64, keepalive_expiry=120)
+_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+
+def make_async_client() -> AsyncAzureOpenAI:
+    """
+    イベントループごとに作る非同期クライアント。
+    httpx の接続は作成したループに紐づくため、run_async ごとに新しく作る。
+    """
+    return AsyncAzureOpenAI(
+        api_key=OPENAI_API_KEY,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_version=GPT5_API_VERSION,
+        http_client=httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT),
+    )
+
+
+def make_client() -> AzureOpenAI:
+    """同期クライアント（Batch API のアップロード・ポーリング用）"""
+    return AzureOpenAI(
+        api_key=OPENAI_API_KEY,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_version=GPT5_API_VERSION,
+    )
+
+
+# 実行中のイベントループ内（FastAPI ハンドラ等）から呼ばれたとき用の常駐ループ。
+# 呼び出し元のループに再入せず、スレッドも呼び出しごとには作らない。
+_detect_loop = None
+_detect_loop_lock = threading.Lock()
+
+
+def _get_detect_loop() -> asyncio.AbstractEventLoop:
+    global _detect_loop
+    with _detect_loop_lock:
+        if _detect_loop is None or _detect_loop.is_closed():
+            _detect_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_detect_loop.run_forever, name="detect-loop", daemon=True
+            ).start()
+    return _detect_loop
+
+
+def run_async(coro):
+    """
+    同期コードからコルーチンを最後まで実行して結果を返す。
+    ループ外なら asyncio.Runner、ループ内なら常駐ループへ投げて完了を待つ。
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        with asyncio.Runner() as runner:
+            return runner.run(coro)
+    return asyncio.run_coroutine_threadsafe(coro, _get_detect_loop()).result()
 
 
 # ─── UTILS ──────────────────────────────────────────────────
-def encode_image(path: str) -> str:
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+# 送信前に長辺をこのサイズまで縮小して再JPEG化（アップロード量・画像トークン削減）
+# 0 なら縮小しない
+FRAME_MAX_SIDE = 512
+FRAME_JPEG_QUALITY = 75
+
+
+def _shrink_jpeg(f) -> bytes | None:
+    """長辺 > FRAME_MAX_SIDE なら縮小した JPEG バイト列、それ以外は None（元ファイルをそのまま送る）"""
+    with Image.open(f) as im:
+        if max(im.size) <= FRAME_MAX_SIDE:
+            return None
+        # JPEG は DCT 段階で縮小デコード（長辺 FRAME_MAX_SIDE 以上は保つ）してから LANCZOS で仕上げる
+        im.draft("RGB", (FRAME_MAX_SIDE, FRAME_MAX_SIDE))
+        im = im.convert("RGB")
+        im.thumbnail((FRAME_MAX_SIDE, FRAME_MAX_SIDE), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        im.save(buf, format="JPEG", quality=FRAME_JPEG_QUALITY, optimize=True)
+        return buf.getvalue()
+
+
+@lru_cache(maxsize=512)
+def _image_data_url_cached(path: str, mtime_ns: int, size: int) -> tuple[str, bytes]:
+    # (path, mtime_ns, size) をキーにするので、書き換えられたファイルは再エンコードされる
+    # mmap: 元ファイルをコピーせずにハッシュ・base64 へ渡す
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # ハッシュは元ファイルの内容で（同一フレーム判定用）
+        digest = blake2b(mm, digest_size=16).digest()
+        shrunk = _shrink_jpeg(f) if FRAME_MAX_SIDE else None
+        b64 = base64.b64encode(mm if shrunk is None else shrunk).decode("ascii")
+    return "data:image/jpeg;base64," + b64, digest
+
+
+# 直前に採用したフレームとのハミング距離がこれ以下なら同一シーンとみなす
+PHASH_MAX_DISTANCE = 5
+
+
+def frame_phash(path: str) -> int | None:
+    """9x8 グレースケールの dHash（64bit）。読めない画像は None"""
+    try:
+        with Image.open(path) as im:
+            im.draft("L", (64, 64))  # JPEG は縮小デコード（9x8 に落とすので解像度は不要）
+            px = im.convert("L").resize((9, 8), Image.Resampling.BILINEAR).tobytes()
+    except Exception:
+        return None
+    h = 0
+    for r in range(8):
+        row = px[r * 9:(r + 1) * 9]
+        for c in range(8):
+            h = (h << 1) | (row[c] < row[c + 1])
+    return h
+
+
+# シーン切り替え判定: 縮小グレースケールのヒストグラム（64bin, 合計1）の L1 差分がこれを超えたら別ショット
+SHOT_CHANGE_THRESHOLD = 0.5
+# 等間隔サンプルに追加するシーン切り替えフレームの上限（等間隔サンプル数に対する比率）
+SHOT_MAX_EXTRA_RATIO = 0.5
+
+
+def frame_gray_hist(path: str) -> np.ndarray | None:
+    """縮小グレースケールの64binヒストグラム（合計1）。読めない画像は None"""
+    try:
+        with Image.open(path) as im:
+            im.draft("L", (64, 64))  # JPEG は縮小デコード
+            px = np.frombuffer(im.convert("L").resize((64, 64)).tobytes(), dtype=np.uint8)
+    except Exception:
+        return None
+    return np.bincount(px >> 2, minlength=64) / px.size
+
+
+def select_gap_frames(
+    frame_paths: list[str],
+    gaps: list[tuple[float, float]],
+    sample_interval: int,
+) -> list[int]:
+    """
+    空白時間帯から分析するフレームindexを選ぶ。
+    sample_interval ごとの等間隔サンプルに加えて、直前に採用したフレームから
+    ヒストグラムが大きく変わったフレーム（ショット切り替え）も採用する。
+    追加分は等間隔サンプル数 × SHOT_MAX_EXTRA_RATIO まで、差分の大きい順。
+    """
+    n = len(frame_paths)
+    ranges = []
+    for gap_start, gap_end in gaps:
+        start_idx = max(0, int(gap_start))
+        end_idx = min(n - 1, int(gap_end))
+        if start_idx <= end_idx:
+            ranges.append((start_idx, end_idx))
+
+    regular = {
+        idx
+        for start_idx, end_idx in ranges
+        for idx in range(start_idx, end_idx + 1, sample_interval)
+    }
+    max_extra = int(len(regular) * SHOT_MAX_EXTRA_RATIO)
+    if not max_extra:
+        return sorted(regular)
+
+    candidates = sorted({idx for a, b in ranges for idx in range(a, b + 1)})
+    # PIL のデコードは GIL を解放するのでスレッドで並列化
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        hists = dict(zip(candidates, ex.map(frame_gray_hist, (frame_paths[i] for i in candidates))))
+
+    shot_changes: list[tuple[float, int]] = []
+    for start_idx, end_idx in ranges:
+        ref = None
+        for idx in range(start_idx, end_idx + 1):
+            h = hists.get(idx)
+            if h is None:
+                continue
+            if idx in regular or ref is None:
+                ref = h
+                continue
+            diff = float(np.abs(h - ref).sum())
+            if diff > SHOT_CHANGE_THRESHOLD:
+                shot_changes.append((diff, idx))
+                ref = h
+
+    shot_changes.sort(reverse=True)
+    extra = {idx for _, idx in shot_changes[:max_extra]}
+    logger.info(
+        "[PRODUCT-v4] Frame selection: %d regular + %d shot changes (%d detected)",
+        len(regular), len(extra - regular), len(shot_changes),
+    )
+    return sorted(regular | extra)
+
+
+_FRAME_EXTS = frozenset({"jpg", "jpeg", "png"})
+
+
+def list_frame_files(frame_dir: str) -> list[str]:
+    """frame_dir 内の画像ファイル名（ソート済み）。scandir なので追加の stat は不要"""
+    with os.scandir(frame_dir) as it:
+        return sorted(
+            e.name for e in it
+            if e.name.rpartition(".")[2].lower() in _FRAME_EXTS and e.is_file()
+        )
+
+
+def image_data_url(path: str) -> tuple[str, bytes]:
+    """画像 → (data URL, 内容ハッシュ)。同じファイルは再読込・再エンコードしない"""
+    st = os.stat(path)
+    return _image_data_url_cached(path, st.st_mtime_ns, st.st_size)
 
 
 def safe_json_load(text: str):
     if not text:
         return None
+    # 構造化出力（strict JSON schema）ならそのまま読める
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        pass
+    # フォールバック: ```json ... ``` で囲まれた応答
     text = text.strip()
     if text.startswith("```"):
         lines = text.splitlines()
@@ -90,38 +316,88 @@ def safe_json_load(text: str):
         return None
 
 
+# ─── PRODUCT LIST ─────────────────────────────────────────
+@dataclass(slots=True, frozen=True)
+class Product:
+    """product_list の1件。列名の揺れ（product_name / name / 商品名 ...）は from_dict で吸収する"""
+    name: str | None  # 名前の列が1つも無ければ None
+    brand: str
+    image_url: str
+
+    @classmethod
+    def from_dict(cls, p: dict) -> "Product":
+        return cls(
+            name=p.get("product_name", p.get("name", p.get("商品名", p.get("商品タイトル")))),
+            brand=p.get("brand_name", p.get("brand", p.get("ブランド名", p.get("ブランド", "")))),
+            image_url=p.get("image_url", p.get("product_image_url", "")),
+        )
+
+
+def normalize_products(product_list: list[dict]) -> list[Product]:
+    return [Product.from_dict(p) for p in product_list]
+
+
 # ─── PRODUCT KEYWORD MAP ──────────────────────────────────
-def build_product_keyword_map(product_list: list[dict]) -> dict[str, list[str]]:
+_SPLIT_RE = re.compile(r'[\s　・/\-]+')
+_SKIP_WORDS = frozenset({'kyogoku', 'the', 'and', 'for', 'pro', '用', '式', '型'})
+
+
+def build_product_keyword_map(products: list[Product]) -> dict[str, list[str]]:
     """
     商品名からキーワードマップを構築。
     部分一致用に複数キーワードを生成する。
     """
     product_keywords: dict[str, list[str]] = {}
-    for p in product_list:
-        name = p.get("product_name", p.get("name", p.get("商品名", p.get("商品タイトル", ""))))
+    for p in products:
+        name = p.name
         if not name:
             continue
-        keywords = []
         # フルネーム
-        keywords.append(name.lower())
+        keywords = [name.lower()]
         # ブランド名
-        brand = p.get("brand_name", p.get("brand", p.get("ブランド名", p.get("ブランド", ""))))
+        brand = p.brand
         if brand:
             keywords.append(brand.lower())
         # 商品名を分割してキーワード化（3文字以上の単語）
-        words = re.split(r'[\s　・/\-]+', name)
-        for w in words:
-            w = w.strip().lower()
-            skip_words = {'kyogoku', 'the', 'and', 'for', 'pro', '用', '式', '型'}
-            if len(w) >= 3 and w not in skip_words:
-                keywords.append(w)
-        product_keywords[name] = list(set(keywords))
+        keywords.extend(
+            w for w in map(str.strip, _SPLIT_RE.split(keywords[0]))
+            if len(w) >= 3 and w not in _SKIP_WORDS
+        )
+        # 重複除去（順序は保持）
+        product_keywords[name] = list(dict.fromkeys(keywords))
     return product_keywords
 
 
 # ═══════════════════════════════════════════════════════════
 # PHASE 1: 音声トランスクリプトから商品言及を検出（API不要）
 # ═══════════════════════════════════════════════════════════
+class KeywordMatcher:
+    """
+    product_keywords の全キーワード（3文字以上）をまとめて照合する。
+    match(text) はテキスト中に現れたキーワードの集合を返す。
+    """
+
+    def __init__(self, product_keywords: dict[str, list[str]]):
+        # キーワード → それを持つ商品名（ブランド名など複数商品で共有されうる）
+        self.products_by_kw: dict[str, list[str]] = defaultdict(list)
+        for product_name, keywords in product_keywords.items():
+            for kw in keywords:
+                if len(kw) >= 3:
+                    self.products_by_kw[kw].append(product_name)
+
+        self._automaton = None
+        if ahocorasick is not None and self.products_by_kw:
+            self._automaton = ahocorasick.Automaton()
+            for kw in self.products_by_kw:
+                self._automaton.add_word(kw, kw)
+            self._automaton.make_automaton()
+
+    def match(self, text: str) -> set[str]:
+        if self._automaton is not None:
+            return {kw for _, kw in self._automaton.iter(text)}
+        return {kw for kw in self.products_by_kw if kw in text}
+
+
 def detect_from_transcription(
     transcription_segments: list[dict],
     product_keywords: dict[str, list[str]],
@@ -139,6 +415,8 @@ def detect_from_transcription(
 
     # 各商品の言及タイムスタンプを収集
     product_mentions: dict[str, list[tuple[float, float, int]]] = {}
+    matcher = KeywordMatcher(product_keywords)
+    product_order = {name: i for i, name in enumerate(product_keywords)}
 
     for seg in transcription_segments:
         text_lower = seg.get("text", "").lower()
@@ -148,16 +426,15 @@ def detect_from_transcription(
         if not text_lower.strip():
             continue
 
-        for product_name, keywords in product_keywords.items():
-            match_count = 0
-            for kw in keywords:
-                if kw in text_lower and len(kw) >= 3:
-                    match_count += 1
+        # 商品ごとの一致キーワード数（セグメントを1回走査するだけ）
+        match_counts: Counter = Counter()
+        for kw in matcher.match(text_lower):
+            match_counts.update(matcher.products_by_kw[kw])
 
-            if match_count > 0:
-                if product_name not in product_mentions:
-                    product_mentions[product_name] = []
-                product_mentions[product_name].append((seg_start, seg_end, match_count))
+        for product_name in sorted(match_counts, key=product_order.__getitem__):
+            if product_name not in product_mentions:
+                product_mentions[product_name] = []
+            product_mentions[product_name].append((seg_start, seg_end, match_counts[product_name]))
 
     # 各商品について連続する言及を統合
     exposures = []
@@ -226,6 +503,57 @@ def detect_from_transcription(
 # ═══════════════════════════════════════════════════════════
 # PHASE 2: 売上データから商品露出時間帯を推定（v4: 音声照合ベース）
 # ═══════════════════════════════════════════════════════════
+# 売上は紹介の最中〜紹介後この秒数以内に発生するとみなす
+SALES_AFTER_AUDIO_SEC = 180
+
+
+def _audio_range_bounds(ranges: list[tuple[float, float]]) -> tuple[list[float], list[float]] | None:
+    """
+    (開始時刻リスト, 終了+SALES_AFTER_AUDIO_SEC リスト)。
+    どちらも昇順のときだけ返す（二分探索で候補区間を絞れる）。それ以外は None。
+    """
+    starts = [a for a, _ in ranges]
+    tails = [b + SALES_AFTER_AUDIO_SEC for _, b in ranges]
+    for i in range(1, len(ranges)):
+        if starts[i] < starts[i - 1] or tails[i] < tails[i - 1]:
+            return None
+    return starts, tails
+
+
+def _nearest_audio_range(ranges, bounds, video_time: float):
+    """a_start <= video_time <= a_end + SALES_AFTER_AUDIO_SEC の区間のうち中心が最も近いもの"""
+    if bounds is not None:
+        starts, tails = bounds
+        # starts[i] <= video_time かつ tails[i] >= video_time の区間は連続した範囲になる
+        candidates = ranges[bisect_left(tails, video_time):bisect_right(starts, video_time)]
+    else:
+        candidates = [
+            (a_start, a_end) for a_start, a_end in ranges
+            if a_start <= video_time <= a_end + SALES_AFTER_AUDIO_SEC
+        ]
+
+    best_audio_match = None
+    best_audio_distance = float('inf')
+    for a_start, a_end in candidates:
+        distance = abs(video_time - (a_start + a_end) / 2)
+        if distance < best_audio_distance:
+            best_audio_distance = distance
+            best_audio_match = (a_start, a_end)
+    return best_audio_match
+
+
+def _match_sales_product(product_name: str, product_keywords: dict[str, list[str]]) -> str | None:
+    """売上CSVの商品名に対応する商品（キーワードの部分一致、リスト順で最初のもの）"""
+    name_lower = product_name.lower()
+    for pname, keywords in product_keywords.items():
+        for kw in keywords:
+            if kw in name_lower or name_lower in kw:
+                return pname
+    if product_name in product_keywords:
+        return product_name
+    return None
+
+
 def detect_from_sales_data(
     excel_data: dict | None,
     product_keywords: dict[str, list[str]],
@@ -295,9 +623,12 @@ def detect_from_sales_data(
             if name not in audio_index:
                 audio_index[name] = []
             audio_index[name].append((ae["time_start"], ae["time_end"]))
+    audio_bounds = {name: _audio_range_bounds(r) for name, r in audio_index.items()}
 
     # ── 売上エントリを処理 ──
     exposures = []
+    # 売上CSVの商品名 → 照合結果（同じ商品名が時間帯ごとに何度も出るので1回だけ照合する）
+    matched_by_name: dict[str, str | None] = {}
     for entry in trends:
         t_sec = _parse_time_to_seconds(entry.get(time_key))
         if t_sec is None:
@@ -336,18 +667,11 @@ def detect_from_sales_data(
         if not product_name:
             continue
 
-        matched_name = None
-        for pname, keywords in product_keywords.items():
-            for kw in keywords:
-                if kw in product_name.lower() or product_name.lower() in kw:
-                    matched_name = pname
-                    break
-            if matched_name:
-                break
-
-        if not matched_name:
-            if product_name in product_keywords:
-                matched_name = product_name
+        if product_name in matched_by_name:
+            matched_name = matched_by_name[product_name]
+        else:
+            matched_name = _match_sales_product(product_name, product_keywords)
+            matched_by_name[product_name] = matched_name
 
         if not matched_name:
             continue
@@ -357,14 +681,9 @@ def detect_from_sales_data(
 
         # 戦略1: 売上発生時刻の直前に音声で確認された紹介区間があるか
         # 売上は紹介の最中〜紹介後3分以内に発生するのが自然
-        best_audio_match = None
-        best_audio_distance = float('inf')
-        for a_start, a_end in audio_ranges:
-            if a_start <= video_time <= a_end + 180:
-                distance = abs(video_time - (a_start + a_end) / 2)
-                if distance < best_audio_distance:
-                    best_audio_distance = distance
-                    best_audio_match = (a_start, a_end)
+        best_audio_match = _nearest_audio_range(
+            audio_ranges, audio_bounds.get(matched_name), video_time,
+        )
 
         if best_audio_match:
             # 音声で確認済み → 音声区間をそのまま使い、confidenceをブースト
@@ -503,12 +822,18 @@ def find_uncovered_gaps(
     return gaps
 
 
-def build_product_detection_prompt(product_list: list[dict]) -> str:
+def build_product_detection_prompt(products: list[Product]) -> str:
     """商品リストを含むシステムプロンプトを構築する（v2と同じ高品質プロンプト）"""
+    # 同じ商品リストなら同じ文字列オブジェクトを返す（再実行・常駐ワーカーでの後続ジョブ）
+    return _product_detection_prompt(tuple(products))
+
+
+@lru_cache(maxsize=8)
+def _product_detection_prompt(products: tuple[Product, ...]) -> str:
     product_names = []
-    for i, p in enumerate(product_list):
-        name = p.get("product_name", p.get("name", p.get("商品名", p.get("商品タイトル", f"Product_{i}"))))
-        brand = p.get("brand_name", p.get("brand", p.get("ブランド名", p.get("ブランド", ""))))
+    for i, p in enumerate(products):
+        name = p.name if p.name is not None else f"Product_{i}"
+        brand = p.brand
         if brand:
             product_names.append(f"- {name} ({brand})")
         else:
@@ -558,131 +883,606 @@ JSON形式で返してください：
     return prompt
 
 
-def detect_products_in_frame(image_path: str, prompt: str) -> list[dict]:
-    """1フレームの商品検出（同期）"""
-    img_b64 = encode_image(image_path)
+# (画像ハッシュ, プロンプト) → 検出結果。静止シーンなど同一内容のフレームはAPIを呼ばない
+_DETECTION_CACHE: dict[tuple[bytes, str], list[dict]] = {}
+DETECTION_CACHE_MAX = 4096
+# 同じキーのディスクキャッシュ。再実行・クラッシュ後のやり直しでも解析済みフレームはAPIを呼ばない（空文字で無効）
+DETECTION_CACHE_DIR = env("DETECTION_CACHE_DIR", os.path.join(tempfile.gettempdir(), "product_detect_cache"))
+
+
+@lru_cache(maxsize=16)
+def _prompt_hash(prompt: str) -> str:
+    # プロンプトには商品リストが入るので、商品リストが変われば別キャッシュになる
+    return blake2b(prompt.encode("utf-8"), digest_size=8).hexdigest()
+
 
-    for attempt in range(5):
+def _detection_cache_path(cache_key: tuple[bytes, str]) -> str:
+    digest, prompt = cache_key
+    return os.path.join(DETECTION_CACHE_DIR, f"{digest.hex()}_{_prompt_hash(prompt)}.json")
+
+
+def _remember_detection(cache_key: tuple[bytes, str], results: list[dict]):
+    if len(_DETECTION_CACHE) >= DETECTION_CACHE_MAX:
+        _DETECTION_CACHE.clear()
+    _DETECTION_CACHE[cache_key] = [dict(d) for d in results]
+
+
+def _cached_detection(cache_key: tuple[bytes, str]) -> list[dict] | None:
+    """メモリ → ディスクの順にキャッシュを引く。無ければ None"""
+    cached = _DETECTION_CACHE.get(cache_key)
+    if cached is None:
+        if not DETECTION_CACHE_DIR:
+            return None
         try:
-            resp = client.responses.create(
-                model=GPT5_MODEL,
-                input=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "input_text", "text": prompt},
-                        {
-                            "type": "input_image",
-                            "image_url": f"data:image/jpeg;base64,{img_b64}",
-                        },
-                    ],
-                }],
-                max_output_tokens=512,
+            with open(_detection_cache_path(cache_key), "rb") as f:
+                cached = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        _remember_detection(cache_key, cached)
+    return [dict(d) for d in cached]
+
+
+# Azure のデプロイ上限（requests/分, tokens/分）。0 ならその側は制限しない
+AZURE_OPENAI_RPM = float(env("AZURE_OPENAI_RPM", 0))
+AZURE_OPENAI_TPM = float(env("AZURE_OPENAI_TPM", 0))
+# バケツ容量 = 上限のこの秒数分（バーストで上限の短時間窓を超えないように）
+RATE_LIMIT_BURST_SEC = 10
+# 1画像あたりの入力トークン見積もり
+IMAGE_TOKENS_EST = 765
+
+
+class AsyncTokenBucket:
+    """
+    requests/分 と tokens/分 のトークンバケツ。acquire(tokens) は両方に空きができるまで待つ。
+    待ちは先着順。asyncio.Lock がループに紐づくので、イベントループ（run）ごとに作る。
+    """
+
+    def __init__(self, rpm: float, tpm: float, burst_sec: float = RATE_LIMIT_BURST_SEC):
+        self.rpm, self.tpm = rpm, tpm
+        self._req_cap = max(1.0, rpm * burst_sec / 60)
+        self._tok_cap = tpm * burst_sec / 60
+        self._req, self._tok = self._req_cap, self._tok_cap
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        self._req = min(self._req_cap, self._req + elapsed * self.rpm / 60)
+        self._tok = min(self._tok_cap, self._tok + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int = 0):
+        # バケツより大きい要求は満杯まで待てば通す
+        tokens = min(tokens, self._tok_cap)
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.rpm and self._req < 1:
+                    wait = (1 - self._req) * 60 / self.rpm
+                if self.tpm and self._tok < tokens:
+                    wait = max(wait, (tokens - self._tok) * 60 / self.tpm)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self._req -= 1
+            self._tok -= tokens
+
+
+def make_rate_limiter() -> AsyncTokenBucket | None:
+    """AZURE_OPENAI_RPM / AZURE_OPENAI_TPM が設定されていればバケツを作る（run ごと）"""
+    if not (AZURE_OPENAI_RPM or AZURE_OPENAI_TPM):
+        return None
+    return AsyncTokenBucket(AZURE_OPENAI_RPM, AZURE_OPENAI_TPM)
+
+
+def _estimate_tokens(body: dict) -> int:
+    """リクエストの消費トークン見積もり（テキスト UTF-8 バイト/4 + 画像 + 出力上限）"""
+    tokens = body.get("max_output_tokens", 0)
+    for msg in body["input"]:
+        for part in msg["content"]:
+            if part["type"] == "input_image":
+                tokens += IMAGE_TOKENS_EST
+            else:
+                tokens += len(part["text"].encode("utf-8")) // 4
+    return tokens
+
+
+DETECTION_MAX_ATTEMPTS = 6
+# Retry-After が無いときの待ち時間: 指数バックオフ + full jitter（最大30秒）
+_jitter_wait = wait_random_exponential(multiplier=1, max=30)
+
+
+def _wait_retry_after(retry_state) -> float:
+    """サーバーの Retry-After（秒）があればそれに従い、無ければ jitter 付き指数バックオフ"""
+    exc = retry_state.outcome.exception()
+    response = getattr(exc, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    if header:
+        try:
+            return min(float(header), 60.0)
+        except ValueError:
+            pass
+    return _jitter_wait(retry_state)
+
+
+def _log_retry(retry_state):
+    logger.warning(
+        "[PRODUCT] Rate limit, retry in %.1fs (attempt %d)",
+        retry_state.next_action.sleep, retry_state.attempt_number,
+    )
+
+
+@retry(
+    retry=retry_if_exception_type((RateLimitError, APITimeoutError)),
+    wait=_wait_retry_after,
+    stop=stop_after_attempt(DETECTION_MAX_ATTEMPTS),
+    before_sleep=_log_retry,
+    reraise=True,
+)
+async def _request_detection(aclient: AsyncAzureOpenAI, body: dict, limiter: AsyncTokenBucket | None = None):
+    # 上限手前でペースを合わせる。429 のバックオフ（上の retry）は最後の防衛線
+    if limiter is not None:
+        await limiter.acquire(_estimate_tokens(body))
+    return await aclient.responses.create(**body)
+
+
+# 商品検出の応答スキーマ（Structured Outputs, strict）
+DETECTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "detected_products": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "product_name": {"type": "string"},
+                    "confidence": {"type": "number"},
+                    "detection_reason": {
+                        "type": "string",
+                        "enum": ["hand_holding", "showing_camera", "closeup", "pointing", "background_only"],
+                    },
+                },
+                "required": ["product_name", "confidence", "detection_reason"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["detected_products"],
+    "additionalProperties": False,
+}
+
+
+# 検出前にフレームを読込・エンコードする並列数（API 呼び出しより十分速いので少数でよい）
+FRAME_LOADERS = 4
+
+# 1リクエストにまとめるフレーム数（商品リスト入りプロンプトと往復の待ち時間を複数フレームで共有する）
+FRAMES_PER_REQUEST = 4
+
+# 複数フレーム検出の応答スキーマ: frame_id（1〜N）ごとの検出結果
+MULTI_DETECTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "frames": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "frame_id": {"type": "integer"},
+                    "detected_products": DETECTION_SCHEMA["properties"]["detected_products"],
+                },
+                "required": ["frame_id", "detected_products"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["frames"],
+    "additionalProperties": False,
+}
+
+
+def _multi_frame_instruction(n: int) -> str:
+    return f"""
+
+【複数フレーム】
+以下に {n} 枚のフレーム画像があり、各画像の直前に frame_id（1〜{n}）を示しています。
+各フレームを個別に上記の基準で判定し、frame_id ごとに結果を返してください：
+{{"frames": [{{"frame_id": 1, "detected_products": [...]}}, ...]}}
+商品を紹介していないフレームも detected_products を空配列にして含めてください。"""
+
+
+def _detection_request_body(prompt: str, data_url: str) -> dict:
+    """responses.create の引数（Batch API の body と共通）"""
+    return {
+        "model": GPT5_MODEL,
+        "input": [{
+            "role": "user",
+            "content": [
+                {"type": "input_text", "text": prompt},
+                {
+                    "type": "input_image",
+                    "image_url": data_url,
+                },
+            ],
+        }],
+        "max_output_tokens": 512,
+        "text": {
+            "format": {
+                "type": "json_schema",
+                "name": "detections",
+                "schema": DETECTION_SCHEMA,
+                "strict": True,
+            },
+        },
+    }
+
+
+def _multi_detection_request_body(prompt: str, data_urls: list[str]) -> dict:
+    """複数フレームを1回の responses.create で検出する引数。画像の前に frame_id を置く"""
+    content = [{"type": "input_text", "text": prompt + _multi_frame_instruction(len(data_urls))}]
+    for k, data_url in enumerate(data_urls, 1):
+        content.append({"type": "input_text", "text": f"frame_id={k}"})
+        content.append({"type": "input_image", "image_url": data_url})
+    return {
+        "model": GPT5_MODEL,
+        "input": [{"role": "user", "content": content}],
+        "max_output_tokens": 512 * len(data_urls),
+        "text": {
+            "format": {
+                "type": "json_schema",
+                "name": "frame_detections",
+                "schema": MULTI_DETECTION_SCHEMA,
+                "strict": True,
+            },
+        },
+    }
+
+
+def _parse_detection_output(text: str) -> list[dict] | None:
+    """モデル出力 → 検出結果（background_only は除外）。JSONとして読めなければ None"""
+    data = safe_json_load(text)
+    if not (data and "detected_products" in data):
+        return None
+    return [
+        det for det in data["detected_products"]
+        if det.get("detection_reason", "") != "background_only"
+    ]
+
+
+def _parse_multi_detection_output(text: str, n: int) -> dict[int, list[dict]] | None:
+    """複数フレームのモデル出力 → {frame_id(1〜n): 検出結果}。範囲外の frame_id は無視"""
+    data = safe_json_load(text)
+    if not (data and isinstance(data.get("frames"), list)):
+        return None
+    by_frame: dict[int, list[dict]] = {}
+    for frame in data["frames"]:
+        k = frame.get("frame_id")
+        if isinstance(k, int) and 1 <= k <= n:
+            by_frame[k] = [
+                det for det in frame.get("detected_products") or []
+                if det.get("detection_reason", "") != "background_only"
+            ]
+    return by_frame
+
+
+def _cache_detection(cache_key: tuple[bytes, str], results: list[dict]):
+    _remember_detection(cache_key, results)
+    if not DETECTION_CACHE_DIR:
+        return
+    path = _detection_cache_path(cache_key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(DETECTION_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(results))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("[PRODUCT] Could not write detection cache %s: %s", path, e)
+
+
+def _load_frame(path: str, prompt: str) -> tuple[tuple[str, bytes] | None, list[dict] | None]:
+    try:
+        encoded = image_data_url(path)
+    except Exception as e:  # 消えた・0バイト・壊れた画像は、そのフレームだけ検出なし
+        logger.warning("[PRODUCT] Unreadable frame %s: %s", os.path.basename(path), e)
+        return None, []
+    return encoded, _cached_detection((encoded[1], prompt))
+
+
+def load_frames(
+    image_paths: list[str], prompt: str,
+) -> tuple[list[tuple[str, bytes] | None], list[list[dict] | None]]:
+    """
+    ファイル読込 + base64 + キャッシュ参照（ブロッキング。スレッドで呼ぶ）→ (data URL と digest, キャッシュ結果)
+    読めないフレームは (None, [])：API には送らず、キャッシュもしない
+    """
+    loaded = [_load_frame(p, prompt) for p in image_paths]
+    return [e for e, _ in loaded], [c for _, c in loaded]
+
+
+async def detect_products_in_frames(
+    image_paths: list[str],
+    prompt: str,
+    aclient: AsyncAzureOpenAI,
+    limiter: AsyncTokenBucket | None = None,
+    loaded: tuple[list[tuple[str, bytes] | None], list[list[dict] | None]] | None = None,
+) -> list[list[dict]]:
+    """
+    複数フレームの商品検出を1リクエストで行う（非同期）。結果は image_paths と同じ順。
+    loaded: 先読み済みの load_frames の結果（無ければここでスレッドで読む）
+    """
+    if loaded is None:
+        # イベントループを止めないようスレッドで
+        loaded = await asyncio.to_thread(load_frames, image_paths, prompt)
+    encoded, cached = loaded
+    results: list[list[dict]] = [c if c is not None else [] for c in cached]
+    misses = [i for i, c in enumerate(cached) if c is None]
+    if not misses:
+        return results
+
+    label = os.path.basename(image_paths[misses[0]])
+    if len(misses) > 1:
+        label += f" (+{len(misses) - 1} frames)"
+    try:
+        # 429 / タイムアウトの再試行は _request_detection（tenacity）側
+        if len(misses) == 1:
+            i = misses[0]
+            resp = await _request_detection(
+                aclient, _detection_request_body(prompt, encoded[i][0]), limiter,
+            )
+            parsed = _parse_detection_output(resp.output_text)
+            by_miss = {i: parsed} if parsed is not None else {}
+        else:
+            resp = await _request_detection(
+                aclient, _multi_detection_request_body(prompt, [encoded[i][0] for i in misses]), limiter,
             )
-            data = safe_json_load(resp.output_text)
-            if data and "detected_products" in data:
-                results = []
-                for det in data["detected_products"]:
-                    reason = det.get("detection_reason", "")
-                    if reason == "background_only":
-                        continue
-                    results.append(det)
-                return results
-            return []
-        except (RateLimitError, APITimeoutError):
-            sleep_time = (2 ** attempt) + random.uniform(0, 1)
-            logger.warning("[PRODUCT] Rate limit, retry in %.1fs (attempt %d)", sleep_time, attempt + 1)
-            time.sleep(sleep_time)
-        except (APIError, Exception) as e:
-            logger.warning("[PRODUCT] API error on %s: %s", os.path.basename(image_path), e)
-            return []
-    return []
+            parsed = _parse_multi_detection_output(resp.output_text, len(misses))
+            by_miss = {misses[k - 1]: dets for k, dets in (parsed or {}).items()}
+    except (RateLimitError, APITimeoutError):
+        logger.warning(
+            "[PRODUCT] Rate limit on %s, giving up after %d attempts",
+            label, DETECTION_MAX_ATTEMPTS,
+        )
+        return results
+    except (APIError, Exception) as e:
+        logger.warning("[PRODUCT] API error on %s: %s", label, e)
+        return results
+
+    # 応答に含まれなかったフレームは [] のまま（キャッシュもしない）
+    for i, dets in by_miss.items():
+        results[i] = dets
+    await asyncio.to_thread(
+        lambda: [_cache_detection((encoded[i][1], prompt), dets) for i, dets in by_miss.items()]
+    )
+    return results
+
+
+async def detect_products_in_frame(
+    image_path: str,
+    prompt: str,
+    aclient: AsyncAzureOpenAI,
+    limiter: AsyncTokenBucket | None = None,
+) -> list[dict]:
+    """1フレームの商品検出（非同期）"""
+    return (await detect_products_in_frames([image_path], prompt, aclient, limiter))[0]
 
 
 async def detect_products_in_frame_async(
     image_path: str,
     prompt: str,
     sem: asyncio.Semaphore,
+    aclient: AsyncAzureOpenAI,
+    limiter: AsyncTokenBucket | None = None,
 ) -> list[dict]:
-    """1フレームの商品検出（非同期ラッパー）"""
+    """1フレームの商品検出（同時実行数を sem で制限）"""
     async with sem:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            partial(detect_products_in_frame, image_path, prompt),
+        return await detect_products_in_frame(image_path, prompt, aclient, limiter)
+
+
+# Batch API のポーリング間隔（指数的に伸ばす）と全体の待ち上限
+BATCH_POLL_MIN_SEC = 5
+BATCH_POLL_MAX_SEC = 60
+BATCH_TIMEOUT_SEC = 24 * 3600
+_BATCH_DONE = {"completed", "failed", "expired", "cancelled"}
+
+
+def _batch_output_text(body: dict) -> str:
+    """Batch 出力行の response.body（responses API 形式）から output_text を組み立てる"""
+    texts = []
+    for item in body.get("output") or []:
+        for part in item.get("content") or []:
+            if part.get("type") == "output_text":
+                texts.append(part.get("text", ""))
+    return "".join(texts)
+
+
+def detect_products_in_frames_batch(frame_paths: dict[int, str], prompt: str) -> dict[int, list[dict]]:
+    """
+    複数フレームの商品検出を Batch API でまとめて実行する（リアルタイム性は不要な処理向け）。
+    frame_paths: {フレームindex: 画像パス} → {フレームindex: 検出結果}
+    失敗・結果なしのフレームは []。
+    """
+    frame_detections: dict[int, list[dict]] = {}
+    pending: dict[str, tuple[int, tuple[bytes, str]]] = {}
+
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", encoding="utf-8", delete=False) as f:
+        jsonl_path = f.name
+        for idx, path in frame_paths.items():
+            data_url, digest = image_data_url(path)
+            cache_key = (digest, prompt)
+            cached = _cached_detection(cache_key)
+            if cached is not None:
+                frame_detections[idx] = cached
+                continue
+            custom_id = f"frame_{idx}"
+            pending[custom_id] = (idx, cache_key)
+            f.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/responses",
+                "body": _detection_request_body(prompt, data_url),
+            }, ensure_ascii=False))
+            f.write("\n")
+
+    try:
+        if not pending:
+            return frame_detections
+
+        client = make_client()
+        with open(jsonl_path, "rb") as f:
+            input_file = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
         )
+        logger.info("[PRODUCT-v4] Batch %s submitted: %d frames", batch.id, len(pending))
+
+        delay = BATCH_POLL_MIN_SEC
+        deadline = time.time() + BATCH_TIMEOUT_SEC
+        while batch.status not in _BATCH_DONE and time.time() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, BATCH_POLL_MAX_SEC)
+            batch = client.batches.retrieve(batch.id)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            logger.warning("[PRODUCT-v4] Batch %s ended with status=%s", batch.id, batch.status)
+            if batch.status not in _BATCH_DONE:
+                client.batches.cancel(batch.id)
+            return frame_detections
+
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            entry = pending.get(row.get("custom_id"))
+            response = row.get("response") or {}
+            if entry is None or response.get("status_code") != 200:
+                continue
+            idx, cache_key = entry
+            try:
+                results = _parse_detection_output(_batch_output_text(response.get("body") or {}))
+            except (AttributeError, TypeError) as e:
+                logger.warning("[PRODUCT] Unexpected batch output for %s: %s", row.get("custom_id"), e)
+                continue
+            if results is None:
+                continue
+            _cache_detection(cache_key, results)
+            frame_detections[idx] = results
+    finally:
+        os.remove(jsonl_path)
+
+    failed = sum(1 for idx, _ in pending.values() if idx not in frame_detections)
+    if failed:
+        logger.warning("[PRODUCT-v4] Batch: %d/%d frames without a usable result", failed, len(pending))
+    for idx in frame_paths:
+        frame_detections.setdefault(idx, [])
+    return frame_detections
 
 
 def detect_from_images_for_gaps(
     frame_dir: str,
-    product_list: list[dict],
+    products: list[Product],
     gaps: list[tuple[float, float]],
     sample_interval: int = 30,
     on_progress=None,
+    use_batch: bool = False,
 ) -> list[dict]:
     """
     空白時間帯のみ画像分析を実行する。
     v2と同じ高品質プロンプトを使用するが、対象フレーム数を大幅に削減。
+    use_batch=True なら Batch API（低コスト・高スループット、完了まで数分〜）で実行する。
     """
     if not gaps:
         logger.info("[PRODUCT-v4] No gaps to analyze with images")
         return []
 
-    files = sorted([f for f in os.listdir(frame_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
+    files = list_frame_files(frame_dir)
     if not files:
         return []
 
-    # 空白時間帯のフレームインデックスを選択
-    sample_indices = []
-    for gap_start, gap_end in gaps:
-        start_idx = max(0, int(gap_start))
-        end_idx = min(len(files) - 1, int(gap_end))
-        for idx in range(start_idx, end_idx + 1, sample_interval):
-            if idx < len(files):
-                sample_indices.append(idx)
+    # 空白時間帯のフレームインデックスを選択（等間隔 + ショット切り替え）
+    sample_indices = select_gap_frames(
+        [os.path.join(frame_dir, f) for f in files], gaps, sample_interval,
+    )
 
     if not sample_indices:
         logger.info("[PRODUCT-v4] No frames to analyze in gaps")
         return []
 
-    total_samples = len(sample_indices)
+    # ほぼ同じ見た目のフレーム（静止シーン）はAPIを呼ばず、直前に採用したフレームの結果を使う
+    api_indices = []
+    duplicate_of: dict[int, int] = {}
+    last_kept, last_hash = None, None
+    for idx in sample_indices:
+        h = frame_phash(os.path.join(frame_dir, files[idx]))
+        if (
+            h is not None and last_hash is not None
+            and bin(h ^ last_hash).count("1") <= PHASH_MAX_DISTANCE
+        ):
+            duplicate_of[idx] = last_kept
+            continue
+        api_indices.append(idx)
+        last_kept, last_hash = idx, h
+
+    total_samples = len(api_indices)
     logger.info(
-        "[PRODUCT-v4] Image analysis for %d gaps: %d frames (interval=%ds)",
-        len(gaps), total_samples, sample_interval,
+        "[PRODUCT-v4] Image analysis for %d gaps: %d frames (interval=%ds), %d near-duplicates skipped",
+        len(gaps), total_samples, sample_interval, len(duplicate_of),
     )
 
-    prompt = build_product_detection_prompt(product_list)
+    prompt = build_product_detection_prompt(products)
     frame_detections: dict[int, list[dict]] = {}
     completed = [0]
 
     async def run_detection():
-        sem = asyncio.Semaphore(MAX_CONCURRENCY)
-        tasks = []
-
-        for fidx in sample_indices:
-            image_path = os.path.join(frame_dir, files[fidx])
-
-            async def _detect(idx=fidx, path=image_path):
-                result = await detect_products_in_frame_async(path, prompt, sem)
-                frame_detections[idx] = result
-                completed[0] += 1
+        aclient = make_async_client()
+        limiter = make_rate_limiter()
+        # 連続する FRAMES_PER_REQUEST フレームずつ1リクエストにまとめる
+        queue: asyncio.Queue[list[int]] = asyncio.Queue()
+        for start in range(0, total_samples, FRAMES_PER_REQUEST):
+            queue.put_nowait(api_indices[start:start + FRAMES_PER_REQUEST])
+        n_workers = min(MAX_CONCURRENCY, queue.qsize())
+        # 読込・エンコード済みのバッチ。ローダーが API 呼び出しの裏で最大 MAX_CONCURRENCY バッチ先まで用意する
+        ready: asyncio.Queue = asyncio.Queue(maxsize=MAX_CONCURRENCY)
+
+        async def _loader():
+            while not queue.empty():
+                batch = queue.get_nowait()
+                paths = [os.path.join(frame_dir, files[idx]) for idx in batch]
+                await ready.put((batch, paths, await asyncio.to_thread(load_frames, paths, prompt)))
+
+        async def _load_all():
+            await asyncio.gather(*(_loader() for _ in range(FRAME_LOADERS)))
+            for _ in range(n_workers):
+                await ready.put(None)
+
+        # MAX_CONCURRENCY 本のワーカーが用意済みのバッチを順に検出する（全リクエスト分のコルーチンを先に作らない）
+        async def _worker():
+            while (item := await ready.get()) is not None:
+                batch, paths, loaded = item
+                results = await detect_products_in_frames(paths, prompt, aclient, limiter, loaded=loaded)
+                frame_detections.update(zip(batch, results))
+                completed[0] += len(batch)
                 if on_progress and total_samples > 0:
                     pct = min(int(completed[0] / total_samples * 100), 100)
                     on_progress(pct)
 
-            tasks.append(_detect())
+        async with aclient:
+            await asyncio.gather(_load_all(), *(_worker() for _ in range(n_workers)))
 
-        await asyncio.gather(*tasks)
+    if use_batch:
+        frame_detections.update(detect_products_in_frames_batch(
+            {idx: os.path.join(frame_dir, files[idx]) for idx in api_indices}, prompt,
+        ))
+        if on_progress:
+            on_progress(100)
+    else:
+        run_async(run_detection())
 
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                pool.submit(asyncio.run, run_detection()).result()
-        else:
-            loop.run_until_complete(run_detection())
-    except RuntimeError:
-        asyncio.run(run_detection())
+    # merge_image_detections は読むだけなので、ほぼ同一フレームは採用フレームの結果リストを共有する
+    for idx, kept in duplicate_of.items():
+        frame_detections[idx] = frame_detections.get(kept, [])
 
     logger.info(
         "[PRODUCT-v4] Image detection complete: %d frames, %d had products",
@@ -694,6 +1494,44 @@ def detect_from_images_for_gaps(
     return merge_image_detections(frame_detections, sample_interval)
 
 
+# この件数以上の検出列はJITカーネルでセグメント化する（短い列はnumpy版の方が速い）
+SEGMENT_JIT_MIN_FRAMES = 200
+
+
+def _segment(frames, pids, confs, gap):
+    """(商品id, フレーム) 順に並んだ検出列を、商品が変わるか間隔が gap を超える所で区切る。
+
+    各セグメントの (開始位置, 終了位置(含まない), 平均信頼度) を返す。
+    信頼度は左から順に足すので、sum() と同じ丸めになる。
+    """
+    n = frames.shape[0]
+    starts = np.empty(n, np.int64)
+    ends = np.empty(n, np.int64)
+    avg_confs = np.empty(n, np.float64)
+    m = 0
+    seg = 0
+    total = 0.0
+    for i in range(n):
+        if i > seg and (pids[i] != pids[i - 1] or frames[i] - frames[i - 1] > gap):
+            starts[m] = seg
+            ends[m] = i
+            avg_confs[m] = total / (i - seg)
+            m += 1
+            seg = i
+            total = 0.0
+        total += confs[i]
+    if n > 0:
+        starts[m] = seg
+        ends[m] = n
+        avg_confs[m] = total / (n - seg)
+        m += 1
+    return starts[:m], ends[:m], avg_confs[:m]
+
+
+# シグネチャ未指定なので初回呼び出し時にコンパイルされる（fastmathは丸めが変わるので使わない）
+_segment_kernel = njit(cache=True)(_segment) if njit else None
+
+
 def merge_image_detections(
     frame_detections: dict[int, list[dict]],
     sample_interval: int = 30,
@@ -704,10 +1542,15 @@ def merge_image_detections(
     if not frame_detections:
         return []
 
-    sorted_frames = sorted(frame_detections.keys())
-    product_frames: dict[str, list[tuple[int, float]]] = {}
+    # 商品名は初出順に id 化（同時刻のセグメントは従来どおり初出順に並ぶ）
+    # 列は型付き array に直接詰める（Python オブジェクトのリストを作らず、そのまま ndarray として読む）
+    # 信頼度は float32 にすると平均の丸め（round(…, 2)）が変わりうるので double のまま
+    name_ids: dict[str, int] = {}
+    pid_list = array("q")
+    fidx_list = array("q")
+    conf_list = array("d")
 
-    for fidx in sorted_frames:
+    for fidx in sorted(frame_detections.keys()):
         for det in frame_detections[fidx]:
             name = det.get("product_name", "")
             conf = det.get("confidence", 0.5)
@@ -716,53 +1559,50 @@ def merge_image_detections(
                 continue
             if not name or conf < confidence_threshold:
                 continue
-            if name not in product_frames:
-                product_frames[name] = []
-            product_frames[name].append((fidx, conf))
-
-    exposures = []
-    for product_name, frames in product_frames.items():
-        if not frames:
-            continue
-
-        frames.sort(key=lambda x: x[0])
-        gap_tolerance = sample_interval * 2 + 1
-        segments = []
-        seg_start = frames[0][0]
-        seg_end = frames[0][0]
-        seg_confs = [frames[0][1]]
-
-        for i in range(1, len(frames)):
-            fidx, conf = frames[i]
-            if fidx - seg_end <= gap_tolerance:
-                seg_end = fidx
-                seg_confs.append(conf)
-            else:
-                segments.append((seg_start, seg_end, seg_confs))
-                seg_start = fidx
-                seg_end = fidx
-                seg_confs = [conf]
-
-        segments.append((seg_start, seg_end, seg_confs))
+            pid_list.append(name_ids.setdefault(name, len(name_ids)))
+            fidx_list.append(fidx)
+            conf_list.append(conf)
 
-        for start_frame, end_frame, confs in segments:
-            time_start = float(start_frame)
-            time_end = float(end_frame + sample_interval)
-            duration = time_end - time_start
-
-            if duration < min_duration:
-                continue
+    if not pid_list:
+        return []
 
-            avg_conf = sum(confs) / len(confs)
-            exposures.append({
-                "product_name": product_name,
-                "brand_name": "",
-                "time_start": time_start,
-                "time_end": time_end,
-                "confidence": round(avg_conf, 2),
-                "audio_confirmed": False,
-                "source": "image",
-            })
+    # 全商品まとめて (商品id, フレーム) 順に並べ替え（安定なので同一フレーム内の順序も保つ）
+    pid = np.frombuffer(pid_list, dtype=np.int64)
+    fidx = np.frombuffer(fidx_list, dtype=np.int64)
+    order = np.lexsort((fidx, pid))
+    pid, fidx = pid[order], fidx[order]
+    confs = np.frombuffer(conf_list, dtype=np.float64)[order]
+
+    # Segment = run of one product's detections with gaps <= gap_tolerance
+    gap_tolerance = sample_interval * 2 + 1
+    if _segment_kernel is not None and len(fidx) >= SEGMENT_JIT_MIN_FRAMES:
+        starts, ends, avg_confs = _segment_kernel(fidx, pid, confs, gap_tolerance)
+    else:
+        breaks = np.flatnonzero((np.diff(pid) != 0) | (np.diff(fidx) > gap_tolerance)) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.append(breaks, len(fidx))
+        avg_confs = None
+    time_start = fidx[starts].astype(np.float64)
+    time_end = (fidx[ends - 1] + sample_interval).astype(np.float64)
+
+    names = list(name_ids)
+    exposures = []
+    for k in np.flatnonzero(time_end - time_start >= min_duration):
+        if avg_confs is not None:
+            avg_conf = float(avg_confs[k])
+        else:
+            # same left-to-right float sum as before, so rounding is unchanged
+            seg_confs = confs[starts[k]:ends[k]].tolist()
+            avg_conf = sum(seg_confs) / len(seg_confs)
+        exposures.append({
+            "product_name": names[pid[starts[k]]],
+            "brand_name": "",
+            "time_start": float(time_start[k]),
+            "time_end": float(time_end[k]),
+            "confidence": round(avg_conf, 2),
+            "audio_confirmed": False,
+            "source": "image",
+        })
 
     exposures.sort(key=lambda x: x["time_start"])
     return exposures
@@ -929,21 +1769,14 @@ def post_filter_exposures(
     return filtered
 
 
-def fill_brand_names(exposures: list[dict], product_list: list[dict]) -> list[dict]:
+def fill_brand_names(exposures: list[dict], products: list[Product]) -> list[dict]:
     """product_listからbrand_nameとimage_urlを補完する"""
-    name_to_info: dict[str, dict] = {}
-    for p in product_list:
-        name = p.get("product_name", p.get("name", p.get("商品名", p.get("商品タイトル", ""))))
-        if name:
-            name_to_info[name] = {
-                "brand_name": p.get("brand_name", p.get("brand", p.get("ブランド名", p.get("ブランド", "")))),
-                "image_url": p.get("image_url", p.get("product_image_url", "")),
-            }
+    name_to_info: dict[str, Product] = {p.name: p for p in products if p.name}
 
     for exp in exposures:
-        info = name_to_info.get(exp["product_name"], {})
-        exp["brand_name"] = info.get("brand_name", "")
-        exp["product_image_url"] = info.get("image_url", "")
+        info = name_to_info.get(exp["product_name"])
+        exp["brand_name"] = info.brand if info else ""
+        exp["product_image_url"] = info.image_url if info else ""
 
     return exposures
 
@@ -959,6 +1792,7 @@ def detect_product_timeline(
     on_progress=None,
     excel_data: dict | None = None,
     time_offset_seconds: float = 0,
+    use_batch: bool = False,
 ) -> list[dict]:
     """
     商品タイムライン検出のメインエントリポイント (v4)。
@@ -978,6 +1812,7 @@ def detect_product_timeline(
         on_progress: 進捗コールバック (0-100)
         excel_data: Excelから読み込んだ売上データ
         time_offset_seconds: 動画の時間オフセット
+        use_batch: 画像分析を Batch API で実行する（低コスト、完了まで時間がかかる）
 
     Returns:
         exposures: [{"product_name", "brand_name", "time_start", "time_end",
@@ -987,7 +1822,7 @@ def detect_product_timeline(
         logger.warning("[PRODUCT-v4] No product list provided, skipping detection")
         return []
 
-    files = sorted([f for f in os.listdir(frame_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
+    files = list_frame_files(frame_dir)
     if not files:
         logger.warning("[PRODUCT-v4] No frames found in %s", frame_dir)
         return []
@@ -999,8 +1834,11 @@ def detect_product_timeline(
         len(files), total_duration, len(product_list),
     )
 
+    # 列名の揺れを一度だけ正規化
+    products = normalize_products(product_list)
+
     # キーワードマップを構築
-    product_keywords = build_product_keyword_map(product_list)
+    product_keywords = build_product_keyword_map(products)
 
     # ── PHASE 1: 音声検出（即座、API不要）──
     t0 = time.time()
@@ -1044,10 +1882,11 @@ def detect_product_timeline(
 
         image_exposures = detect_from_images_for_gaps(
             frame_dir=frame_dir,
-            product_list=product_list,
+            products=products,
             gaps=gaps,
             sample_interval=30,
             on_progress=_on_image_progress,
+            use_batch=use_batch,
         )
     else:
         logger.info("[PRODUCT-v4] Phase 3: No significant gaps, skipping image analysis")
@@ -1064,7 +1903,7 @@ def detect_product_timeline(
     exposures = post_filter_exposures(exposures)
     logger.info("[PRODUCT-v4] After post-filter: %d exposures", len(exposures))
 
-    exposures = fill_brand_names(exposures, product_list)
+    exposures = fill_brand_names(exposures, products)
 
     if on_progress:
         on_progress(100)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Parity tests for csv_slot_filter.
+
+compute_slot_scores (numpy rule masks) must score every slot exactly like the
+original per-row loop, and the range-index overlap checks must mark the same
+phases as the original linear scan. Both originals are frozen below and run
+on seeded random data.
+
+Usage:
+    python test_csv_slot_filter.py
+"""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from csv_slot_filter import (
+    KPI_ALIASES_LOWER,
+    RULES,
+    _build_lower_index,
+    _build_range_index,
+    _detect_time_key,
+    _find_key_in_index,
+    _parse_time_to_seconds,
+    _rule_names,
+    _safe_float,
+    compute_slot_scores,
+    filter_phases_by_importance,
+    is_phase_in_important_range,
+)
+
+
+def old_compute_slot_scores(trends):
+    """compute_slot_scores before vectorization (per-row rule loop)."""
+    if not trends:
+        return []
+
+    time_key = _detect_time_key(trends)
+    if not time_key:
+        return []
+
+    lower_index = _build_lower_index(trends[0])
+    all_values = {}
+    for rule in RULES:
+        matched_key = _find_key_in_index(
+            lower_index, rule["keys"], KPI_ALIASES_LOWER[rule["kpi"]]
+        )
+        if matched_key:
+            vals = [_safe_float(t.get(matched_key)) for t in trends]
+            vals = [v for v in vals if v is not None]
+            if vals:
+                all_values[rule["name"]] = {
+                    "key": matched_key,
+                    "mean": sum(vals) / len(vals),
+                    "values": vals,
+                }
+
+    scored_slots = []
+    for entry in trends:
+        time_val = entry.get(time_key)
+        time_sec = _parse_time_to_seconds(time_val)
+        if time_sec is None:
+            continue
+
+        score = 0
+        matched_rules = []
+
+        for rule in RULES:
+            rule_info = all_values.get(rule["name"])
+            if not rule_info:
+                continue
+
+            val = _safe_float(entry.get(rule_info["key"]))
+            if val is None:
+                continue
+
+            triggered = False
+            if rule["condition"] == "gt_zero":
+                triggered = val > 0
+            elif rule["condition"] == "above_mean":
+                triggered = val > rule_info["mean"]
+
+            if triggered:
+                score += rule["weight"]
+                matched_rules.append(rule["name"])
+
+        scored_slots.append({
+            "time_key": str(time_val),
+            "time_sec": time_sec,
+            "score": score,
+            "matched_rules": matched_rules,
+            "raw_entry": entry,
+        })
+
+    return scored_slots
+
+
+# KPI columns as they appear in real exports (several languages / cases)
+KPI_HEADERS = {
+    "gmv": ["GMV", "売上", "成交金额", "Revenue", "sales"],
+    "order_count": ["注文", "Orders", "SKU注文数", "订单数"],
+    "ctor": ["CTOR", "CVR", "点击成交转化率"],
+    "gpm": ["GPM", "視聴GPM", "千次观看成交金额"],
+    "viewer_count": ["視聴者数", "Viewers", "观看人数"],
+    "comment_rate": ["コメント率", "Comment Rate"],
+    "live_ctr": ["LIVE CTR", "直播点击率", "click_rate"],
+    "new_followers": ["新規フォロワー数", "New Followers"],
+}
+TIME_HEADERS = ["時間", "时间", "Time", "timestamp", "開始時間"]
+
+
+def random_time(rng, i):
+    r = rng.random()
+    if r < 0.05:
+        return None
+    if r < 0.08:
+        return "n/a"
+    if r < 0.15:
+        return i * 60  # seconds as a number
+    if r < 0.25:
+        return f"{i // 60}:{i % 60:02d}:{rng.randrange(60):02d}"
+    if r < 0.30:
+        return f"{24 + i // 60}:{i % 60:02d}"  # MM:SS with minutes >= 24
+    return f"{i // 60:02d}:{i % 60:02d}"
+
+
+def random_cell(rng):
+    r = rng.random()
+    if r < 0.08:
+        return None
+    if r < 0.12:
+        return ""
+    if r < 0.15:
+        return "-"
+    if r < 0.25:
+        return 0
+    if r < 0.35:
+        return f"{rng.randrange(100000):,}"  # "12,345"
+    if r < 0.45:
+        return f"{rng.uniform(-5, 50):.3f}"
+    if r < 0.50:
+        return rng.choice([True, False])
+    if r < 0.75:
+        return rng.randrange(-3, 500)
+    return rng.uniform(0, 10) * rng.choice([1, 0.1, 1e3])
+
+
+def random_trends(rng):
+    header = [rng.choice(TIME_HEADERS)]
+    kpis = [k for k in KPI_HEADERS if rng.random() < 0.7]
+    if "gmv" not in kpis:
+        kpis.append("gmv")  # at least one usable KPI column
+    for kpi in kpis:
+        header.append(rng.choice(KPI_HEADERS[kpi]))
+    header.append("商品名")
+    rng.shuffle(header)
+
+    n = rng.randrange(1, 120)
+    trends = []
+    for i in range(n):
+        entry = {}
+        for h in header:
+            if h in TIME_HEADERS:
+                entry[h] = random_time(rng, i)
+            elif h == "商品名":
+                entry[h] = f"商品{i}"
+            else:
+                entry[h] = random_cell(rng)
+        trends.append(entry)
+    # keep a number in the GMV column so the rule stays active
+    gmv_key = next(h for h in header if h in KPI_HEADERS["gmv"])
+    trends[rng.randrange(n)][gmv_key] = rng.randrange(1, 1000)
+    return trends
+
+
+def as_old_output(trends, slots):
+    """Expand rule_mask / entry_index back into the old output shape."""
+    return [
+        {
+            "time_key": s["time_key"],
+            "time_sec": s["time_sec"],
+            "score": s["score"],
+            "matched_rules": _rule_names(s["rule_mask"]),
+            "raw_entry": trends[s["entry_index"]],
+        }
+        for s in slots
+    ]
+
+
+class TestComputeSlotScoresParity(unittest.TestCase):
+
+    def test_matches_old_loop_on_random_trends(self):
+        rng = random.Random(20240601)
+        for case in range(300):
+            trends = random_trends(rng)
+            with self.subTest(case=case):
+                expected = old_compute_slot_scores(trends)
+                got = as_old_output(trends, compute_slot_scores(trends))
+                self.assertEqual(got, expected)
+                for g, e in zip(got, expected):
+                    self.assertIs(g["raw_entry"], e["raw_entry"])
+                    self.assertIs(type(g["score"]), int)
+
+    def test_mean_ties_do_not_trigger(self):
+        trends = [{"Time": f"00:0{i}", "Viewers": 5, "GMV": 0} for i in range(4)]
+        slots = compute_slot_scores(trends)
+        self.assertEqual(as_old_output(trends, slots), old_compute_slot_scores(trends))
+        self.assertEqual([s["score"] for s in slots], [0, 0, 0, 0])
+
+    def test_no_usable_kpi_values(self):
+        # The old loop returned every slot with score 0; now nothing is returned
+        trends = [{"Time": "00:01", "GMV": "-"}, {"Time": "00:02", "GMV": None}]
+        self.assertEqual(compute_slot_scores(trends), [])
+        self.assertEqual([s["score"] for s in old_compute_slot_scores(trends)], [0, 0])
+
+    def test_no_time_column(self):
+        self.assertEqual(compute_slot_scores([{"GMV": 1}]), [])
+        self.assertEqual(compute_slot_scores([]), [])
+
+
+def old_is_phase_in_important_range(phase_start_frame, phase_end_frame, important_ranges):
+    """is_phase_in_important_range before the range index (linear scan)."""
+    if not important_ranges:
+        return True
+
+    for r in important_ranges:
+        if phase_start_frame <= r["end_frame"] and phase_end_frame >= r["start_frame"]:
+            return True
+
+    return False
+
+
+def old_filter_phases_by_importance(keyframes, total_frames, important_ranges):
+    """filter_phases_by_importance before the range index (per-phase loop)."""
+    if not important_ranges:
+        return [True] * (len(keyframes) + 1)
+
+    extended = [0] + keyframes + [total_frames - 1]
+    results = []
+
+    for i in range(len(extended) - 1):
+        start = extended[i]
+        end = extended[i + 1]
+        results.append(old_is_phase_in_important_range(start, end, important_ranges))
+
+    return results
+
+
+def random_ranges(rng, total_frames):
+    ranges = []
+    for _ in range(rng.randrange(0, 25)):
+        start = rng.randrange(-30, total_frames + 30)
+        length = rng.choice([0, 1, rng.randrange(0, 120)])
+        ranges.append({"start_frame": start, "end_frame": start + length})
+    return ranges  # unsorted, overlapping, zero-length
+
+
+def random_keyframes(rng, total_frames):
+    k = rng.randrange(0, 60)
+    keyframes = sorted(rng.randrange(1, max(total_frames - 1, 2)) for _ in range(k))
+    if keyframes and rng.random() < 0.3:
+        keyframes.insert(rng.randrange(len(keyframes)), keyframes[0])  # duplicate boundary
+        keyframes.sort()
+    return keyframes
+
+
+class TestPhaseOverlapParity(unittest.TestCase):
+
+    def test_filter_matches_linear_scan(self):
+        rng = random.Random(20240603)
+        for case in range(1000):
+            total_frames = rng.randrange(2, 4000)
+            keyframes = random_keyframes(rng, total_frames)
+            ranges = random_ranges(rng, total_frames)
+            with self.subTest(case=case):
+                got = filter_phases_by_importance(keyframes, total_frames, ranges)
+                self.assertEqual(
+                    got, old_filter_phases_by_importance(keyframes, total_frames, ranges)
+                )
+                self.assertTrue(all(type(v) is bool for v in got))
+
+    def test_single_phase_matches_linear_scan(self):
+        rng = random.Random(20240604)
+        for case in range(300):
+            ranges = random_ranges(rng, 600)
+            index = _build_range_index(ranges) if ranges else None
+            for _ in range(20):
+                start = rng.randrange(-50, 700)
+                end = start + rng.randrange(0, 80)
+                expected = old_is_phase_in_important_range(start, end, ranges)
+                with self.subTest(case=case, start=start, end=end):
+                    self.assertEqual(is_phase_in_important_range(start, end, ranges), expected)
+                    self.assertEqual(
+                        is_phase_in_important_range(start, end, ranges, index), expected
+                    )
+
+    def test_touching_bounds_overlap(self):
+        ranges = [{"start_frame": 10, "end_frame": 20}]
+        self.assertEqual(filter_phases_by_importance([10, 20], 31, ranges), [True, True, True])
+        self.assertEqual(filter_phases_by_importance([5, 25], 31, ranges), [False, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Parity tests for excel_parser.
+
+_iter_xlsx_rows (python-calamine when installed) must return the same values
+as the stdlib _stream_xlsx_rows reader, which mirrors openpyxl.
+match_sales_to_phase (parsed once, numpy masks) must aggregate each phase
+like the original per-row loop, frozen below, on seeded random trends.
+
+Usage:
+    python test_excel_parser.py
+"""
+import io
+import os
+import random
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import excel_parser
+from csv_slot_filter import KPI_ALIASES, _find_key
+from excel_parser import _iter_xlsx_rows, _stream_xlsx_rows, match_sales_to_phase
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+def build_workbook(path, with_error=False):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["日付", "時間", "深夜", "売上", "大きい数", "件数", "商品名", "時刻", "フラグ", "エラー"])
+    ws.append([
+        date(2024, 1, 2),
+        datetime(2024, 1, 2, 3, 4, 5),
+        datetime(2024, 1, 3, 0, 0),
+        2.5,
+        1e20,
+        3,
+        "商品A",
+        time(12, 30),
+        True,
+        None,
+    ])
+    ws.append([None, datetime(2024, 1, 3, 0, 0), None, 2.0, 2 ** 53, -7, "", None, False, None])
+    ws["A2"].number_format = "yyyy-mm-dd"
+    ws["C2"].number_format = "yyyy-mm-dd h:mm"
+    ws["B3"].number_format = "yyyy-mm-dd h:mm"
+    if with_error:
+        ws["J2"] = "#N/A"
+        ws["J2"].data_type = "e"
+    wb.save(path)
+
+
+@unittest.skipIf(openpyxl is None, "openpyxl not installed")
+class TestXlsxReaderParity(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _path(self, with_error=False):
+        path = os.path.join(self.tmp.name, f"book_{with_error}.xlsx")
+        build_workbook(path, with_error)
+        return path
+
+    def assertParity(self, path):
+        expected = list(_stream_xlsx_rows(path))
+        self.assertEqual(list(_iter_xlsx_rows(path)), expected)
+        with open(path, "rb") as f:
+            buf = io.BytesIO(f.read())
+        self.assertEqual(list(_iter_xlsx_rows(buf)), expected)
+        # types too: 3 == 3.0 and date(...) != datetime(...) hide differently
+        for got_row, exp_row in zip(_iter_xlsx_rows(path), expected):
+            self.assertEqual([type(v) for v in got_row], [type(v) for v in exp_row])
+
+    def test_matches_stdlib_reader(self):
+        self.assertParity(self._path())
+
+    def test_matches_stdlib_reader_with_error_cells(self):
+        self.assertParity(self._path(with_error=True))
+
+    def test_error_cells_are_kept(self):
+        rows = list(_iter_xlsx_rows(self._path(with_error=True)))
+        self.assertEqual(rows[1][9], "#N/A")
+
+    def test_dates_are_datetimes(self):
+        rows = list(_iter_xlsx_rows(self._path()))
+        self.assertEqual(rows[1][0], datetime(2024, 1, 2))
+        self.assertEqual(rows[1][2], datetime(2024, 1, 3))
+        self.assertTrue(hasattr(rows[2][1], "hour"))
+
+    def test_large_whole_floats_stay_float(self):
+        rows = list(_iter_xlsx_rows(self._path()))
+        self.assertIsInstance(rows[1][4], float)
+        self.assertIsInstance(rows[1][5], int)
+
+
+class TestCalamineValue(unittest.TestCase):
+
+    def test_values(self):
+        conv = excel_parser._calamine_value
+        self.assertIsNone(conv(""))
+        self.assertEqual(conv(3.0), 3)
+        self.assertIsInstance(conv(3.0), int)
+        self.assertIsInstance(conv(1e20), float)
+        self.assertIsInstance(conv(float(2 ** 53)), int)
+        self.assertIsInstance(conv(float(2 ** 54)), float)
+        self.assertEqual(conv(date(2024, 1, 2)), datetime(2024, 1, 2))
+        self.assertEqual(conv(datetime(2024, 1, 2, 5)), datetime(2024, 1, 2, 5))
+        self.assertEqual(conv(time(1, 2)), time(1, 2))
+
+
+def old_match_sales_to_phase(trends, start_sec, end_sec):
+    """match_sales_to_phase before pre-parsing (per-row loop, KPI_ALIASES path)."""
+    if not trends:
+        return {"sales": None, "orders": None, "products_sold": []}
+
+    time_keys = []
+    sales_keys = []
+    order_keys = []
+    product_keys = []
+
+    sample = trends[0]
+    t_key = _find_key(sample, KPI_ALIASES["time"])
+    if t_key:
+        time_keys.append(t_key)
+    s_key = _find_key(sample, KPI_ALIASES["gmv"])
+    if s_key:
+        sales_keys.append(s_key)
+    o_key = _find_key(sample, KPI_ALIASES["order_count"])
+    if o_key:
+        order_keys.append(o_key)
+    p_key = _find_key(sample, KPI_ALIASES["product_name"])
+    if p_key:
+        product_keys.append(p_key)
+
+    phase_sales = 0
+    phase_orders = 0
+    products_sold = []
+
+    for t in trends:
+        entry_time = None
+        for tk in time_keys:
+            val = t.get(tk)
+            if val is None:
+                continue
+            try:
+                entry_time = float(val)
+                break
+            except (ValueError, TypeError):
+                pass
+            try:
+                val_str = str(val)
+                parts = val_str.split(":")
+                if len(parts) == 2:
+                    entry_time = int(parts[0]) * 60 + int(parts[1])
+                    break
+                elif len(parts) == 3:
+                    entry_time = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+                    break
+            except (ValueError, TypeError):
+                pass
+
+        if entry_time is None:
+            continue
+
+        if start_sec <= entry_time <= end_sec:
+            for sk in sales_keys:
+                try:
+                    phase_sales += float(t.get(sk, 0) or 0)
+                except (ValueError, TypeError):
+                    pass
+            for ok in order_keys:
+                try:
+                    phase_orders += int(t.get(ok, 0) or 0)
+                except (ValueError, TypeError):
+                    pass
+            for pk in product_keys:
+                pname = t.get(pk)
+                if pname and str(pname).strip():
+                    products_sold.append(str(pname).strip())
+
+    return {
+        "sales": phase_sales if phase_sales > 0 else None,
+        "orders": phase_orders if phase_orders > 0 else None,
+        "products_sold": list(set(products_sold)),
+    }
+
+
+def random_time(rng, sec):
+    r = rng.random()
+    if r < 0.05:
+        return None
+    if r < 0.08:
+        return rng.choice(["n/a", "", "1:2:3:4", "2024-01-02 03:04:05"])
+    if r < 0.25:
+        return sec  # seconds as a number
+    if r < 0.35:
+        return str(sec)
+    if r < 0.45:
+        return f" {sec}.5 " if rng.random() < 0.5 else f"{sec:.1f}"
+    if r < 0.55:
+        return time(sec // 3600 % 24, sec // 60 % 60, sec % 60)
+    if r < 0.75:
+        return f"{sec // 3600}:{sec // 60 % 60:02d}:{sec % 60:02d}"
+    return f"{sec // 60}:{sec % 60:02d}"
+
+
+def random_sales(rng):
+    r = rng.random()
+    if r < 0.1:
+        return None
+    if r < 0.15:
+        return rng.choice(["", "-", "1,234", "N/A"])
+    if r < 0.3:
+        return rng.randrange(0, 50000)
+    if r < 0.45:
+        return f"{rng.uniform(0, 9999):.2f}"
+    return round(rng.uniform(0, 9999), rng.choice([1, 2, 3]))
+
+
+def random_orders(rng):
+    r = rng.random()
+    if r < 0.1:
+        return None
+    if r < 0.15:
+        return rng.choice(["", "-", "3.0", "x"])
+    if r < 0.3:
+        return str(rng.randrange(0, 50))
+    if r < 0.4:
+        return rng.uniform(0, 20)
+    return rng.randrange(0, 50)
+
+
+def random_sales_trends(rng):
+    keys = [
+        rng.choice(["時間", "Time", "timestamp", "时间"]),
+        rng.choice(["GMV", "売上", "成交金额", "Revenue"]),
+        rng.choice(["注文", "Orders", "订单数", "SKU注文数"]),
+        rng.choice(["商品名", "Product Name", "product", "商品"]),
+    ]
+    if rng.random() < 0.15:
+        keys.pop(rng.randrange(1, 4))  # a KPI column missing altogether
+    n = rng.randrange(1, 300)
+    secs = sorted(rng.randrange(0, 4 * 3600) for _ in range(n))
+    if rng.random() < 0.5:
+        rng.shuffle(secs)
+    trends = []
+    for sec in secs:
+        entry = {keys[0]: random_time(rng, sec)}
+        for k in keys[1:]:
+            if k in KPI_ALIASES["gmv"]:
+                entry[k] = random_sales(rng)
+            elif k in KPI_ALIASES["order_count"]:
+                entry[k] = random_orders(rng)
+            else:
+                entry[k] = rng.choice([None, "", "  ", " 商品A ", "商品B", "商品C", 101])
+        trends.append(entry)
+    return trends, secs
+
+
+class TestMatchSalesToPhaseParity(unittest.TestCase):
+
+    def assertSameAggregate(self, got, expected):
+        self.assertEqual(got["sales"], expected["sales"])
+        self.assertEqual(got["orders"], expected["orders"])
+        self.assertEqual(got["products_sold"], sorted(expected["products_sold"]))
+
+    def test_matches_old_loop_on_random_trends(self):
+        rng = random.Random(20240602)
+        for case in range(150):
+            trends, secs = random_sales_trends(rng)
+            # phase bounds on and between entry times (the bounds are inclusive)
+            bounds = sorted({0, 4 * 3600, *rng.sample(secs, min(len(secs), 6))})
+            bounds += [rng.uniform(0, 4 * 3600) for _ in range(4)]
+            for _ in range(12):
+                start, end = sorted(rng.sample(bounds, 2))
+                with self.subTest(case=case, start=start, end=end):
+                    self.assertSameAggregate(
+                        match_sales_to_phase(trends, start, end),
+                        old_match_sales_to_phase(trends, start, end),
+                    )
+
+    def test_empty_and_reversed_range(self):
+        self.assertEqual(
+            match_sales_to_phase([], 0, 10),
+            {"sales": None, "orders": None, "products_sold": []},
+        )
+        trends = [{"Time": "0:05", "GMV": 10, "Orders": 1}]
+        self.assertSameAggregate(
+            match_sales_to_phase(trends, 10, 0), old_match_sales_to_phase(trends, 10, 0)
+        )
+
+    def test_rows_appended_between_calls_are_seen(self):
+        trends = [{"Time": 5, "GMV": 10, "Orders": 1}]
+        self.assertEqual(match_sales_to_phase(trends, 0, 10)["orders"], 1)
+        trends.append({"Time": 6, "GMV": 5, "Orders": 2})
+        self.assertSameAggregate(
+            match_sales_to_phase(trends, 0, 10), old_match_sales_to_phase(trends, 0, 10)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Parity tests for product_detection_pipeline.merge_image_detections.
+
+Both segmentation paths (numpy breaks for short detection runs, the _segment
+kernel from SEGMENT_JIT_MIN_FRAMES detections up) must return exactly what
+the original per-product loop, frozen below, returned on seeded random
+detections: same segments, same order for equal time_start, same
+round(avg, 2) confidences.
+
+Usage:
+    python test_product_detection_pipeline.py
+"""
+import os
+import random
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import product_detection_pipeline as pdp
+    from product_detection_pipeline import merge_image_detections
+except ImportError:  # Pillow / openai / httpx / tenacity / python-decouple not installed
+    pdp = None
+
+
+def old_merge_image_detections(
+    frame_detections, sample_interval=30, min_duration=8.0, confidence_threshold=0.5,
+):
+    """merge_image_detections before vectorization (per-product loop)."""
+    if not frame_detections:
+        return []
+
+    sorted_frames = sorted(frame_detections.keys())
+    product_frames = {}
+
+    for fidx in sorted_frames:
+        for det in frame_detections[fidx]:
+            name = det.get("product_name", "")
+            conf = det.get("confidence", 0.5)
+            reason = det.get("detection_reason", "")
+            if reason == "background_only":
+                continue
+            if not name or conf < confidence_threshold:
+                continue
+            if name not in product_frames:
+                product_frames[name] = []
+            product_frames[name].append((fidx, conf))
+
+    exposures = []
+    for product_name, frames in product_frames.items():
+        if not frames:
+            continue
+
+        frames.sort(key=lambda x: x[0])
+        gap_tolerance = sample_interval * 2 + 1
+        segments = []
+        seg_start = frames[0][0]
+        seg_end = frames[0][0]
+        seg_confs = [frames[0][1]]
+
+        for i in range(1, len(frames)):
+            fidx, conf = frames[i]
+            if fidx - seg_end <= gap_tolerance:
+                seg_end = fidx
+                seg_confs.append(conf)
+            else:
+                segments.append((seg_start, seg_end, seg_confs))
+                seg_start = fidx
+                seg_end = fidx
+                seg_confs = [conf]
+
+        segments.append((seg_start, seg_end, seg_confs))
+
+        for start_frame, end_frame, confs in segments:
+            time_start = float(start_frame)
+            time_end = float(end_frame + sample_interval)
+            duration = time_end - time_start
+
+            if duration < min_duration:
+                continue
+
+            avg_conf = sum(confs) / len(confs)
+            exposures.append({
+                "product_name": product_name,
+                "brand_name": "",
+                "time_start": time_start,
+                "time_end": time_end,
+                "confidence": round(avg_conf, 2),
+                "audio_confirmed": False,
+                "source": "image",
+            })
+
+    exposures.sort(key=lambda x: x["time_start"])
+    return exposures
+
+
+PRODUCTS = ["商品A", "商品B", "商品C", "商品D", "Product E", ""]
+# Averages of these land on or near round(…, 2) half-way points
+CONFIDENCES = [0.3, 0.5, 0.505, 0.515, 0.55, 0.615, 0.625, 0.675, 0.7, 0.835, 0.9, 0.995, 1]
+
+
+def random_detections(rng, n_frames, frame_step):
+    """{frame: [detection, ...]} with shared frames, gaps and filtered rows."""
+    frames = sorted(rng.sample(range(0, n_frames * frame_step), n_frames))
+    if rng.random() < 0.5:
+        frames = list(range(0, n_frames * frame_step, frame_step))  # runs with equal starts
+    detections = {}
+    for f in frames:
+        dets = []
+        for _ in range(rng.choice([0, 1, 1, 2, 3])):
+            conf = rng.choice(CONFIDENCES) if rng.random() < 0.6 else rng.uniform(0.4, 1.0)
+            det = {"product_name": rng.choice(PRODUCTS), "confidence": conf}
+            r = rng.random()
+            if r < 0.1:
+                det["detection_reason"] = "background_only"
+            elif r < 0.5:
+                det["detection_reason"] = "visible"
+            if rng.random() < 0.05:
+                del det["confidence"]  # defaults to 0.5
+            dets.append(det)
+        detections[f] = dets
+    return detections
+
+
+def count_kept(detections, confidence_threshold=0.5):
+    return sum(
+        1
+        for dets in detections.values()
+        for d in dets
+        if d.get("detection_reason", "") != "background_only"
+        and d.get("product_name", "")
+        and d.get("confidence", 0.5) >= confidence_threshold
+    )
+
+
+@unittest.skipIf(pdp is None, "product_detection_pipeline dependencies not installed")
+class TestMergeImageDetectionsParity(unittest.TestCase):
+
+    def _cases(self, seed, n_cases, n_frames):
+        rng = random.Random(seed)
+        for case in range(n_cases):
+            step = rng.choice([1, 5, 30])
+            detections = random_detections(rng, rng.randrange(*n_frames), step)
+            kwargs = {
+                "sample_interval": rng.choice([1, 5, 30]),
+                "min_duration": rng.choice([0, 8.0, 30.0, 120.0]),
+                "confidence_threshold": rng.choice([0.5, 0.5, 0.6]),
+            }
+            yield case, detections, kwargs
+
+    def assertParity(self, detections, kwargs):
+        expected = old_merge_image_detections(detections, **kwargs)
+        self.assertEqual(merge_image_detections(detections, **kwargs), expected)
+
+    def test_numpy_path(self):
+        # numpy breaks path (short runs; kernel off so no case can reach it)
+        with patch.object(pdp, "_segment_kernel", None):
+            for case, detections, kwargs in self._cases(1, 400, (0, 120)):
+                with self.subTest(case=case):
+                    self.assertParity(detections, kwargs)
+
+    def _long_cases(self, seed):
+        """Cases whose kept detections reach SEGMENT_JIT_MIN_FRAMES (kernel path)."""
+        for case, detections, kwargs in self._cases(seed, 60, (150, 800)):
+            if count_kept(detections, kwargs["confidence_threshold"]) >= pdp.SEGMENT_JIT_MIN_FRAMES:
+                yield case, detections, kwargs
+
+    def test_kernel_logic_interpreted(self):
+        # _segment itself, so the kernel path is checked without numba too
+        checked = 0
+        with patch.object(pdp, "_segment_kernel", pdp._segment):
+            for case, detections, kwargs in self._long_cases(2):
+                checked += 1
+                with self.subTest(case=case):
+                    self.assertParity(detections, kwargs)
+        self.assertGreater(checked, 20)
+
+    @unittest.skipIf(pdp is not None and pdp._segment_kernel is None, "numba not installed")
+    def test_compiled_kernel_path(self):
+        checked = 0
+        for case, detections, kwargs in self._long_cases(3):
+            checked += 1
+            with self.subTest(case=case):
+                self.assertParity(detections, kwargs)
+                # the numpy path on the same long runs
+                with patch.object(pdp, "_segment_kernel", None):
+                    self.assertParity(detections, kwargs)
+        self.assertGreater(checked, 20)
+
+    def test_equal_time_start_keeps_first_seen_product_order(self):
+        # 商品B is seen first (frame 0), 商品A later in the same frame list order
+        detections = {
+            0: [{"product_name": "商品B", "confidence": 0.9}, {"product_name": "商品A", "confidence": 0.8}],
+            30: [{"product_name": "商品A", "confidence": 0.7}, {"product_name": "商品B", "confidence": 0.6}],
+        }
+        for kernel in (None, pdp._segment):
+            with self.subTest(kernel=kernel), patch.object(pdp, "_segment_kernel", kernel), \
+                    patch.object(pdp, "SEGMENT_JIT_MIN_FRAMES", 1):
+                got = merge_image_detections(detections)
+                self.assertEqual([e["product_name"] for e in got], ["商品B", "商品A"])
+                self.assertEqual(got, old_merge_image_detections(detections))
+
+    def test_confidence_rounding(self):
+        # 0.615 + 0.625 + 0.675 = 1.915 -> avg 0.63833… ; 0.125 * 2 -> 0.125 -> 0.12
+        detections = {
+            f: [{"product_name": "商品A", "confidence": c}]
+            for f, c in zip((0, 30, 60, 300, 330), (0.615, 0.625, 0.675, 0.125, 0.125))
+        }
+        for kernel in (None, pdp._segment):
+            with self.subTest(kernel=kernel), patch.object(pdp, "_segment_kernel", kernel), \
+                    patch.object(pdp, "SEGMENT_JIT_MIN_FRAMES", 1):
+                expected = old_merge_image_detections(detections, confidence_threshold=0.1)
+                got = merge_image_detections(detections, confidence_threshold=0.1)
+                self.assertEqual(got, expected)
+                self.assertEqual([e["confidence"] for e in got], [0.64, 0.12])
+
+    def test_empty(self):
+        self.assertEqual(merge_image_detections({}), [])
+        self.assertEqual(merge_image_detections({0: [{"product_name": "", "confidence": 1}]}), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -1,29 +1,17 @@
-import subprocess
-import tempfile
 from openai import OpenAI
 
+from video.frame_extractor import extract_audio_and_frames
+
 client = OpenAI()
 
 
 def extract_audio(video_path: str) -> str:
     """
     Extract WAV audio from video using ffmpeg
+    (use extract_audio_and_frames when frames are needed too)
     """
-    tmp = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-
-    subprocess.run(
-        [
-            "ffmpeg", "-y",
-            "-i", video_path,
-            "-ar", "16000",
-            "-ac", "1",
-            tmp.name
-        ],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL
-    )
-
-    return tmp.name
+    wav_path, _ = extract_audio_and_frames(video_path, frames_root=None)
+    return wav_path
 
 
 def speech_to_text(audio_path: str, start_sec: float, end_sec: float) -> str:
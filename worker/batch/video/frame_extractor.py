@@ -1,36 +1,71 @@
-import cv2
 import os
+import subprocess
+import tempfile
 
-def extract_frames(
+FFMPEG_BIN = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+
+def _rename_frames(out_dir, fps):
+    # ffmpeg numbers frames sequentially; frame idx is sampled at idx * fps seconds
+    raw = sorted(f for f in os.listdir(out_dir) if f.startswith("_raw_"))
+    for idx, name in enumerate(raw):
+        os.replace(
+            os.path.join(out_dir, name),
+            os.path.join(out_dir, f"frame_{idx:04d}_{idx * fps}s.jpg"),
+        )
+
+
+def extract_audio_and_frames(
     video_path,
     fps=1,
-    frames_root="frames"
+    frames_root="frames",
+    with_audio=True,
 ):
-    video_name = os.path.splitext(os.path.basename(video_path))[0]
-    out_dir = os.path.join(frames_root, video_name)
-    os.makedirs(out_dir, exist_ok=True)
+    """
+    One ffmpeg pass that writes the 16 kHz mono WAV and one frame every `fps`
+    seconds (frame_{idx:04d}_{sec}s.jpg), so the video is decoded only once.
+    frames_root=None skips the frames, with_audio=False skips the WAV.
+    Returns (wav_path, out_dir); a skipped output is None.
+    """
+    cmd = [FFMPEG_BIN, "-y", "-loglevel", "error", "-hwaccel", "auto", "-i", video_path]
 
-    cap = cv2.VideoCapture(video_path)
+    wav_path = None
+    if with_audio:
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+            wav_path = tmp.name
+        cmd += ["-vn", "-ar", "16000", "-ac", "1", wav_path]
 
-    sec = 0
-    idx = 0
+    out_dir = None
+    if frames_root is not None:
+        video_name = os.path.splitext(os.path.basename(video_path))[0]
+        out_dir = os.path.join(frames_root, video_name)
+        os.makedirs(out_dir, exist_ok=True)
+        cmd += [
+            "-an",
+            "-vf", f"fps=1/{fps}",
+            "-q:v", "2",
+            "-start_number", "0",
+            os.path.join(out_dir, "_raw_%06d.jpg"),
+        ]
 
-    while cap.isOpened():
-        cap.set(cv2.CAP_PROP_POS_MSEC, sec * 1000)
-        ret, frame = cap.read()
-        if not ret:
-            break
+    subprocess.run(cmd, check=True)
 
-        out_path = os.path.join(
-            out_dir,
-            f"frame_{idx:04d}_{sec}s.jpg"
-        )
-        cv2.imwrite(out_path, frame)
+    if out_dir is not None:
+        _rename_frames(out_dir, fps)
+        print(f"[OK] Frame extraction done → {out_dir}")
 
-        sec += fps
-        idx += 1
+    return wav_path, out_dir
 
-    cap.release()
-    print(f"[OK] Frame extraction done → {out_dir}")
 
+def extract_frames(
+    video_path,
+    fps=1,
+    frames_root="frames"
+):
+    """
+    Save one frame every `fps` seconds as frame_{idx:04d}_{sec}s.jpg.
+    A single ffmpeg pass decodes sequentially and drops frames in the fps
+    filter, instead of seeking once per sample.
+    """
+    _, out_dir = extract_audio_and_frames(video_path, fps, frames_root, with_audio=False)
     return out_dir
@@ -4,8 +4,8 @@ import random
 import base64
 import json
 import asyncio
-from functools import partial
-from openai import AzureOpenAI, RateLimitError, APIError, APITimeoutError
+import httpx
+from openai import AzureOpenAI, AsyncAzureOpenAI, RateLimitError, APIError, APITimeoutError
 from decouple import config
 
 # v3: 4→20 for speed optimization (fewer total calls due to CSV filter)
@@ -33,6 +33,22 @@ client = AzureOpenAI(
     api_version=GPT5_API_VERSION
 )
 
+# Caption calls share one HTTP/2 pool, sized so MAX_CONCURRENCY never queues on it
+_HTTP_LIMITS = httpx.Limits(max_connections=MAX_CONCURRENCY * 2)
+
+
+def make_async_client() -> AsyncAzureOpenAI:
+    """
+    Async client for one event loop (httpx connections are bound to the
+    loop that created them, so build one per asyncio.run).
+    """
+    return AsyncAzureOpenAI(
+        api_key=OPENAI_API_KEY,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_version=GPT5_API_VERSION,
+        http_client=httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS),
+    )
+
 
 # =========================
 # UTILS
@@ -63,23 +79,37 @@ def encode_image(path):
         return base64.b64encode(f.read()).decode("utf-8")
 
 
+DATA_URL_PREFIX = "data:image/jpeg;base64,"
+
+
+def encode_image_data_url(path):
+    """JPEG file -> data URL, built with a single concatenation (no extra b64 copy per request)"""
+    with open(path, "rb") as f:
+        return DATA_URL_PREFIX + base64.b64encode(f.read()).decode("ascii")
+
+
 # =========================
 # STEP 4 – GPT IMAGE CAPTION
 # =========================
 async def gpt_image_caption_async(
     image_path: str,
     sem: asyncio.Semaphore,
+    aclient: AsyncAzureOpenAI,
     max_retry: int = 3,
 ):
+    # file read + base64 off the event loop, under sem so at most MAX_CONCURRENCY
+    # encoded images are held at once; the request itself is native async.
+    # The request body is built once and reused by every retry.
     async with sem:
-        loop = asyncio.get_event_loop()
+        try:
+            body = _caption_request(await asyncio.to_thread(encode_image_data_url, image_path))
+        except Exception:
+            return None
 
         for attempt in range(max_retry):
             try:
-                return await loop.run_in_executor(
-                    None,
-                    partial(gpt_image_caption, image_path)
-                )
+                resp = await aclient.responses.create(**body)
+                return safe_json_load(resp.output_text)
 
             except (RateLimitError, APITimeoutError, APIError):
                 sleep_time = (2 ** attempt) + random.uniform(0, 0.5)
@@ -97,12 +127,13 @@ async def process_one_caption_task(
     frame_dir,
     sem,
     results,
+    aclient,
 ):
     if frame_idx < 0 or frame_idx >= len(files):
         return
 
     path = os.path.join(frame_dir, files[frame_idx])
-    data = await gpt_image_caption_async(path, sem)
+    data = await gpt_image_caption_async(path, sem, aclient)
 
     results[frame_idx] = {
         "frame_index": frame_idx,
@@ -113,10 +144,7 @@ async def process_one_caption_task(
         )
     }
 
-def gpt_image_caption(image_path):
-    img_b64 = encode_image(image_path)
-
-    prompt = """
+CAPTION_PROMPT = """
 Ảnh này là một key frame đại diện cho MỘT PHASE trong livestream bán hàng.
 
 Hãy mô tả trạng thái trực quan của phase này,
@@ -137,21 +165,27 @@ Chỉ trả JSON:
 }
 """.strip()
 
-    resp = client.responses.create(
+
+def _caption_request(data_url):
+    return dict(
         model=GPT5_MODEL,
         input=[{
             "role": "user",
             "content": [
-                {"type": "input_text", "text": prompt},
+                {"type": "input_text", "text": CAPTION_PROMPT},
                 {
                     "type": "input_image",
-                    "image_url": f"data:image/jpeg;base64,{img_b64}"
+                    "image_url": data_url
                 }
             ]
         }],
         max_output_tokens=1024
     )
 
+
+def gpt_image_caption(image_path):
+    resp = client.responses.create(**_caption_request(encode_image_data_url(image_path)))
+
     return safe_json_load(resp.output_text)
 
 
@@ -169,8 +203,8 @@ def caption_keyframes(
     total_tasks = len(rep_frames)
     completed_count = [0]  # mutable for closure
 
-    async def _wrapped_task(idx, files, frame_dir, sem, results):
-        await process_one_caption_task(idx, files, frame_dir, sem, results)
+    async def _wrapped_task(idx, files, frame_dir, sem, results, aclient):
+        await process_one_caption_task(idx, files, frame_dir, sem, results, aclient)
         completed_count[0] += 1
         if on_progress and total_tasks > 0:
             pct = min(int(completed_count[0] / total_tasks * 100), 100)
@@ -178,16 +212,18 @@ def caption_keyframes(
 
     async def runner():
         sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        aclient = make_async_client()
         tasks = []
 
         for idx in rep_frames:
             tasks.append(
                 _wrapped_task(
-                    idx, files, frame_dir, sem, results
+                    idx, files, frame_dir, sem, results, aclient
                 )
             )
 
-        await asyncio.gather(*tasks)
+        async with aclient:
+            await asyncio.gather(*tasks)
 
     try:
         loop = asyncio.get_running_loop()
@@ -8,12 +8,26 @@ import time
 import subprocess
 import fcntl
 import signal
+import importlib
+import multiprocessing
+import queue
+import socket
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, Future
-from threading import Lock, Thread
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from threading import Event, Lock, Thread
 from azure.storage.queue import QueueClient
 from dotenv import load_dotenv
 
+# Cross-host job dedup (Azure Table Storage); without the package only the
+# per-host checks below apply
+try:
+    from azure.core import MatchConditions
+    from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+    from azure.data.tables import TableServiceClient, UpdateMode
+except ImportError:
+    TableServiceClient = None
+
 # Load .env from project root
 project_root = Path(__file__).parent.parent.parent
 load_dotenv(project_root / ".env")
@@ -41,8 +55,41 @@ live_monitor_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="li
 live_monitor_jobs: dict[str, dict] = {}
 live_monitor_lock = Lock()
 
-# Graceful shutdown flag
+# Video analysis / clip jobs run in long-lived worker processes that import the
+# batch modules once (no interpreter start + cv2/torch/openai import per job).
+# A child is replaced after this many jobs to cap leaked memory.
+JOB_PROCESS_MAX_TASKS = int(os.getenv("WORKER_JOBS_PER_PROCESS", "10"))
+# One single-process pool per job slot: a child that dies abruptly (OOM kill,
+# segfault in cv2/torch/NVDEC) breaks only its own pool, so it fails only the
+# job it was running. A shared pool would fail every in-flight job.
+_slot_pools: list[ProcessPoolExecutor | None] = [None] * MAX_WORKERS
+_free_slots: "queue.Queue[int]" = queue.Queue()
+for _slot in range(MAX_WORKERS):
+    _free_slots.put(_slot)
+_slot_pools_lock = Lock()
+
+_queue_client: QueueClient | None = None
+_queue_client_lock = Lock()
+
+# One row per running job (PartitionKey "jobs", RowKey = job key) in this table of
+# the queue's storage account, so a job enqueued twice runs on only one host.
+# Only a different message for the same job is blocked, and only while the claim
+# is younger than JOB_CLAIM_TTL (after that its worker is presumed dead).
+JOB_CLAIMS_TABLE = os.getenv("AZURE_JOB_CLAIMS_TABLE", "jobclaims")
+JOB_CLAIM_TTL = int(os.getenv("WORKER_JOB_CLAIM_TTL", str(24 * 60 * 60)))
+_claims_table = None
+_claims_table_lock = Lock()
+
+# Queue polling: re-poll at once while jobs keep arriving and slots are free;
+# on idle polls back off exponentially up to POLL_MAX_SEC
+POLL_MIN_SEC = 1
+POLL_MAX_SEC = 30
+# Azure Queue returns at most 32 messages per receive
+RECEIVE_MAX_MESSAGES = 32
+
+# Graceful shutdown flag (the event lets the poll sleep end early on a signal)
 shutdown_requested = False
+shutdown_event = Event()
 
 
 def signal_handler(signum, frame):
@@ -50,14 +97,91 @@ def signal_handler(signum, frame):
     print(f"\n[worker] Received signal {signum}, shutting down gracefully...")
     print(f"[worker] Waiting for {get_active_count()} active jobs to complete before exit...")
     shutdown_requested = True
+    shutdown_event.set()
 
 
 def get_queue_client():
-    conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-    queue_name = os.getenv("AZURE_QUEUE_NAME", "video-jobs")
-    if not conn_str:
-        raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING required")
-    return QueueClient.from_connection_string(conn_str, queue_name)
+    """One QueueClient per process (polls, deletes and visibility renewals share
+    its keep-alive connection pool instead of a new TLS session each call)."""
+    global _queue_client
+    with _queue_client_lock:
+        if _queue_client is None:
+            conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+            queue_name = os.getenv("AZURE_QUEUE_NAME", "video-jobs")
+            if not conn_str:
+                raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING required")
+            _queue_client = QueueClient.from_connection_string(conn_str, queue_name)
+        return _queue_client
+
+
+def get_claims_table():
+    """Lazily created TableClient for job claims (None if azure-data-tables is missing)."""
+    global _claims_table
+    if TableServiceClient is None:
+        return None
+    with _claims_table_lock:
+        if _claims_table is None:
+            conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+            if not conn_str:
+                raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING required")
+            service = TableServiceClient.from_connection_string(conn_str)
+            _claims_table = service.create_table_if_not_exists(JOB_CLAIMS_TABLE)
+        return _claims_table
+
+
+def job_claim_key(payload: dict) -> str:
+    job_type = payload.get("job_type", "video_analysis")
+    return f"{job_type}:{payload.get('clip_id') or payload.get('video_id', 'unknown')}"
+
+
+def claim_job(key: str, msg_id: str) -> bool:
+    """Claim a job across all workers. Returns False if another message for the
+    same job is already claimed by a live worker. Fails open on storage errors."""
+    try:
+        table = get_claims_table()
+        if table is None:
+            return True
+        entity = {
+            "PartitionKey": "jobs",
+            "RowKey": key,
+            "msg_id": msg_id,
+            "host": socket.gethostname(),
+            "claimed_at": time.time(),
+        }
+        try:
+            table.create_entity(entity)
+            return True
+        except ResourceExistsError:
+            pass
+
+        existing = table.get_entity("jobs", key)
+        if existing.get("msg_id") != msg_id and time.time() - existing.get("claimed_at", 0) < JOB_CLAIM_TTL:
+            return False
+        # Our own message back for a retry, or an abandoned claim: take it over.
+        # The etag check makes only one of several racing workers win.
+        try:
+            table.update_entity(
+                entity,
+                mode=UpdateMode.REPLACE,
+                etag=existing.metadata["etag"],
+                match_condition=MatchConditions.IfNotModified,
+            )
+            return True
+        except ResourceModifiedError:
+            return False
+    except Exception as e:
+        print(f"[worker] Warning: job claim check failed for {key}: {e}")
+        return True
+
+
+def release_job_claim(key: str):
+    """Drop the claim after a successful job so the job can be enqueued again later."""
+    try:
+        table = get_claims_table()
+        if table is not None:
+            table.delete_entity("jobs", key)
+    except Exception as e:
+        print(f"[worker] Warning: failed to release job claim {key}: {e}")
 
 
 def delete_message_safe(msg_id: str, pop_receipt: str):
@@ -102,6 +226,71 @@ def visibility_renewal_loop():
                     info["pop_receipt"] = new_receipt
 
 
+def _init_job_process():
+    """Runs once in each job process: same cwd/path as the old subprocess, warm imports."""
+    os.chdir(BATCH_DIR)
+    sys.path.insert(0, BATCH_DIR)
+    import process_video  # noqa: F401
+    import generate_clip  # noqa: F401
+
+
+def _call_batch_main(module: str, argv: list[str]):
+    """Runs in a job process: module.main(argv), like `python <module>.py <argv>`."""
+    try:
+        importlib.import_module(module).main(argv)
+    except SystemExit as e:
+        # argparse errors / sys.exit(): don't let SystemExit cross the process boundary
+        if e.code not in (0, None):
+            raise RuntimeError(f"{module} exited with code {e.code}") from None
+
+
+def get_slot_pool(slot: int) -> ProcessPoolExecutor:
+    """The job process of `slot`, started on first use."""
+    with _slot_pools_lock:
+        pool = _slot_pools[slot]
+        if pool is None:
+            pool = _slot_pools[slot] = ProcessPoolExecutor(
+                max_workers=1,
+                # spawn: this process has threads, so don't fork it
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_job_process,
+                max_tasks_per_child=JOB_PROCESS_MAX_TASKS,
+            )
+        return pool
+
+
+def run_batch_main(module: str, argv: list[str]) -> bool:
+    """Run a batch entry point in a free job slot's process. Returns True on success.
+    If the process dies, only this job fails and only this slot's pool is rebuilt;
+    jobs in the other slots keep running."""
+    slot = _free_slots.get()
+    try:
+        pool = get_slot_pool(slot)
+        try:
+            pool.submit(_call_batch_main, module, argv).result()
+            return True
+        except BrokenProcessPool as e:
+            print(f"[worker] {module} process died: {e}; restarting job slot {slot}")
+            with _slot_pools_lock:
+                if _slot_pools[slot] is pool:
+                    _slot_pools[slot] = None
+            pool.shutdown(wait=False)
+            return False
+        except Exception as e:
+            print(f"[worker] {module} failed: {e}")
+            return False
+    finally:
+        _free_slots.put(slot)
+
+
+def shutdown_job_pools():
+    with _slot_pools_lock:
+        pools = [p for p in _slot_pools if p is not None]
+        _slot_pools[:] = [None] * len(_slot_pools)
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
 def process_job(payload: dict, msg_id: str, pop_receipt: str):
     """Process a single job. Runs in a thread.
     Deletes the queue message only after successful completion.
@@ -125,6 +314,8 @@ def process_job(payload: dict, msg_id: str, pop_receipt: str):
                 info = active_jobs.get(job_id, {})
                 current_receipt = info.get("pop_receipt", pop_receipt)
             delete_message_safe(msg_id, current_receipt)
+            if job_type != "live_monitor":
+                release_job_claim(job_claim_key(payload))
         else:
             print(f"[worker] Job {job_id} failed, message will reappear after visibility timeout for retry")
 
@@ -267,9 +458,7 @@ def process_clip_job(payload: dict):
     speed_factor = payload.get("speed_factor", 1.0)
 
     print(f"[worker] Starting clip generation for clip_id={clip_id} (speed={speed_factor}x)")
-    cmd = [
-        sys.executable,
-        os.path.join(BATCH_DIR, "generate_clip.py"),
+    argv = [
         "--clip-id", clip_id,
         "--video-id", video_id,
         "--blob-url", blob_url,
@@ -279,17 +468,11 @@ def process_clip_job(payload: dict):
         "--speed-factor", str(speed_factor),
     ]
 
-    result = subprocess.run(
-        cmd,
-        cwd=BATCH_DIR,
-        env={**os.environ, "PYTHONPATH": BATCH_DIR},
-    )
-
-    if result.returncode == 0:
+    if run_batch_main("generate_clip", argv):
         print(f"[worker] Clip generation completed for {clip_id}")
         return True
     else:
-        print(f"[worker] Clip generation failed for {clip_id} with exit code {result.returncode}")
+        print(f"[worker] Clip generation failed for {clip_id}")
         return False
 
 
@@ -303,24 +486,16 @@ def process_video_job(payload: dict):
         return False
 
     print(f"[worker] Starting batch for video_id={video_id}")
-    cmd = [
-        sys.executable,
-        os.path.join(BATCH_DIR, "process_video.py"),
+    argv = [
         "--video-id", video_id,
         "--blob-url", blob_url,
     ]
 
-    result = subprocess.run(
-        cmd,
-        cwd=BATCH_DIR,
-        env={**os.environ, "PYTHONPATH": BATCH_DIR},
-    )
-
-    if result.returncode == 0:
+    if run_batch_main("process_video", argv):
         print(f"[worker] Batch completed successfully for {video_id}")
         return True
     else:
-        print(f"[worker] Batch failed for {video_id} with exit code {result.returncode}")
+        print(f"[worker] Batch failed for {video_id}")
         return False
 
 
@@ -334,23 +509,39 @@ def get_active_count():
         return len(active_jobs)
 
 
-def poll_and_process(executor: ThreadPoolExecutor):
+def poll_and_process(executor: ThreadPoolExecutor) -> int:
     """Poll queue and submit jobs to the thread pool.
-    live_monitor jobs bypass MAX_WORKERS and run on a separate executor."""
+    live_monitor jobs bypass MAX_WORKERS and run on a separate executor.
+    Returns the number of jobs dispatched."""
     active_count = get_active_count()
     heavy_slots_full = active_count >= MAX_WORKERS
 
     client = get_queue_client()
 
-    # Always peek up to 5 messages (we may still accept live_monitor even when heavy slots full)
+    # Always peek at least 5 messages (we may still accept live_monitor even when heavy
+    # slots full); with more free slots, drain up to one message per slot
+    max_messages = min(RECEIVE_MAX_MESSAGES, max(5, MAX_WORKERS - active_count))
     messages = client.receive_messages(
-        messages_per_page=5,
+        messages_per_page=max_messages,
+        max_messages=max_messages,
         visibility_timeout=VISIBILITY_TIMEOUT,
     )
 
+    # Lowest priority first (backend sets it from estimated cost; jobs without one go first)
+    batch = []
     for msg in messages:
         try:
             payload = json.loads(msg.content)
+        except Exception as e:
+            print(f"[worker] Error parsing message: {e}")
+            # Don't delete on parse error; message will reappear after visibility timeout
+            continue
+        batch.append((payload.get("priority", 0), msg, payload))
+    batch.sort(key=lambda item: item[0])
+
+    dispatched = 0
+    for _, msg, payload in batch:
+        try:
             job_type = payload.get("job_type", "video_analysis")
             job_id = payload.get("video_id", payload.get("clip_id", "unknown"))
 
@@ -368,6 +559,7 @@ def poll_and_process(executor: ThreadPoolExecutor):
                         "msg_id": msg.id,
                         "pop_receipt": msg.pop_receipt,
                     }
+                dispatched += 1
                 continue
 
             # --- Heavy jobs: subject to MAX_WORKERS ---
@@ -381,6 +573,13 @@ def poll_and_process(executor: ThreadPoolExecutor):
                     print(f"[worker] Job {job_id} already in progress, skipping duplicate")
                     continue
 
+            # Same job already claimed on another host through a different message:
+            # drop this duplicate instead of paying for the analysis twice
+            if not claim_job(job_claim_key(payload), msg.id):
+                print(f"[worker] Job {job_id} already claimed by another worker, deleting duplicate message")
+                delete_message_safe(msg.id, msg.pop_receipt)
+                continue
+
             print(f"[worker] Received job: type={job_type}, id={job_id} (active: {get_active_count()}/{MAX_WORKERS})")
 
             # Submit job to thread pool
@@ -391,11 +590,13 @@ def poll_and_process(executor: ThreadPoolExecutor):
                     "msg_id": msg.id,
                     "pop_receipt": msg.pop_receipt,
                 }
+            dispatched += 1
             heavy_slots_full = get_active_count() >= MAX_WORKERS
 
         except Exception as e:
-            print(f"[worker] Error parsing message: {e}")
-            # Don't delete on parse error; message will reappear after visibility timeout
+            print(f"[worker] Error dispatching message: {e}")
+
+    return dispatched
 
 
 def acquire_lock():
@@ -431,17 +632,25 @@ def main():
 
     executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
 
+    poll_delay = POLL_MIN_SEC
     try:
         while not shutdown_requested:
             try:
-                poll_and_process(executor)
-                time.sleep(5)  # Poll every 5 seconds
+                dispatched = poll_and_process(executor)
+                if dispatched:
+                    poll_delay = POLL_MIN_SEC
+                    if get_active_count() < MAX_WORKERS:
+                        continue  # more work may be waiting and we have room: re-poll now
+                else:
+                    poll_delay = min(poll_delay * 2, POLL_MAX_SEC)
+                shutdown_event.wait(poll_delay)
             except Exception as e:
                 print(f"[worker] Unexpected error: {e}")
-                time.sleep(10)
+                shutdown_event.wait(10)
     finally:
         print(f"[worker] Waiting for {get_active_count()} active jobs to complete...")
         executor.shutdown(wait=True)
+        shutdown_job_pools()
         lock_fp.close()
         print("[worker] Worker shut down.")
 
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for simple_worker's job processes.
+
+A job process that dies abruptly must fail only its own job: jobs running in
+the other slots finish, and the dead slot gets a fresh process.
+
+Usage:
+    python test_simple_worker.py
+"""
+import os
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("WORKER_MAX_CONCURRENT", "2")
+
+try:
+    import simple_worker
+except ImportError:  # azure-storage-queue / python-dotenv not installed
+    simple_worker = None
+
+# Stand-in batch module: main(argv) like process_video / generate_clip
+FAKE_JOB_MODULE = textwrap.dedent("""
+    import os
+    import signal
+    import time
+
+    def init():
+        pass
+
+    def main(argv):
+        action, arg = argv
+        if action == "sleep":
+            time.sleep(float(arg))
+        elif action == "crash":
+            time.sleep(float(arg))
+            os.kill(os.getpid(), signal.SIGKILL)
+        elif action == "fail":
+            raise ValueError(arg)
+""")
+
+
+@unittest.skipIf(simple_worker is None, "simple_worker dependencies not installed")
+@unittest.skipIf(simple_worker is not None and simple_worker.MAX_WORKERS < 2,
+                 "needs WORKER_MAX_CONCURRENT >= 2")
+class TestJobSlots(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        with open(os.path.join(cls.tmp.name, "fake_batch_job.py"), "w") as f:
+            f.write(FAKE_JOB_MODULE)
+        # spawn children get the parent's sys.path, so they import it too
+        sys.path.insert(0, cls.tmp.name)
+        import fake_batch_job
+        cls._orig_init = simple_worker._init_job_process
+        simple_worker._init_job_process = fake_batch_job.init
+
+    @classmethod
+    def tearDownClass(cls):
+        simple_worker.shutdown_job_pools()
+        simple_worker._init_job_process = cls._orig_init
+        sys.path.remove(cls.tmp.name)
+        cls.tmp.cleanup()
+
+    def _run_async(self, argv, results, key):
+        def target():
+            results[key] = simple_worker.run_batch_main("fake_batch_job", argv)
+        t = threading.Thread(target=target)
+        t.start()
+        return t
+
+    def test_killed_process_fails_only_its_own_job(self):
+        results = {}
+        slow = self._run_async(["sleep", "4"], results, "slow")
+        time.sleep(0.2)
+        crash = self._run_async(["crash", "1.5"], results, "crash")
+        crash.join(timeout=60)
+        self.assertFalse(crash.is_alive())
+        self.assertIs(results["crash"], False)
+        # The other job was still running when its neighbour died
+        self.assertTrue(slow.is_alive())
+        slow.join(timeout=60)
+        self.assertIs(results["slow"], True)
+
+        # Both slots work again (the dead one with a fresh process)
+        again = {}
+        threads = [self._run_async(["sleep", "0.1"], again, i) for i in range(2)]
+        for t in threads:
+            t.join(timeout=60)
+        self.assertEqual(again, {0: True, 1: True})
+
+    def test_job_exception_keeps_the_process(self):
+        self.assertIs(simple_worker.run_batch_main("fake_batch_job", ["fail", "boom"]), False)
+        self.assertIs(simple_worker.run_batch_main("fake_batch_job", ["sleep", "0"]), True)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)